@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 
@@ -20,6 +21,112 @@ class Config:
     OPENAI_API_KEY      = os.getenv("OPENAI_API_KEY")
     ELEVENLABS_API_KEY  = os.getenv("ELEVENLABS_API_KEY")
     ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID")
+    ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+
+    # Async TTS proxy: pooled keep-alive connections and per-request timeouts (seconds)
+    TTS_MAX_CONNECTIONS  = int(os.getenv("TTS_MAX_CONNECTIONS", "100"))
+    TTS_CONNECT_TIMEOUT_S = float(os.getenv("TTS_CONNECT_TIMEOUT_S", "5"))
+    TTS_READ_TIMEOUT_S    = float(os.getenv("TTS_READ_TIMEOUT_S", "15"))
+
+    # Chat-mode streaming: coalesce assistant_text writes
+    STREAM_FLUSH_INTERVAL_MS = int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "250"))
+    STREAM_FLUSH_CHARS       = int(os.getenv("STREAM_FLUSH_CHARS", "120"))
+
+    # AI reply pipeline: "async" (AsyncOpenAI + async Supabase) or "sync" (thread pool)
+    AI_PIPELINE        = os.getenv("AI_PIPELINE", "async")
+    AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "200"))
+    # Voice mode: publish each finished sentence while the reply is still generating
+    VOICE_STREAMING    = os.getenv("VOICE_STREAMING", "true").lower() == "true"
+
+    # Compiled system-prompt cache
+    PROMPT_CACHE_SIZE  = int(os.getenv("PROMPT_CACHE_SIZE", "512"))
+    PROMPT_CACHE_TTL_S = float(os.getenv("PROMPT_CACHE_TTL_S", "3600"))
+
+    # Model router: time-to-first-token budgets per mode (seconds) and hedged fallback
+    MODEL_LATENCY_BUDGETS = json.loads(os.getenv("MODEL_LATENCY_BUDGETS", '{"voice": 1.2, "chat": 2.5}'))
+    MODEL_HEDGING         = os.getenv("MODEL_HEDGING", "true").lower() == "true"
+
+    # TTS audio cache: in-memory LRU + size-capped disk store (empty dir disables disk)
+    TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_MB", "64")) * 1024 * 1024
+    TTS_CACHE_DIR          = os.getenv("TTS_CACHE_DIR", "/tmp/skyhug-tts-cache")
+    TTS_CACHE_DISK_BYTES   = int(os.getenv("TTS_CACHE_DISK_MB", "1024")) * 1024 * 1024
+
+    # TTS prefetch: synthesize the next snippets of a voice reply in the background
+    TTS_PREFETCH_AHEAD       = int(os.getenv("TTS_PREFETCH_AHEAD", "2"))
+    TTS_PREFETCH_TTL_S       = float(os.getenv("TTS_PREFETCH_TTL_S", "30"))
+    TTS_PREFETCH_MAX_BYTES   = int(os.getenv("TTS_PREFETCH_MAX_MB", "32")) * 1024 * 1024
+    TTS_PREFETCH_CONCURRENCY = int(os.getenv("TTS_PREFETCH_CONCURRENCY", "8"))
+
+    # Per-message TTS plans (sentences + voice), so snippet requests skip the database
+    TTS_PLAN_CACHE_SIZE = int(os.getenv("TTS_PLAN_CACHE_SIZE", "2048"))
+    TTS_PLAN_TTL_S      = float(os.getenv("TTS_PLAN_TTL_S", "600"))
+
+    # Upstream clients: pool sizes, timeouts (seconds), retries, retry budget, circuit breaker
+    OPENAI_MAX_CONNECTIONS    = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    OPENAI_TIMEOUT_S          = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+    STORAGE_MAX_CONNECTIONS   = int(os.getenv("STORAGE_MAX_CONNECTIONS", "20"))
+    STORAGE_TIMEOUT_S         = float(os.getenv("STORAGE_TIMEOUT_S", "30"))
+    UPSTREAM_MAX_RETRIES      = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+    UPSTREAM_RETRY_BUDGET     = float(os.getenv("UPSTREAM_RETRY_BUDGET", "0.2"))
+    UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+    UPSTREAM_BREAKER_RESET_S  = float(os.getenv("UPSTREAM_BREAKER_RESET_S", "30"))
+
+    TRANSCRIPTION_DEADLINE_S  = float(os.getenv("TRANSCRIPTION_DEADLINE_S", "120"))
+
+    # Inactive-conversation sweep: keyset page size, concurrent summaries per page
+    SUMMARY_SWEEP_PAGE_SIZE   = int(os.getenv("SUMMARY_SWEEP_PAGE_SIZE", "100"))
+    SUMMARY_SWEEP_CONCURRENCY = int(os.getenv("SUMMARY_SWEEP_CONCURRENCY", "4"))
+    SUMMARY_SWEEP_JITTER_S    = float(os.getenv("SUMMARY_SWEEP_JITTER_S", "60"))
+    # Topic summary prompt: opening + recent turns, bounded by a token budget
+    SUMMARY_HEAD_TURNS        = int(os.getenv("SUMMARY_HEAD_TURNS", "6"))
+    SUMMARY_TAIL_TURNS        = int(os.getenv("SUMMARY_TAIL_TURNS", "30"))
+    SUMMARY_TOKEN_BUDGET      = int(os.getenv("SUMMARY_TOKEN_BUDGET", "1500"))
+    # Sweep summaries: "interactive" chat completions or one "batch" job per sweep
+    SUMMARIZER_SWEEP_MODE     = os.getenv("SUMMARIZER_SWEEP_MODE", "interactive")
+    SUMMARY_BATCH_BACKEND     = os.getenv("SUMMARY_BATCH_BACKEND", "openai")   # or "local"
+    SUMMARY_BATCH_DIR         = os.getenv("SUMMARY_BATCH_DIR", "/tmp/skyhug-summary-batches")
+    SUMMARY_BATCH_STORE       = os.getenv("SUMMARY_BATCH_STORE", "supabase")   # pending batches; or "local"
+    SUMMARY_BATCH_WAIT_S      = float(os.getenv("SUMMARY_BATCH_WAIT_S", "0"))
+    SUMMARY_BATCH_POLL_S      = float(os.getenv("SUMMARY_BATCH_POLL_S", "10"))
+
+    # API-submitted jobs: concurrent workers, finished jobs kept for status queries
+    JOB_WORKERS               = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_HISTORY               = int(os.getenv("JOB_HISTORY", "1000"))
+
+    # Maintenance jobs: lease backend ("supabase" across replicas, "local" in-process), executor size
+    MAINTENANCE_LEASES        = os.getenv("MAINTENANCE_LEASES", "supabase")
+    MAINTENANCE_WORKERS       = int(os.getenv("MAINTENANCE_WORKERS", "2"))
+
+    # Transcription worker pool: concurrent Whisper jobs, attempts per message, retry backoff
+    TRANSCRIPTION_WORKERS        = int(os.getenv("TRANSCRIPTION_WORKERS", "4"))
+    TRANSCRIPTION_MAX_ATTEMPTS   = int(os.getenv("TRANSCRIPTION_MAX_ATTEMPTS", "3"))
+    TRANSCRIPTION_RETRY_DELAY_S  = float(os.getenv("TRANSCRIPTION_RETRY_DELAY_S", "5"))
+    # A claim older than this (rows stuck in "processing") is taken over; keep it above the deadline
+    TRANSCRIPTION_CLAIM_TIMEOUT_S = float(os.getenv("TRANSCRIPTION_CLAIM_TIMEOUT_S", "300"))
+    # Audio downloads: in-memory spool ceiling, signed URL lifetime and reuse margin
+    TRANSCRIPTION_SPOOL_BYTES    = int(os.getenv("TRANSCRIPTION_SPOOL_MB", "8")) * 1024 * 1024
+    STORAGE_SIGNED_URL_TTL_S     = int(os.getenv("STORAGE_SIGNED_URL_TTL_S", "3600"))
+    STORAGE_SIGNED_URL_MARGIN_S  = int(os.getenv("STORAGE_SIGNED_URL_MARGIN_S", "60"))
+    STORAGE_SIGNED_URL_CACHE_SIZE = int(os.getenv("STORAGE_SIGNED_URL_CACHE_SIZE", "4096"))
+    # Trim silence, downmix and downsample WAV uploads to 16 kHz before Whisper (needs numpy)
+    AUDIO_PREPROCESS             = os.getenv("AUDIO_PREPROCESS", "false").lower() == "true"
+    AUDIO_SILENCE_THRESHOLD_DB   = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-45"))
+    TRANSCRIPTION_LANGUAGE       = os.getenv("TRANSCRIPTION_LANGUAGE") or None
+    # Transcripts keyed by audio hash; TRANSCRIPTION_CACHE_PATH="" keeps them in memory only
+    TRANSCRIPTION_CACHE_SIZE     = int(os.getenv("TRANSCRIPTION_CACHE_SIZE", "2048"))
+    TRANSCRIPTION_CACHE_TTL_S    = float(os.getenv("TRANSCRIPTION_CACHE_TTL_S", str(7 * 24 * 3600)))
+    TRANSCRIPTION_CACHE_PATH     = os.getenv("TRANSCRIPTION_CACHE_PATH", "")
+
+    # Repository read-through caches (realtime UPDATEs invalidate entries early)
+    REPO_CACHE_SIZE             = int(os.getenv("REPO_CACHE_SIZE", "4096"))
+    REPO_CACHE_THERAPIST_TTL_S  = float(os.getenv("REPO_CACHE_THERAPIST_TTL_S", "3600"))
+    REPO_CACHE_PROFILE_TTL_S    = float(os.getenv("REPO_CACHE_PROFILE_TTL_S", "600"))
+    REPO_CACHE_CONVERSATION_TTL_S = float(os.getenv("REPO_CACHE_CONVERSATION_TTL_S", "60"))
+
+    # Per-model request token budgets (prompt + completion) for chat payloads
+    PAYLOAD_TOKEN_BUDGETS = json.loads(os.getenv(
+        "PAYLOAD_TOKEN_BUDGETS", '{"gpt-3.5-turbo": 6000, "gpt-4-turbo": 12000}'
+    ))
 
 
 class ProductionConfig(Config): pass
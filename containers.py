@@ -1,20 +1,37 @@
-import requests
+import httpx
 from dependency_injector import containers, providers
 from supabase import create_client as create_client_sync
 from supabase._async.client import create_client as create_client_async
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from config import config
 from repositories.messages import MessageRepository
 from repositories.conversations import ConversationRepository
 from repositories.therapists import TherapistRepository
 from repositories.user_profiles import UserProfileRepository
+from repositories.conversation_context import ConversationContextRepository
+from repositories.cache import CachedRepository, RepositoryCacheRegistry
+from repositories.maintenance_leases import MaintenanceLeaseRepository, LocalLeaseRepository
+from repositories.summary_batches import SummaryBatchRepository, LocalSummaryBatchRepository
 
 
 from services.openai_service import OpenAIService
 from services.elevenlabs_service import ElevenLabsService
 from services.summarizer_service import SummarizerService
 from services.chat_service import ChatService
+from services.rolling_summary_service import RollingSummaryService
+from services.prompt_cache import PromptCache
+from services.payload_assembler import PayloadAssembler
+from services.model_router import ModelRouter
+from services.tts_prefetcher import TTSPrefetcher
 from services.whisper_service import WhisperService
+from services.transcription_cache import TranscriptionCache
+from services.maintenance_scheduler import MaintenanceScheduler
+from services.job_runner import JobRunner
+from services.batch_backends import OpenAIBatchBackend, LocalBatchBackend
+from utils.audio_cache import AudioCache
+from utils.ttl_cache import TTLCache
+from utils.upstream import Upstream, UpstreamRegistry
+from utils.upstream_http import UpstreamTransport, AsyncUpstreamTransport, upstream_session
 
 class Container(containers.DeclarativeContainer):
 
@@ -36,37 +53,160 @@ class Container(containers.DeclarativeContainer):
     # Repositories
     message_repository = providers.Factory(
         MessageRepository,
-        supabase_sync_client=supabase_sync
+        supabase_sync_client=supabase_sync,
+        supabase_async_client=supabase_async,
+    )
+
+    # Read-through caches around the repositories for rarely changing rows;
+    # realtime UPDATEs on their tables invalidate them (see ChatService.start_realtime)
+    repository_caches = providers.Singleton(RepositoryCacheRegistry)
+
+    conversation_repository = providers.Singleton(
+        CachedRepository,
+        repository=providers.Factory(
+            ConversationRepository,
+            supabase_sync_client=supabase_sync,
+            supabase_async_client=supabase_async,
+        ),
+        table="conversations",
+        ttls=providers.Dict(
+            fetch_voice_info=config.provided.REPO_CACHE_CONVERSATION_TTL_S,
+            fetch_therapist_id=config.provided.REPO_CACHE_CONVERSATION_TTL_S,
+            fetch_memory_summary=config.provided.REPO_CACHE_CONVERSATION_TTL_S,
+        ),
+        maxsize=config.provided.REPO_CACHE_SIZE,
+        write_methods=(
+            "update_summary", "update_rolling_summary", "mark_ended",
+            "mark_ended_many", "clear_memory_if_resummarize_flag",
+        ),
+        registry=repository_caches,
     )
 
-    conversation_repository = providers.Factory(
-        ConversationRepository,
-        supabase_sync_client=supabase_sync
+    therapist_repository = providers.Singleton(
+        CachedRepository,
+        repository=providers.Factory(
+            TherapistRepository,
+            supabase_sync_client=supabase_sync,
+            supabase_async_client=supabase_async,
+        ),
+        table="therapists",
+        ttls=providers.Dict(
+            # personas are cached by PromptCache, per persona version
+            fetch_voice_id=config.provided.REPO_CACHE_THERAPIST_TTL_S,
+        ),
+        maxsize=config.provided.REPO_CACHE_SIZE,
+        registry=repository_caches,
     )
 
-    therapist_repository = providers.Factory(
-        TherapistRepository,
-        supabase_sync_client=supabase_sync
+    user_profile_repository = providers.Singleton(
+        CachedRepository,
+        repository=providers.Factory(
+            UserProfileRepository,
+            supabase_sync_client=supabase_sync,
+            supabase_async_client=supabase_async,
+        ),
+        table="user_profiles",
+        key_column="user_id",
+        ttls=providers.Dict(fetch_profile=config.provided.REPO_CACHE_PROFILE_TTL_S),
+        maxsize=config.provided.REPO_CACHE_SIZE,
+        registry=repository_caches,
     )
 
-    user_profile_repository = providers.Factory(
-        UserProfileRepository,
+    conversation_context_repository = providers.Factory(
+        ConversationContextRepository,
         supabase_sync_client=supabase_sync,
+        user_profile_repo=user_profile_repository,
+        supabase_async_client=supabase_async,
+    )
+
+    # Upstreams: pool size, timeout, retries, retry budget, circuit breaker, latency histogram
+    openai_upstream = providers.Singleton(
+        Upstream,
+        name="openai",
+        max_connections=config.provided.OPENAI_MAX_CONNECTIONS,
+        timeout_s=config.provided.OPENAI_TIMEOUT_S,
+        max_retries=config.provided.UPSTREAM_MAX_RETRIES,
+        failure_threshold=config.provided.UPSTREAM_BREAKER_FAILURES,
+        reset_timeout_s=config.provided.UPSTREAM_BREAKER_RESET_S,
+        retry_budget_ratio=config.provided.UPSTREAM_RETRY_BUDGET,
+    )
+
+    elevenlabs_upstream = providers.Singleton(
+        Upstream,
+        name="elevenlabs",
+        max_connections=config.provided.TTS_MAX_CONNECTIONS,
+        timeout_s=config.provided.TTS_READ_TIMEOUT_S,
+        max_retries=config.provided.UPSTREAM_MAX_RETRIES,
+        failure_threshold=config.provided.UPSTREAM_BREAKER_FAILURES,
+        reset_timeout_s=config.provided.UPSTREAM_BREAKER_RESET_S,
+        retry_budget_ratio=config.provided.UPSTREAM_RETRY_BUDGET,
+    )
+
+    storage_upstream = providers.Singleton(
+        Upstream,
+        name="storage",
+        max_connections=config.provided.STORAGE_MAX_CONNECTIONS,
+        timeout_s=config.provided.STORAGE_TIMEOUT_S,
+        max_retries=config.provided.UPSTREAM_MAX_RETRIES,
+        failure_threshold=config.provided.UPSTREAM_BREAKER_FAILURES,
+        reset_timeout_s=config.provided.UPSTREAM_BREAKER_RESET_S,
+        retry_budget_ratio=config.provided.UPSTREAM_RETRY_BUDGET,
+    )
+
+    upstreams = providers.Singleton(
+        UpstreamRegistry,
+        upstreams=providers.List(openai_upstream, elevenlabs_upstream, storage_upstream),
     )
 
-    # External API clients
+    # External API clients (retries happen in the upstream layer, not the SDK)
     openai_client = providers.Singleton(
         OpenAI,
         api_key=config.provided.OPENAI_API_KEY,
+        max_retries=0,
+        timeout=config.provided.OPENAI_TIMEOUT_S,
+        http_client=providers.Singleton(
+            httpx.Client,
+            transport=providers.Singleton(UpstreamTransport, upstream=openai_upstream),
+        ),
+    )
+
+    openai_async_client = providers.Singleton(
+        AsyncOpenAI,
+        api_key=config.provided.OPENAI_API_KEY,
+        max_retries=0,
+        timeout=config.provided.OPENAI_TIMEOUT_S,
+        http_client=providers.Singleton(
+            httpx.AsyncClient,
+            transport=providers.Singleton(AsyncUpstreamTransport, upstream=openai_upstream),
+        ),
     )
 
     elevenlabs_session = providers.Singleton(
-        lambda key: (
-            s := requests.Session(),
-            s.headers.update({"xi-api-key": key, "Content-Type":"application/json"}),
-            s
-        )[-1],
-        config.provided.ELEVENLABS_API_KEY
+        lambda upstream, key: upstream_session(upstream, {"xi-api-key": key, "Content-Type": "application/json"}),
+        elevenlabs_upstream,
+        config.provided.ELEVENLABS_API_KEY,
+    )
+
+    # signed-URL downloads from Supabase storage get their own pool, apart from ElevenLabs
+    storage_session = providers.Singleton(upstream_session, storage_upstream)
+    storage_url_cache = providers.Singleton(
+        TTLCache,
+        maxsize=config.provided.STORAGE_SIGNED_URL_CACHE_SIZE,
+    )
+
+    elevenlabs_async_client = providers.Singleton(
+        lambda upstream, key, base_url, connect_s, read_s: httpx.AsyncClient(
+            base_url=base_url,
+            headers={"xi-api-key": key, "Content-Type": "application/json"},
+            transport=AsyncUpstreamTransport(upstream),
+            # read bounds the wait for each chunk, not the whole stream
+            timeout=httpx.Timeout(connect=connect_s, read=read_s, write=connect_s, pool=connect_s),
+        ),
+        elevenlabs_upstream,
+        config.provided.ELEVENLABS_API_KEY,
+        config.provided.ELEVENLABS_BASE_URL,
+        config.provided.TTS_CONNECT_TIMEOUT_S,
+        config.provided.TTS_READ_TIMEOUT_S,
     )
 
     # Services
@@ -75,6 +215,27 @@ class Container(containers.DeclarativeContainer):
         client=openai_client,
     )
 
+    tts_audio_cache = providers.Singleton(
+        AudioCache,
+        memory_max_bytes=config.provided.TTS_CACHE_MEMORY_BYTES,
+        disk_dir=config.provided.TTS_CACHE_DIR,
+        disk_max_bytes=config.provided.TTS_CACHE_DISK_BYTES,
+    )
+
+    tts_prefetcher = providers.Singleton(
+        TTSPrefetcher,
+        lookahead=config.provided.TTS_PREFETCH_AHEAD,
+        ttl_s=config.provided.TTS_PREFETCH_TTL_S,
+        max_bytes=config.provided.TTS_PREFETCH_MAX_BYTES,
+        max_in_flight=config.provided.TTS_PREFETCH_CONCURRENCY,
+    )
+
+    tts_plan_cache = providers.Singleton(
+        TTLCache,
+        maxsize=config.provided.TTS_PLAN_CACHE_SIZE,
+        ttl_s=config.provided.TTS_PLAN_TTL_S,
+    )
+
     elevenlabs_service = providers.Factory(
         ElevenLabsService,
         message_repo=message_repository,
@@ -83,14 +244,95 @@ class Container(containers.DeclarativeContainer):
         supabase_sync=supabase_sync,
         elevenlabs_session=elevenlabs_session,
         default_voice_id=config.provided.ELEVENLABS_VOICE_ID,
+        audio_cache=tts_audio_cache,
+        elevenlabs_async_client=elevenlabs_async_client,
+        base_url=config.provided.ELEVENLABS_BASE_URL,
+        prefetcher=tts_prefetcher,
+        plan_cache=tts_plan_cache,
     )
 
-    summarizer_service = providers.Factory(
+    # Where batch-mode sweeps send their summary requests
+    summary_batch_backend = providers.Selector(
+        config.provided.SUMMARY_BATCH_BACKEND,
+        openai=providers.Singleton(OpenAIBatchBackend, openai_client=openai_client),
+        local=providers.Singleton(
+            LocalBatchBackend,
+            openai_client=openai_client,
+            directory=config.provided.SUMMARY_BATCH_DIR,
+        ),
+    )
+
+    # Summary batches waiting to be applied, shared by every replica's sweep
+    summary_batch_repository = providers.Selector(
+        config.provided.SUMMARY_BATCH_STORE,
+        supabase=providers.Singleton(SummaryBatchRepository, supabase_sync_client=supabase_sync),
+        local=providers.Singleton(LocalSummaryBatchRepository),
+    )
+
+    # Singleton: keeps the sweep lock and progress report
+    summarizer_service = providers.Singleton(
         SummarizerService,
         supabase_sync=supabase_sync,
         openai_service=openai_service,
         message_repo=message_repository,
         conversation_repo=conversation_repository,
+        sweep_page_size=config.provided.SUMMARY_SWEEP_PAGE_SIZE,
+        sweep_concurrency=config.provided.SUMMARY_SWEEP_CONCURRENCY,
+        sweep_jitter_s=config.provided.SUMMARY_SWEEP_JITTER_S,
+        summary_head_turns=config.provided.SUMMARY_HEAD_TURNS,
+        summary_tail_turns=config.provided.SUMMARY_TAIL_TURNS,
+        summary_token_budget=config.provided.SUMMARY_TOKEN_BUDGET,
+        sweep_mode=config.provided.SUMMARIZER_SWEEP_MODE,
+        batch_backend=summary_batch_backend,
+        batch_repo=summary_batch_repository,
+        batch_wait_s=config.provided.SUMMARY_BATCH_WAIT_S,
+        batch_poll_s=config.provided.SUMMARY_BATCH_POLL_S,
+    )
+
+    # Background jobs submitted over the API (summaries, sweeps)
+    job_runner = providers.Singleton(
+        JobRunner,
+        max_workers=config.provided.JOB_WORKERS,
+        max_history=config.provided.JOB_HISTORY,
+    )
+
+    # Housekeeping jobs; the lease decides which replica runs each one
+    maintenance_leases = providers.Selector(
+        config.provided.MAINTENANCE_LEASES,
+        supabase=providers.Singleton(MaintenanceLeaseRepository, supabase_sync_client=supabase_sync),
+        local=providers.Singleton(LocalLeaseRepository),
+    )
+
+    maintenance_scheduler = providers.Singleton(
+        MaintenanceScheduler,
+        leases=maintenance_leases,
+        max_workers=config.provided.MAINTENANCE_WORKERS,
+    )
+
+    rolling_summary_service = providers.Singleton(
+        RollingSummaryService,
+        conversation_repo=conversation_repository,
+        openai_client=openai_client,
+        openai_async_client=openai_async_client,
+    )
+
+    prompt_cache = providers.Singleton(
+        PromptCache,
+        # uncached: a PromptCache miss means a new persona version, which a cached row could predate
+        therapist_repo=therapist_repository.provided.repository,
+        maxsize=config.provided.PROMPT_CACHE_SIZE,
+        ttl_s=config.provided.PROMPT_CACHE_TTL_S,
+    )
+
+    payload_assembler = providers.Singleton(
+        PayloadAssembler,
+        budgets=config.provided.PAYLOAD_TOKEN_BUDGETS,
+    )
+
+    model_router = providers.Singleton(
+        ModelRouter,
+        latency_budgets=config.provided.MODEL_LATENCY_BUDGETS,
+        hedging=config.provided.MODEL_HEDGING,
     )
 
     chat_service = providers.Singleton(
@@ -98,15 +340,51 @@ class Container(containers.DeclarativeContainer):
         supabase_sync=supabase_sync,
         supabase_async=supabase_async,
         openai_client=openai_client,
+        openai_async_client=openai_async_client,
         message_repo=message_repository,
         conversation_repo=conversation_repository,
         therapist_repo=therapist_repository,
         user_profile_repo=user_profile_repository,
+        context_repo=conversation_context_repository,
+        rolling_summary=rolling_summary_service,
+        prompt_cache=prompt_cache,
+        payload_assembler=payload_assembler,
+        model_router=model_router,
+        stream_flush_interval_ms=config.provided.STREAM_FLUSH_INTERVAL_MS,
+        stream_flush_chars=config.provided.STREAM_FLUSH_CHARS,
+        ai_pipeline=config.provided.AI_PIPELINE,
+        ai_max_concurrency=config.provided.AI_MAX_CONCURRENCY,
+        voice_streaming=config.provided.VOICE_STREAMING,
+        elevenlabs_service=elevenlabs_service,
+        repository_caches=repository_caches,
+    )
+
+    transcription_cache = providers.Singleton(
+        TranscriptionCache,
+        maxsize=config.provided.TRANSCRIPTION_CACHE_SIZE,
+        ttl_s=config.provided.TRANSCRIPTION_CACHE_TTL_S,
+        db_path=config.provided.TRANSCRIPTION_CACHE_PATH,
     )
 
-    whisper_service = providers.Factory(
+    # Singleton: owns the transcription worker pool
+    whisper_service = providers.Singleton(
         WhisperService,
         supabase_sync=supabase_sync,
         openai_client=openai_client,
-        elevenlabs_session=elevenlabs_session,
+        storage_session=storage_session,
+        message_repo=message_repository,
+        supabase_async=supabase_async,
+        transcription_deadline_s=config.provided.TRANSCRIPTION_DEADLINE_S,
+        transcription_workers=config.provided.TRANSCRIPTION_WORKERS,
+        transcription_max_attempts=config.provided.TRANSCRIPTION_MAX_ATTEMPTS,
+        transcription_retry_delay_s=config.provided.TRANSCRIPTION_RETRY_DELAY_S,
+        transcription_claim_timeout_s=config.provided.TRANSCRIPTION_CLAIM_TIMEOUT_S,
+        signed_url_cache=storage_url_cache,
+        signed_url_ttl_s=config.provided.STORAGE_SIGNED_URL_TTL_S,
+        signed_url_margin_s=config.provided.STORAGE_SIGNED_URL_MARGIN_S,
+        spool_max_memory_bytes=config.provided.TRANSCRIPTION_SPOOL_BYTES,
+        audio_preprocess=config.provided.AUDIO_PREPROCESS,
+        preprocess_silence_db=config.provided.AUDIO_SILENCE_THRESHOLD_DB,
+        transcription_language=config.provided.TRANSCRIPTION_LANGUAGE,
+        transcription_cache=transcription_cache,
     )
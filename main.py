@@ -1,7 +1,7 @@
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import summarizer, tts
+from routers import summarizer, tts, metrics, maintenance
 from dependency_injector.wiring import inject, Provide
 from services.openai_service import OpenAIService
 from services.elevenlabs_service import ElevenLabsService
@@ -26,6 +26,8 @@ app.add_middleware(
 
 app.include_router(summarizer.router, prefix="", tags=["summarizer"])
 app.include_router(tts.router,        prefix="", tags=["tts"])
+app.include_router(metrics.router,    prefix="", tags=["metrics"])
+app.include_router(maintenance.router, prefix="", tags=["maintenance"])
 
 @app.on_event("startup")
 @inject
@@ -36,26 +38,39 @@ async def startup_event():
 
     cfg                 = container.config()
     openai_service      = container.openai_service()
-    elevenlabs_service  = container.elevenlabs_service()
-    summarizer_service  = container.summarizer_service()
-    whisper_service     = container.whisper_service()
+    elevenlabs_service  = await container.elevenlabs_service()
+    summarizer_service  = await container.summarizer_service()
+    whisper_service     = await container.whisper_service()
     chat_service = await container.chat_service()
 
 
     elevenlabs_service.warmup_elevenlabs_pool()
+    await elevenlabs_service.warmup_elevenlabs_async_pool()
     openai_service.warmup_models()
-    summarizer_service.schedule_cleanup(interval_hours=1)
+    # a stored transcript is what lets a voice message get its reply
+    whisper_service.on_transcribed = chat_service.dispatch_ai_record
 
+    maintenance_scheduler = container.maintenance_scheduler()
+    summarizer_service.schedule_cleanup(maintenance_scheduler, interval_hours=1)
+    whisper_service.schedule_reclaim(maintenance_scheduler)
+    maintenance_scheduler.start()
+
+    # drained by the worker pool in the background, so startup doesn't wait on Whisper
     for msg in whisper_service.fetch_pending("messages", sender_role="user", transcription_status="pending"):
-        whisper_service.handle_transcription_record(msg)
+        whisper_service.dispatch_transcription(msg)
 
     for msg in chat_service.fetch_pending("messages", sender_role="user", transcription_status="done", ai_status="pending"):
-        chat_service.handle_ai_record(msg)
+        chat_service.dispatch_ai_record(msg)
 
     asyncio.create_task(chat_service.start_realtime())
+    asyncio.create_task(whisper_service.start_realtime())
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await container.maintenance_scheduler().stop()
+    container.job_runner().shutdown()
+    await (await container.whisper_service()).pool.stop()
+    await container.elevenlabs_async_client().aclose()
     await container.shutdown_resources()
 
 # # import and include your routers
@@ -0,0 +1,219 @@
+import asyncio
+import inspect
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from utils.ttl_cache import TTLCache
+
+
+_MISSING = object()
+
+
+@dataclass
+class _Flight:
+    event: threading.Event = field(default_factory=threading.Event)
+    value: Any = None
+    error: Optional[BaseException] = None
+
+
+def _copy(value: Any) -> Any:
+    # callers get their own top-level container, so they can't mutate the cached row
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+@dataclass
+class CachedRepository:
+    """
+    Read-through cache around any repository in this package.
+
+    - methods named in `ttls` (by base name; `foo` and `foo_async` share entries) are
+      cached per argument tuple for their TTL, in one LRU of `maxsize` entries
+    - concurrent misses for the same call wait for a single database read
+    - methods named in `write_methods` drop the entries of the id(s) in their first argument
+      (an id, a list of ids, or a dict keyed by id)
+    - every other attribute is passed straight through to `repository`
+
+    Entries are keyed by the method's first argument, the row id in `table`'s
+    `key_column`, which is what invalidate() and realtime UPDATEs match on.
+    """
+    repository: Any
+    table: str
+    ttls: dict[str, float]
+    key_column: str = "id"
+    maxsize: int = 1024
+    write_methods: tuple = ()
+    registry: Optional["RepositoryCacheRegistry"] = None
+
+    loads: int = field(default=0, init=False)
+    coalesced: int = field(default=0, init=False)
+    _cache: TTLCache = field(init=False)
+    _generation: int = field(default=0, init=False)
+    _flights: dict = field(default_factory=dict, init=False)
+    _async_flights: dict = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        self._cache = TTLCache(self.maxsize, ttl_s=None)
+        if self.registry is not None:
+            self.registry.register(self)
+
+    def __getattr__(self, name: str) -> Any:
+        # only reached for attributes the wrapper itself does not have
+        if name.startswith("_"):
+            raise AttributeError(name)
+        method = getattr(self.repository, name)
+        base = name[:-len("_async")] if name.endswith("_async") else name
+
+        if base in self.ttls:
+            if inspect.iscoroutinefunction(method):
+                async def cached_async(*args, **kwargs):
+                    return await self._load_async(base, method, args, kwargs)
+                return cached_async
+
+            def cached(*args, **kwargs):
+                return self._load(base, method, args, kwargs)
+            return cached
+
+        if base in self.write_methods:
+            if inspect.iscoroutinefunction(method):
+                async def write_async(*args, **kwargs):
+                    try:
+                        return await method(*args, **kwargs)
+                    finally:
+                        self._invalidate_arg(args)
+                return write_async
+
+            def write(*args, **kwargs):
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    self._invalidate_arg(args)
+            return write
+
+        return method
+
+    @staticmethod
+    def _key(base: str, args: tuple, kwargs: dict) -> tuple:
+        return (base, args, tuple(sorted(kwargs.items())))
+
+    def _lookup(self, key: tuple) -> Any:
+        value = self._cache.get(key, _MISSING)
+        return value if value is _MISSING else _copy(value)
+
+    def _store(self, key: tuple, value: Any, generation: int) -> None:
+        with self._lock:
+            # an invalidation arrived while we were reading; don't cache the stale row
+            if generation == self._generation:
+                self._cache.set(key, value, ttl_s=self.ttls[key[0]])
+
+    def _load(self, base: str, method, args: tuple, kwargs: dict) -> Any:
+        key = self._key(base, args, kwargs)
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+                self.loads += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return _copy(flight.value)
+
+        try:
+            flight.value = method(*args, **kwargs)
+            self._store(key, flight.value, generation)
+            return _copy(flight.value)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def _load_async(self, base: str, method, args: tuple, kwargs: dict) -> Any:
+        key = self._key(base, args, kwargs)
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        pending = self._async_flights.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return _copy(await asyncio.shield(pending))
+
+        with self._lock:
+            generation = self._generation
+            self.loads += 1
+        pending = asyncio.ensure_future(method(*args, **kwargs))
+        self._async_flights[key] = pending
+        try:
+            value = await asyncio.shield(pending)
+            self._store(key, value, generation)
+            return _copy(value)
+        finally:
+            if self._async_flights.get(key) is pending:
+                del self._async_flights[key]
+
+    def _invalidate_arg(self, args: tuple) -> None:
+        if not args:
+            return
+        # a collection of ids (bulk writes)
+        ids = args[0] if isinstance(args[0], (list, tuple, set)) else [args[0]]
+        for key_value in ids:
+            self.invalidate(key_value)
+
+    def invalidate(self, key_value: Any) -> int:
+        """
+        Drop every cached call whose first argument is `key_value`.
+        """
+        with self._lock:
+            self._generation += 1
+        return self._cache.invalidate_where(lambda k: k[1][:1] == (key_value,))
+
+    def invalidate_record(self, record: dict) -> int:
+        key_value = record.get(self.key_column)
+        return self.invalidate(key_value) if key_value is not None else 0
+
+    def stats(self) -> dict:
+        return {
+            **self._cache.stats(),
+            "table": self.table,
+            "ttls": self.ttls,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+        }
+
+
+@dataclass
+class RepositoryCacheRegistry:
+    """
+    All CachedRepository instances, so realtime UPDATEs can be routed by table
+    and /metrics can report on every cache at once.
+    """
+    caches: list[CachedRepository] = field(default_factory=list)
+
+    def register(self, cache: CachedRepository) -> None:
+        self.caches.append(cache)
+
+    def invalidate_record(self, table: str, record: dict) -> int:
+        return sum(c.invalidate_record(record) for c in self.caches if c.table == table)
+
+    def tables(self) -> set[str]:
+        return {c.table for c in self.caches}
+
+    def stats(self) -> dict:
+        return {type(c.repository).__name__: c.stats() for c in self.caches}
@@ -0,0 +1,113 @@
+from dataclasses import dataclass, field
+from supabase import Client
+from supabase._async.client import AsyncClient
+from typing import Any, Optional
+
+from repositories.user_profiles import UserProfileRepository
+
+
+@dataclass
+class ConversationContext:
+    """
+    Everything build_chat_payload needs about one conversation, loaded up front.
+    `history` holds the non-invalidated message rows ordered by created_at.
+    `persona_version` is the therapist's updated_at, used as the PromptCache key.
+    """
+    conversation_id: str
+    patient_id: Optional[str] = None
+    therapist_id: Optional[str] = None
+    voice_enabled: bool = False
+    memory_summary: str = ""
+    rolling_summary: str = ""
+    rolling_summary_until: Optional[str] = None
+    persona_version: Optional[str] = None
+    profile: dict[str, Any] = field(default_factory=dict)
+    history: list[dict] = field(default_factory=list)
+
+
+@dataclass
+class ConversationContextRepository:
+    supabase_sync_client: Client
+    user_profile_repo: UserProfileRepository
+    supabase_async_client: Optional[AsyncClient] = None
+
+    # conversation row + therapist persona version + embedded message history
+    CONTEXT_COLUMNS = (
+        "id, patient_id, therapist_id, voice_enabled, memory_summary, needs_resummarization, "
+        "rolling_summary, rolling_summary_until, "
+        "therapists(updated_at), "
+        "messages(sender_role, transcription, assistant_text, created_at)"
+    )
+
+    def load(self, conversation_id: str) -> ConversationContext:
+        """
+        Loads a ConversationContext in two round trips:
+          1) conversations row with the therapist's persona version and message history embedded
+          2) the patient's user profile
+        If needs_resummarization is set, memory_summary and the rolling summary
+        are cleared (one extra write).
+        """
+        row = self._context_query(self.supabase_sync_client, conversation_id).execute().data or {}
+
+        if row.get("needs_resummarization"):
+            self._clear_memory_query(self.supabase_sync_client, conversation_id).execute()
+
+        patient_id = row.get("patient_id")
+        profile = self.user_profile_repo.fetch_profile(patient_id) if patient_id else {}
+        return self._to_context(conversation_id, row, profile)
+
+    async def load_async(self, conversation_id: str) -> ConversationContext:
+        """
+        Same as load(), using the async Supabase client.
+        """
+        row = (await self._context_query(self.supabase_async_client, conversation_id).execute()).data or {}
+
+        if row.get("needs_resummarization"):
+            await self._clear_memory_query(self.supabase_async_client, conversation_id).execute()
+
+        patient_id = row.get("patient_id")
+        profile = await self.user_profile_repo.fetch_profile_async(patient_id) if patient_id else {}
+        return self._to_context(conversation_id, row, profile)
+
+    def _context_query(self, client, conversation_id: str):
+        return (
+            client
+                .table("conversations")
+                .select(self.CONTEXT_COLUMNS)
+                .eq("id", conversation_id)
+                .eq("messages.invalidated", False)
+                .order("created_at", foreign_table="messages")
+                .single()
+        )
+
+    @staticmethod
+    def _clear_memory_query(client, conversation_id: str):
+        return (
+            client
+                .table("conversations")
+                .update({
+                    "memory_summary": "",
+                    "memory_summary_until": None,
+                    "memory_summary_count": None,
+                    "rolling_summary": "",
+                    "rolling_summary_until": None,
+                    "needs_resummarization": False,
+                })
+                .eq("id", conversation_id)
+        )
+
+    @staticmethod
+    def _to_context(conversation_id: str, row: dict, profile: dict) -> ConversationContext:
+        reset = bool(row.get("needs_resummarization"))
+        return ConversationContext(
+            conversation_id=conversation_id,
+            patient_id=row.get("patient_id"),
+            therapist_id=row.get("therapist_id"),
+            voice_enabled=bool(row.get("voice_enabled", False)),
+            memory_summary="" if reset else (row.get("memory_summary") or ""),
+            rolling_summary="" if reset else (row.get("rolling_summary") or ""),
+            rolling_summary_until=None if reset else row.get("rolling_summary_until"),
+            persona_version=(row.get("therapists") or {}).get("updated_at"),
+            profile=profile or {},
+            history=row.get("messages") or [],
+        )
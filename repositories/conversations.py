@@ -1,11 +1,13 @@
 from dataclasses import dataclass
 from supabase import Client
+from supabase._async.client import AsyncClient
 from typing import Optional
 
 
 @dataclass
 class ConversationRepository:
     supabase_sync_client: Client
+    supabase_async_client: Optional[AsyncClient] = None
 
     def fetch_voice_info(self, conversation_id: str) -> dict:
         """
@@ -23,13 +25,69 @@ class ConversationRepository:
         ) or {}
         return row
 
-    def update_summary(self, conversation_id: str, summary: str) -> None:
+    async def fetch_voice_info_async(self, conversation_id: str) -> dict:
+        resp = await (
+            self.supabase_async_client
+                .table("conversations")
+                .select("voice_enabled,therapist_id")
+                .eq("id", conversation_id)
+                .single()
+                .execute()
+        )
+        return resp.data or {}
+
+    def update_summary(
+        self,
+        conversation_id: str,
+        summary: str,
+        until: Optional[str] = None,
+        message_count: Optional[int] = None,
+    ) -> None:
+        """
+        Writes `summary` into the conversations.memory_summary column, together with
+        its watermark: created_at of the newest message and the message count it saw.
+        """
+        self.supabase_sync_client \
+            .table("conversations") \
+            .update({
+                "memory_summary": summary,
+                "memory_summary_until": until,
+                "memory_summary_count": message_count,
+            }) \
+            .eq("id", conversation_id) \
+            .execute()
+
+    def fetch_summary_state(self, conversation_id: str) -> dict:
+        """
+        Returns memory_summary, its watermark (memory_summary_until, memory_summary_count)
+        and needs_resummarization, or an empty dict if the conversation was not found.
+        """
+        row = (
+            self.supabase_sync_client
+                .table("conversations")
+                .select("memory_summary, memory_summary_until, memory_summary_count, needs_resummarization")
+                .eq("id", conversation_id)
+                .single()
+                .execute()
+                .data
+        ) or {}
+        return row
+
+    def update_rolling_summary(self, conversation_id: str, summary: str, until: str) -> None:
         """
-        Writes `summary` into the conversations.memory_summary column.
+        Writes the rolling summary of older turns and its watermark
+        (created_at of the last message folded into it).
         """
         self.supabase_sync_client \
             .table("conversations") \
-            .update({"memory_summary": summary}) \
+            .update({"rolling_summary": summary, "rolling_summary_until": until}) \
+            .eq("id", conversation_id) \
+            .execute()
+
+    async def update_rolling_summary_async(self, conversation_id: str, summary: str, until: str) -> None:
+        await self.supabase_async_client \
+            .table("conversations") \
+            .update({"rolling_summary": summary, "rolling_summary_until": until}) \
             .eq("id", conversation_id) \
             .execute()
 
@@ -43,21 +101,64 @@ class ConversationRepository:
             .eq("id", conversation_id) \
             .execute()
 
-    def fetch_stale_conversation_ids(self, cutoff_iso: str) -> list[str]:
-            """
-            Returns a list of conversation IDs where ended=False and updated_at < cutoff_iso.
-            """
-            rows = (
-                self.supabase_sync_client
-                    .table("conversations")
-                    .select("id")
-                    .eq("ended", False)
-                    .lt("updated_at", cutoff_iso)
-                    .execute()
-                    .data
-                or []
-            )
-            return [r["id"] for r in rows]
+    def mark_ended_many(self, conversation_ids: list[str]) -> list[str]:
+        """
+        Sets ended = True in one update for every conversation in `conversation_ids`
+        that is still open. Callers decide staleness beforehand (see
+        filter_stale_conversation_ids): writing a summary bumps `updated_at`, so it
+        cannot be checked here. Returns the ids that were ended.
+        """
+        if not conversation_ids:
+            return []
+        resp = self.supabase_sync_client \
+            .table("conversations") \
+            .update({"ended": True}) \
+            .in_("id", conversation_ids) \
+            .eq("ended", False) \
+            .execute()
+        return [r["id"] for r in resp.data or []]
+
+    def filter_stale_conversation_ids(self, conversation_ids: list[str], cutoff_iso: str) -> set[str]:
+        """
+        The subset of `conversation_ids` that is still open and not updated since `cutoff_iso`.
+        """
+        if not conversation_ids:
+            return set()
+        rows = (
+            self.supabase_sync_client
+                .table("conversations")
+                .select("id")
+                .in_("id", conversation_ids)
+                .eq("ended", False)
+                .lt("updated_at", cutoff_iso)
+                .execute()
+                .data
+        ) or []
+        return {r["id"] for r in rows}
+
+    def fetch_stale_conversation_ids(
+        self,
+        cutoff_iso: str,
+        after_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> list[str]:
+        """
+        Returns a list of conversation IDs where ended=False and updated_at < cutoff_iso.
+        With `limit`, returns one page ordered by id, starting after `after_id` (keyset pagination).
+        """
+        q = (
+            self.supabase_sync_client
+                .table("conversations")
+                .select("id")
+                .eq("ended", False)
+                .lt("updated_at", cutoff_iso)
+        )
+        if after_id is not None:
+            q = q.gt("id", after_id)
+        if limit is not None:
+            q = q.order("id").limit(limit)
+        rows = q.execute().data or []
+        return [r["id"] for r in rows]
 
     def fetch_memory_summary(self, conversation_id: str) -> str:
         """
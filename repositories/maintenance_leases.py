@@ -0,0 +1,72 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone, timedelta
+from supabase import Client
+
+
+@dataclass
+class MaintenanceLeaseRepository:
+    """
+    Cross-replica leases on the `maintenance_leases` table:
+
+        create table maintenance_leases (
+            name       text primary key,
+            holder     text not null,
+            expires_at timestamptz not null
+        );
+
+    A lease is taken by flipping an expired (or already ours) row to us, or by
+    inserting the row if it does not exist yet; both are single conditional
+    statements, so at most one holder wins.
+    """
+    supabase_sync_client: Client
+
+    def acquire(self, name: str, holder: str, ttl_s: float) -> bool:
+        now = datetime.now(timezone.utc)
+        fields = {"holder": holder, "expires_at": (now + timedelta(seconds=ttl_s)).isoformat()}
+        resp = (
+            self.supabase_sync_client.table("maintenance_leases")
+            .update(fields)
+            .eq("name", name)
+            .or_(f'expires_at.lt."{now.isoformat()}",holder.eq."{holder}"')
+            .execute()
+        )
+        if resp.data:
+            return True
+        try:
+            resp = self.supabase_sync_client.table("maintenance_leases").insert({"name": name, **fields}).execute()
+        except Exception:
+            # the row exists and somebody else holds it
+            return False
+        return bool(resp.data)
+
+    def release(self, name: str, holder: str) -> None:
+        self.supabase_sync_client.table("maintenance_leases") \
+            .update({"expires_at": datetime.now(timezone.utc).isoformat()}) \
+            .eq("name", name) \
+            .eq("holder", holder) \
+            .execute()
+
+
+@dataclass
+class LocalLeaseRepository:
+    """
+    In-process stand-in for MaintenanceLeaseRepository (tests, single-process deploys).
+    """
+    _leases: dict = field(default_factory=dict, init=False)   # name -> (holder, expires_at)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def acquire(self, name: str, holder: str, ttl_s: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            current = self._leases.get(name)
+            if current is not None and current[0] != holder and current[1] > now:
+                return False
+            self._leases[name] = (holder, now + ttl_s)
+            return True
+
+    def release(self, name: str, holder: str) -> None:
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == holder:
+                del self._leases[name]
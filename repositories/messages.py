@@ -1,14 +1,18 @@
 from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
 from supabase import Client
+from supabase._async.client import AsyncClient
 
 @dataclass
 class MessageRepository:
     supabase_sync_client: Client
+    supabase_async_client: Optional[AsyncClient] = None
 
     def fetch_text(self, message_id: str) -> dict:
         row = (
             self.supabase_sync_client.table("messages")
-            .select("assistant_text,conversation_id")
+            .select("assistant_text,conversation_id,ai_status")
             .eq("id", message_id)
             .single()
             .execute()
@@ -16,9 +20,86 @@ class MessageRepository:
         ) or {}
         return row
 
+    async def fetch_text_async(self, message_id: str) -> dict:
+        resp = await (
+            self.supabase_async_client.table("messages")
+            .select("assistant_text,conversation_id,ai_status")
+            .eq("id", message_id)
+            .single()
+            .execute()
+        )
+        return resp.data or {}
+
     def update(self, message_id: str, fields: dict):
         self.supabase_sync_client.table("messages").update(fields).eq("id", message_id).execute()
 
+    def claim_for_ai(self, message_id: str) -> bool:
+        """
+        Atomically flips ai_started false → true. Returns True only for the caller
+        whose update actually matched the row, so one reply is generated per message
+        across the startup backlog, realtime callbacks and other replicas.
+        """
+        resp = (
+            self.supabase_sync_client.table("messages")
+            .update({"ai_started": True})
+            .eq("id", message_id)
+            .or_("ai_started.is.null,ai_started.eq.false")
+            .execute()
+        )
+        return bool(resp.data)
+
+    async def claim_for_ai_async(self, message_id: str) -> bool:
+        resp = await (
+            self.supabase_async_client.table("messages")
+            .update({"ai_started": True})
+            .eq("id", message_id)
+            .or_("ai_started.is.null,ai_started.eq.false")
+            .execute()
+        )
+        return bool(resp.data)
+
+    def claim_for_transcription(self, message_id: str, stale_before_iso: Optional[str] = None) -> bool:
+        """
+        Conditionally moves transcription_status pending/error → processing and stamps
+        transcription_claimed_at. With `stale_before_iso`, a row left in processing since
+        before then (its worker died) can be claimed again as well. Returns True only for
+        the caller whose update matched, so one worker transcribes each message.
+        """
+        claimable = "transcription_status.in.(pending,error)"
+        if stale_before_iso is not None:
+            claimable += (
+                ",and(transcription_status.eq.processing,"
+                f'or(transcription_claimed_at.lt."{stale_before_iso}",transcription_claimed_at.is.null))'
+            )
+        resp = (
+            self.supabase_sync_client.table("messages")
+            .update({
+                "transcription_status": "processing",
+                "transcription_claimed_at": datetime.now(timezone.utc).isoformat(),
+            })
+            .eq("id", message_id)
+            .or_(claimable)
+            .execute()
+        )
+        return bool(resp.data)
+
+    def fetch_stuck_transcriptions(self, stale_before_iso: str, limit: int = 100) -> list[dict]:
+        """
+        User voice messages claimed for transcription before `stale_before_iso` and still
+        in processing, i.e. whose worker died or was restarted mid-transcription.
+        """
+        return (
+            self.supabase_sync_client.table("messages")
+            .select("*")
+            .eq("sender_role", "user")
+            .eq("transcription_status", "processing")
+            .or_(f'transcription_claimed_at.lt."{stale_before_iso}",transcription_claimed_at.is.null')
+            .order("created_at")
+            .limit(limit)
+            .execute()
+            .data
+        ) or []
+
     def fetch_all_history_for_conversation(self, conversation_id: str) -> list[dict]:
         """
         Returns a list of rows (dictionaries) for all messages in this conversation,
@@ -36,6 +117,51 @@ class MessageRepository:
         )
         return history
 
+    def count_messages(
+        self,
+        conversation_id: str,
+        since: Optional[str] = None,
+        sender_role: Optional[str] = None,
+    ) -> int:
+        """
+        Number of non-invalidated messages in a conversation, optionally only those
+        created after `since` and/or sent by `sender_role`. Counted by the database;
+        no rows are transferred.
+        """
+        q = (
+            self.supabase_sync_client
+                .table("messages")
+                .select("id", count="exact")
+                .eq("conversation_id", conversation_id)
+                .eq("invalidated", False)
+        )
+        if since is not None:
+            q = q.gt("created_at", since)
+        if sender_role is not None:
+            q = q.eq("sender_role", sender_role)
+        return q.limit(1).execute().count or 0
+
+    def fetch_history_edges(self, conversation_id: str, head: int, tail: int) -> tuple[list[dict], list[dict]]:
+        """
+        The first `head` and the last `tail` non-invalidated messages of a conversation,
+        both ordered by created_at (the two lists overlap for short conversations).
+        """
+        def query(desc: bool, limit: int) -> list[dict]:
+            return (
+                self.supabase_sync_client
+                    .table("messages")
+                    .select("id, sender_role, transcription, assistant_text, created_at")
+                    .eq("conversation_id", conversation_id)
+                    .eq("invalidated", False)
+                    .order("created_at", desc=desc)
+                    .limit(limit)
+                    .execute()
+                    .data
+                or []
+            )
+
+        return query(False, head), list(reversed(query(True, tail)))
+
     def fetch_history_for_conversation(self, conversation_id: str) -> list[dict]:
         """
         Returns every non‐invalidated message row for a given conversation_id,
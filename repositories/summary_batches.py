@@ -0,0 +1,76 @@
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from supabase import Client
+
+
+@dataclass
+class SummaryBatchRepository:
+    """
+    Summary batches submitted by a sweep and not applied yet, on the `summary_batches`
+    table, so whichever replica runs the next sweep can collect them:
+
+        create table summary_batches (
+            batch_id      text primary key,
+            cutoff        timestamptz not null,
+            conversations jsonb not null,
+            submitted_at  timestamptz not null default now()
+        );
+
+    `conversations` maps each conversation id to the plan its summary is stored with
+    (watermark and sample size), `cutoff` is the inactivity cutoff of the sweep that
+    planned them.
+    """
+    supabase_sync_client: Client
+
+    def add(self, batch_id: str, cutoff_iso: str, conversations: dict[str, dict]) -> None:
+        self.supabase_sync_client.table("summary_batches").insert({
+            "batch_id": batch_id,
+            "cutoff": cutoff_iso,
+            "conversations": conversations,
+        }).execute()
+
+    def fetch_pending(self) -> list[dict]:
+        """
+        Every pending batch, oldest first, as dicts with batch_id, cutoff and conversations.
+        """
+        return (
+            self.supabase_sync_client
+                .table("summary_batches")
+                .select("batch_id, cutoff, conversations")
+                .order("submitted_at")
+                .execute()
+                .data
+        ) or []
+
+    def remove(self, batch_id: str) -> None:
+        self.supabase_sync_client.table("summary_batches") \
+            .delete() \
+            .eq("batch_id", batch_id) \
+            .execute()
+
+
+@dataclass
+class LocalSummaryBatchRepository:
+    """
+    In-process stand-in for SummaryBatchRepository (tests, single-process deploys).
+    """
+    _batches: dict = field(default_factory=dict, init=False)   # batch_id -> row, in submission order
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def add(self, batch_id: str, cutoff_iso: str, conversations: dict[str, dict]) -> None:
+        with self._lock:
+            self._batches[batch_id] = {
+                "batch_id": batch_id,
+                "cutoff": cutoff_iso,
+                "conversations": conversations,
+                "submitted_at": datetime.now(timezone.utc).isoformat(),
+            }
+
+    def fetch_pending(self) -> list[dict]:
+        with self._lock:
+            return list(self._batches.values())
+
+    def remove(self, batch_id: str) -> None:
+        with self._lock:
+            self._batches.pop(batch_id, None)
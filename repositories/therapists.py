@@ -1,11 +1,15 @@
 from dataclasses import dataclass
 from supabase import Client
-from typing import Any
+from supabase._async.client import AsyncClient
+from typing import Any, Optional
 
 
 @dataclass
 class TherapistRepository:
     supabase_sync_client: Client
+    supabase_async_client: Optional[AsyncClient] = None
+
+    PERSONA_COLUMNS = "system_prompt, name, description, bio, approach, session_structure, specialties"
 
     def fetch_voice_id(self, therapist_id: str) -> str:
         """
@@ -23,6 +27,17 @@ class TherapistRepository:
         ) or {}
         return row.get("elevenlabs_voice_id", "")
 
+    async def fetch_voice_id_async(self, therapist_id: str) -> str:
+        resp = await (
+            self.supabase_async_client
+                .table("therapists")
+                .select("elevenlabs_voice_id")
+                .eq("id", therapist_id)
+                .single()
+                .execute()
+        )
+        return (resp.data or {}).get("elevenlabs_voice_id", "")
+
 
     def fetch_therapist_persona(self, therapist_id: str) -> dict[str, Any]:
         """
@@ -34,12 +49,21 @@ class TherapistRepository:
         row = (
             self.supabase_sync_client
                 .table("therapists")
-                .select(
-                    "system_prompt, name, description, bio, approach, session_structure, specialties"
-                )
+                .select(self.PERSONA_COLUMNS)
                 .eq("id", therapist_id)
                 .single()
                 .execute()
                 .data
         ) or {}
         return row
+
+    async def fetch_therapist_persona_async(self, therapist_id: str) -> dict[str, Any]:
+        resp = await (
+            self.supabase_async_client
+                .table("therapists")
+                .select(self.PERSONA_COLUMNS)
+                .eq("id", therapist_id)
+                .single()
+                .execute()
+        )
+        return resp.data or {}
@@ -1,22 +1,37 @@
 from dataclasses import dataclass
 from supabase import Client
-from typing import Any
+from supabase._async.client import AsyncClient
+from typing import Any, Optional
 
 @dataclass
 class UserProfileRepository:
     supabase_sync_client: Client
+    supabase_async_client: Optional[AsyncClient] = None
+
+    PROFILE_COLUMNS = (
+        "age, gender, sexual_preferences, career, "
+        "self_diagnosed_issues, topics_on_mind, additional_info"
+    )
 
     def fetch_profile(self, user_id: str) -> dict[str, Any]:
         row = (
             self.supabase_sync_client
                 .table("user_profiles")
-                .select(
-                    "age, gender, sexual_preferences, career, "
-                    "self_diagnosed_issues, topics_on_mind, additional_info"
-                )
+                .select(self.PROFILE_COLUMNS)
                 .eq("user_id", user_id)
                 .single()
                 .execute()
                 .data
         ) or {}
         return row
+
+    async def fetch_profile_async(self, user_id: str) -> dict[str, Any]:
+        resp = await (
+            self.supabase_async_client
+                .table("user_profiles")
+                .select(self.PROFILE_COLUMNS)
+                .eq("user_id", user_id)
+                .single()
+                .execute()
+        )
+        return resp.data or {}
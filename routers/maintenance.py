@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from dependency_injector.wiring import inject, Provide
+
+from containers import Container
+from services.maintenance_scheduler import MaintenanceScheduler
+
+
+router = APIRouter()
+
+
+@router.get("/maintenance/status")
+@inject
+async def maintenance_status(
+    maintenance_scheduler: MaintenanceScheduler = Depends(Provide[Container.maintenance_scheduler]),
+):
+    return maintenance_scheduler.status()
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends
+from dependency_injector.wiring import inject, Provide
+
+from containers import Container
+from repositories.cache import RepositoryCacheRegistry
+from services.prompt_cache import PromptCache
+from services.chat_service import ChatService
+from services.model_router import ModelRouter
+from services.whisper_service import WhisperService
+from services.tts_prefetcher import TTSPrefetcher
+from utils.audio_cache import AudioCache
+from utils.ttl_cache import TTLCache
+from utils.upstream import UpstreamRegistry
+
+
+router = APIRouter()
+
+
+@router.get("/metrics/prompt-cache")
+@inject
+async def prompt_cache_stats(
+    prompt_cache: PromptCache = Depends(Provide[Container.prompt_cache]),
+):
+    return prompt_cache.stats()
+
+
+@router.get("/metrics/reply-queue")
+@inject
+async def reply_queue_stats(
+    chat_service: ChatService = Depends(Provide[Container.chat_service]),
+):
+    return chat_service.reply_queue.stats()
+
+
+@router.get("/metrics/models")
+@inject
+async def model_stats(
+    model_router: ModelRouter = Depends(Provide[Container.model_router]),
+):
+    return model_router.stats()
+
+
+@router.get("/metrics/tts-cache")
+@inject
+async def tts_cache_stats(
+    tts_audio_cache: AudioCache = Depends(Provide[Container.tts_audio_cache]),
+):
+    return tts_audio_cache.stats()
+
+
+@router.get("/metrics/tts-prefetch")
+@inject
+async def tts_prefetch_stats(
+    tts_prefetcher: TTSPrefetcher = Depends(Provide[Container.tts_prefetcher]),
+):
+    return tts_prefetcher.stats()
+
+
+@router.get("/metrics/tts-plan-cache")
+@inject
+async def tts_plan_cache_stats(
+    tts_plan_cache: TTLCache = Depends(Provide[Container.tts_plan_cache]),
+):
+    return tts_plan_cache.stats()
+
+
+@router.get("/metrics/upstreams")
+@inject
+async def upstream_stats(
+    upstreams: UpstreamRegistry = Depends(Provide[Container.upstreams]),
+):
+    return upstreams.stats()
+
+
+@router.get("/metrics/transcription")
+@inject
+async def transcription_stats(
+    whisper_service: WhisperService = Depends(Provide[Container.whisper_service]),
+):
+    return whisper_service.stats()
+
+
+@router.get("/metrics/repository-cache")
+@inject
+async def repository_cache_stats(
+    repository_caches: RepositoryCacheRegistry = Depends(Provide[Container.repository_caches]),
+):
+    return repository_caches.stats()
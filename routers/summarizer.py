@@ -1,9 +1,13 @@
+import asyncio
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from dependency_injector.wiring import Provide, inject
 
 from containers import Container
-from services.summarizer_service import SummarizerService
+from services.job_runner import Job, JobRunner
+from services.maintenance_scheduler import LeaseHeld, MaintenanceScheduler
+from services.summarizer_service import CLEANUP_JOB, SummarizerService
 
 router = APIRouter(tags=["summarizer"])
 
@@ -12,26 +16,103 @@ class SummarizeRequest(BaseModel):
     conversation_id: str
 
 
+class BulkSummarizeRequest(BaseModel):
+    conversation_ids: list[str]
+
+
+async def _respond(jobs: JobRunner, job: Job, wait: bool) -> dict:
+    if not wait:
+        return {"status": "queued", "job_id": job.id}
+    await jobs.wait(job)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    return {"status": "ok", "job": job.to_dict()}
+
+
 @router.post("/summarize_conversation")
 @inject
 async def summarize_conversation(
     req: SummarizeRequest,
+    wait: bool = False,
+    summarizer: SummarizerService = Depends(Provide[Container.summarizer_service]),
+    jobs: JobRunner = Depends(Provide[Container.job_runner]),
+):
+    job = jobs.submit(
+        "summarize_conversation",
+        lambda: summarizer.summarize_and_store(req.conversation_id),
+        conversation_id=req.conversation_id,
+    )
+    return await _respond(jobs, job, wait)
+
+
+@router.post("/summarize_conversations")
+@inject
+async def summarize_conversations(
+    req: BulkSummarizeRequest,
     summarizer: SummarizerService = Depends(Provide[Container.summarizer_service]),
+    jobs: JobRunner = Depends(Provide[Container.job_runner]),
 ):
-    try:
-        summarizer.summarize_and_store(req.conversation_id)
-        return {"status": "ok"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    submitted = [
+        jobs.submit(
+            "summarize_conversation",
+            lambda conv_id=conv_id: summarizer.summarize_and_store(conv_id),
+            conversation_id=conv_id,
+        )
+        for conv_id in dict.fromkeys(req.conversation_ids)
+    ]
+    return {
+        "status": "queued",
+        "jobs": [{"conversation_id": j.params["conversation_id"], "job_id": j.id} for j in submitted],
+    }
 
 
 @router.post("/cleanup_inactive")
 @inject
 async def cleanup_inactive(
+    wait: bool = False,
+    scheduler: MaintenanceScheduler = Depends(Provide[Container.maintenance_scheduler]),
+    jobs: JobRunner = Depends(Provide[Container.job_runner]),
+):
+    loop = asyncio.get_running_loop()
+
+    def sweep():
+        # through the scheduler, so a manual sweep holds the same lease as the hourly one
+        try:
+            report = asyncio.run_coroutine_threadsafe(scheduler.run_now(CLEANUP_JOB), loop).result()
+        except LeaseHeld as e:
+            return {"skipped": str(e)}
+        return report.to_dict() if report else None
+
+    job = jobs.submit("cleanup_inactive", sweep)
+    return await _respond(jobs, job, wait)
+
+
+@router.get("/cleanup_inactive/status")
+@inject
+async def cleanup_status(
     summarizer: SummarizerService = Depends(Provide[Container.summarizer_service]),
 ):
-    try:
-        summarizer.close_inactive_conversations()
-        return {"status": "ok"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return summarizer.sweep_status()
+
+
+@router.get("/jobs")
+@inject
+async def list_jobs(
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = 100,
+    jobs: JobRunner = Depends(Provide[Container.job_runner]),
+):
+    return {"stats": jobs.stats(), "jobs": jobs.list_jobs(status=status, kind=kind, limit=limit)}
+
+
+@router.get("/jobs/{job_id}")
+@inject
+async def job_status(
+    job_id: str,
+    jobs: JobRunner = Depends(Provide[Container.job_runner]),
+):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Header
 from dependency_injector.wiring import inject, Provide
 
 from containers import Container
@@ -8,11 +9,32 @@ from services.elevenlabs_service import ElevenLabsService
 router = APIRouter()
 
 
+@router.get("/tts-plan/{message_id}")
+@inject
+async def tts_plan(
+    message_id: str,
+    elevenlabs_service: ElevenLabsService = Depends(Provide[Container.elevenlabs_service]),
+):
+    plan = await elevenlabs_service.plan_for_async(message_id)
+    return plan.to_dict()
+
+
 @router.get("/tts-stream/{message_id}")
 @inject
 async def tts_stream(
     message_id: str,
     snippet: int = 0,
+    if_none_match: Optional[str] = Header(None),
+    elevenlabs_service: ElevenLabsService = Depends(Provide[Container.elevenlabs_service]),
+):
+    return await elevenlabs_service.fetch_and_stream_async(message_id, snippet, if_none_match)
+
+
+@router.get("/tts-stream/{message_id}/all")
+@inject
+async def tts_stream_all(
+    message_id: str,
+    markers: bool = False,
     elevenlabs_service: ElevenLabsService = Depends(Provide[Container.elevenlabs_service]),
 ):
-    return elevenlabs_service.fetch_and_stream(message_id, snippet)
+    return await elevenlabs_service.stream_all_async(message_id, markers)
@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Union
+from openai import OpenAI
+
+
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+
+
+class BatchFailed(Exception):
+    """
+    The batch ended without results (failed, expired or cancelled); unlike an error
+    while polling, retrying the poll will not help.
+    """
+    def __init__(self, batch_id: str, status: str):
+        super().__init__(f"batch {batch_id} {status}")
+        self.batch_id = batch_id
+        self.status = status
+
+
+def batch_request_line(custom_id: str, body: dict) -> str:
+    """
+    One line of a batch input file, in the OpenAI Batch API format.
+    """
+    return json.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": CHAT_COMPLETIONS_ENDPOINT,
+        "body": body,
+    }, ensure_ascii=False)
+
+
+def parse_batch_output(text: str) -> dict[str, Optional[str]]:
+    """
+    custom_id → completion text (None for requests that failed) from a batch output file.
+    """
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        response = row.get("response") or {}
+        content = None
+        if not row.get("error") and response.get("status_code") == 200:
+            choices = (response.get("body") or {}).get("choices") or []
+            if choices:
+                content = choices[0]["message"]["content"]
+        results[row["custom_id"]] = content
+    return results
+
+
+@dataclass
+class OpenAIBatchBackend:
+    """
+    OpenAI Batch API: results within `completion_window`, outside the rate limits
+    that interactive completions share.
+    """
+    openai_client: OpenAI
+    completion_window: str = "24h"
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            uploaded = self.openai_client.files.create(file=f, purpose="batch")
+        batch = self.openai_client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=CHAT_COMPLETIONS_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[dict[str, Optional[str]]]:
+        """
+        None while the batch is still running; its results once it completed.
+        Raises BatchFailed if the batch failed, expired or was cancelled.
+        """
+        batch = self.openai_client.batches.retrieve(batch_id)
+        if batch.status in ("failed", "expired", "cancelled"):
+            raise BatchFailed(batch_id, batch.status)
+        if batch.status != "completed":
+            return None
+        results = {}
+        if batch.output_file_id:
+            results.update(parse_batch_output(self.openai_client.files.content(batch.output_file_id).text))
+        if batch.error_file_id:
+            for custom_id in parse_batch_output(self.openai_client.files.content(batch.error_file_id).text):
+                results.setdefault(custom_id, None)
+        return results
+
+
+@dataclass
+class LocalBatchBackend:
+    """
+    File-based stand-in for the Batch API (tests, local development): the input file
+    is copied under `directory` and run through ordinary chat completions on the
+    first poll, writing an output file in the Batch API format.
+    """
+    openai_client: OpenAI
+    directory: str
+
+    def __post_init__(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, batch_id: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{batch_id}.{kind}.jsonl")
+
+    def submit(self, input_path: str) -> str:
+        batch_id = f"local_{uuid.uuid4().hex}"
+        shutil.copyfile(input_path, self._path(batch_id, "input"))
+        return batch_id
+
+    def poll(self, batch_id: str) -> Optional[dict[str, Optional[str]]]:
+        output_path = self._path(batch_id, "output")
+        if not os.path.exists(output_path):
+            self._run(batch_id, output_path)
+        with open(output_path, encoding="utf-8") as f:
+            return parse_batch_output(f.read())
+
+    def _run(self, batch_id: str, output_path: str) -> None:
+        lines = []
+        with open(self._path(batch_id, "input"), encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                row = {"id": uuid.uuid4().hex, "custom_id": request["custom_id"], "response": None, "error": None}
+                try:
+                    resp = self.openai_client.chat.completions.create(**request["body"])
+                    row["response"] = {"status_code": 200, "body": resp.model_dump()}
+                except Exception as e:
+                    row["error"] = {"message": str(e)}
+                lines.append(json.dumps(row, ensure_ascii=False))
+        tmp = output_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, output_path)
+
+
+BatchBackend = Union[OpenAIBatchBackend, LocalBatchBackend]
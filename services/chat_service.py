@@ -3,7 +3,10 @@ import json
 import asyncio
 from datetime import datetime, timezone
 import re
-from openai import OpenAI
+import time
+from functools import lru_cache
+from typing import Optional
+from openai import OpenAI, AsyncOpenAI
 from realtime import RealtimeSubscribeStates
 from collections import defaultdict
 from dataclasses import field
@@ -13,12 +16,21 @@ from repositories.messages import MessageRepository
 from repositories.conversations import ConversationRepository
 from repositories.therapists import TherapistRepository
 from repositories.user_profiles import UserProfileRepository
-from constants.prompts import PROFILE_PROMPT_TEMPLATE
+from repositories.conversation_context import ConversationContext, ConversationContextRepository
+from repositories.cache import RepositoryCacheRegistry
+from services.rolling_summary_service import RollingSummaryService
+from services.prompt_cache import PromptCache
+from services.payload_assembler import PayloadAssembler, PayloadSection
+from services.model_router import ModelRouter, RouteDecision
+from services.voice_stream import VoiceReplyStream
+from services.elevenlabs_service import ElevenLabsService
+from services.reply_queue import ReplyQueue, VOICE_PRIORITY, CHAT_PRIORITY
+from utils.tokens import count_tokens
+from utils.ttl_cache import TTLCache
+from utils.delta_writer import DeltaWriter, AsyncDeltaWriter
 
 from constants.prompts import (
-    DEFAULT_SYSTEM_PROMPT,
     SKY_EXAMPLE_DIALOG,
-    PERSONA_TEMPLATE,
     FUNCTION_DEFS,
 )
 
@@ -27,12 +39,31 @@ class ChatService:
     supabase_sync: Client
     supabase_async: AsyncClient
     openai_client: OpenAI
+    openai_async_client: AsyncOpenAI
     message_repo: MessageRepository
     conversation_repo: ConversationRepository
     therapist_repo: TherapistRepository
     user_profile_repo: UserProfileRepository
+    context_repo: ConversationContextRepository
+    rolling_summary: RollingSummaryService
+    prompt_cache: PromptCache
+    payload_assembler: PayloadAssembler
+    model_router: ModelRouter
     START_TS: str = datetime.now(timezone.utc).isoformat()
     MAX_HISTORY: int = 10
+    stream_flush_interval_ms: int = 250
+    stream_flush_chars: int = 120
+    ai_pipeline: str = "async"          # "async" | "sync"
+    ai_max_concurrency: int = 200
+    voice_streaming: bool = True
+    elevenlabs_service: Optional[ElevenLabsService] = None
+    repository_caches: Optional[RepositoryCacheRegistry] = None
+
+    _ai_semaphore: Optional[asyncio.Semaphore] = field(default=None, init=False)
+    _ai_tasks: set = field(default_factory=set, init=False)
+    # voice_enabled per conversation, only used to prioritize queued replies
+    _voice_modes: TTLCache = field(default_factory=lambda: TTLCache(maxsize=10_000, ttl_s=60), init=False)
+    reply_queue: ReplyQueue = field(init=False)
 
     _profile_injected_sessions: set[str] = field(default_factory=set, init=False)
     _reminded_fields: dict[str, set[str]] = field(default_factory=lambda: defaultdict(set), init=False)
@@ -43,155 +74,198 @@ class ChatService:
         "topics_on_mind": ["mindful", "mind", "think", "ponder", "topic", "interest", "anxious"],
     }, init=False)
 
-    def build_chat_payload(self, conv_id: str, voice_mode: bool = False) -> list[dict]:
+    def __post_init__(self):
+        self.reply_queue = ReplyQueue(
+            handler=self._run_reply,
+            priority_of=self._reply_priority,
+            workers=self.ai_max_concurrency,
+        )
+
+    def build_chat_payload(
+        self,
+        conv_id: str,
+        voice_mode: bool = False,
+        ctx: Optional[ConversationContext] = None,
+        model: str = "gpt-4-turbo",
+        max_tokens: int = 600,
+    ) -> list[dict]:
         """
-        1) Load memory_summary (and clear “needs_resummarization” if flagged)
-        2) Load message history
-        3) Load any therapist override (system_prompt)
-        4) Build `system_prompt` (override > persona_template > default)
-        5) Prepend that + SKY_EXAMPLE_DIALOG
-        6) Append “memory” message if brand‐new conversation
-        7) Turn DB rows into chat turns
-        8) If too many turns, ask OpenAI for a brief summary of older turns
+        1) Load the ConversationContext (memory, history, persona, profile) unless given
+        2) Build `system_prompt` (override > persona_template > default)
+        3) Add SKY_EXAMPLE_DIALOG and the profile
+        4) Add “memory” message if brand‐new conversation
+        5) Turn DB rows into chat turns
+        6) Keep the last MAX_HISTORY turns, older ones via the rolling summary
+        7) Add keyword-triggered profile reminders
+        8) Fit everything into the model's token budget
         """
-        # Fetch any saved memory
-        memory = self.conversation_repo.fetch_memory_summary(conv_id)
-
-        # 1a) if flagged for resummarization, clear it
-        self.conversation_repo.clear_memory_if_resummarize_flag(conv_id)
-        memory = "" if self.conversation_repo.fetch_memory_summary(conv_id) == "" else self.conversation_repo.fetch_memory_summary(conv_id)
-
-        # Fetch the message history
-        history = self.message_repo.fetch_history_for_conversation(conv_id)
-
-        # fetch which therapist this convo is using
-        therapist_id = self.conversation_repo.fetch_therapist_id(conv_id)
-        trow = self.therapist_repo.fetch_therapist_persona(therapist_id) if therapist_id else {}
-
-        # 4) pick which system_prompt to use
-        if trow.get("system_prompt"):
-            system_prompt = trow["system_prompt"]
-        elif trow:
-            specialties_list = ", ".join(trow.get("specialties", []))
-            system_prompt = PERSONA_TEMPLATE.format(
-                name=trow["name"],
-                description=trow["description"],
-                bio=trow["bio"],
-                approach=trow["approach"],
-                session_structure=trow["session_structure"],
-                specialties_list=specialties_list,
-            )
-        else:
-            system_prompt = DEFAULT_SYSTEM_PROMPT
-        
-        identity = trow.get("identity", {})               # e.g. {"orientation":"gay","gender":"female"}
-        if identity:
-            # build a little “identity details” string
-            id_parts = [f"{k.replace('_',' ')}: {v}" for k,v in identity.items()]
-            id_details = "; ".join(id_parts)
-            # tack it onto your chosen system_prompt
-            system_prompt += (
-                "\n\n"
-                f"Identity details: {id_details}.\n"
-                "Please only reference these aspects of your identity when they "
-                "help you empathize or illustrate a point—e.g. when discussing LGBTQ+ "
-                "topics, coming-out, relationship dynamics, or identity stress. "
-                "Otherwise, focus on the user’s concerns."
-            )
+        if ctx is None:
+            ctx = self.context_repo.load(conv_id)
+
+        # 2) compiled persona prompt (fetched & rendered only on a cache miss)
+        system_prompt = self.prompt_cache.system_prompt(ctx.therapist_id, ctx.persona_version)
+
+        sections = self._payload_sections(conv_id, ctx, system_prompt)
+
+        # 7) keyword-triggered reminders
+        reminders, updated_topics = self._drift_reminders(conv_id, ctx)
+        sections.append(PayloadSection("reminders", reminders, priority=5))
+        if updated_topics is not None:
+            self.supabase_sync.table("user_profiles") \
+                .update({"topics_on_mind": updated_topics}) \
+                .eq("user_id", ctx.patient_id) \
+                .execute()
+            self._invalidate_cached_rows("user_profiles", {"user_id": ctx.patient_id})
+            print(f"💾 Added topic_on_mind '{updated_topics[-1]}' to user_profiles")
+
+        return self._fit_payload(conv_id, sections, voice_mode, model, max_tokens)
+
+    async def build_chat_payload_async(
+        self,
+        conv_id: str,
+        voice_mode: bool = False,
+        ctx: Optional[ConversationContext] = None,
+        model: str = "gpt-4-turbo",
+        max_tokens: int = 600,
+    ) -> list[dict]:
+        """
+        Async twin of build_chat_payload (AsyncOpenAI + async Supabase client).
+        """
+        if ctx is None:
+            ctx = await self.context_repo.load_async(conv_id)
+
+        system_prompt = await self.prompt_cache.system_prompt_async(ctx.therapist_id, ctx.persona_version)
+
+        sections = self._payload_sections(conv_id, ctx, system_prompt)
+
+        reminders, updated_topics = self._drift_reminders(conv_id, ctx)
+        sections.append(PayloadSection("reminders", reminders, priority=5))
+        if updated_topics is not None:
+            await self.supabase_async.table("user_profiles") \
+                .update({"topics_on_mind": updated_topics}) \
+                .eq("user_id", ctx.patient_id) \
+                .execute()
+            self._invalidate_cached_rows("user_profiles", {"user_id": ctx.patient_id})
+            print(f"💾 Added topic_on_mind '{updated_topics[-1]}' to user_profiles")
+
+        return self._fit_payload(conv_id, sections, voice_mode, model, max_tokens)
 
-        # ─── 4a) inject profile ONCE at session start ────────────────────────────
-        row = self.supabase_sync.table("conversations") \
-            .select("patient_id") \
-            .eq("id", conv_id) \
-            .single() \
-            .execute()
-        patient_id = (row.data or {}).get("patient_id")
+    def _invalidate_cached_rows(self, table: str, record: dict) -> None:
+        if self.repository_caches is not None:
+            self.repository_caches.invalidate_record(table, record)
 
-        profile = {}
-        if patient_id:
-            profile = self.user_profile_repo.fetch_profile(patient_id) or {}
+    def _payload_sections(
+        self,
+        conv_id: str,
+        ctx: ConversationContext,
+        system_prompt: str,
+    ) -> list[PayloadSection]:
+        """
+        The payload as named sections, in send order (reminders are appended by the
+        caller). Priorities decide what is dropped first when over budget: example
+        dialog, then older verbatim turns, profile, summary, memory/reminders, and
+        finally the oldest recent turns.
+        """
+        memory = ctx.memory_summary
+        history = ctx.history
+        patient_id = ctx.patient_id
+        profile = ctx.profile
 
         # ─── build mini-profile text ────────────────────────────────────────────
-        mini = None
+        profile_msgs: list[dict] = []
         if profile:
-            mini = (
+            profile_msgs.append({"role": "system", "content": (
                 f"Profile: {profile.get('age','?')}-year-old {profile.get('gender','')}, "
                 f"{profile.get('career','Unknown')} who struggles with {profile.get('self_diagnosed_issues','none')}. "
                 f"Often thinks about {', '.join(profile.get('topics_on_mind',[]))}."
-            )
-
+            )})
 
+        # ─── 3a) inject full profile ONCE at session start ───────────────────────
         if patient_id and conv_id not in self._profile_injected_sessions:
-            profile = self.user_profile_repo.fetch_profile(patient_id)
             print(f"🛠️ DEBUG fetched profile: {profile}")
             if profile:
-                # render only non‐empty fields
-                details = []
-                for key, val in profile.items():
-                    if val:
-                        label = key.replace("_", " ").capitalize()
-                        # arrays → comma list
-                        if isinstance(val, list):
-                            val = ", ".join(val)
-                        details.append(f"{label}: {val}")
-                profile_str = "\n".join(details)
-                # append to system prompt
-                system_prompt += "\n\n" + PROFILE_PROMPT_TEMPLATE.format(
-                    profile_details=profile_str
-                )    
+                profile_msgs.insert(0, {"role": "system", "content": self.prompt_cache.profile_block(patient_id, profile)})
                 print("🔍 [debug] profile injected for session", conv_id)
                 self._profile_injected_sessions.add(conv_id)
 
-        # ─── 4a) inject mini profile AGAIN every 5 turns  ────────────────────────────
-        # 5) build initial messages
-        messages: list[dict] = [{"role": "system", "content": system_prompt}] + SKY_EXAMPLE_DIALOG
-
-        if mini:
-            messages.append({"role": "system", "content": mini})
-        messages.append({"role": "system", "content": system_prompt})
-        messages.extend(SKY_EXAMPLE_DIALOG)
-
-        # 5a) if brand‐new but memory exists, inject a “last time we talked about…” message
+        # 4) if brand‐new but memory exists, inject a “last time we talked about…” message
+        memory_msgs: list[dict] = []
         if memory and not history:
-            messages.append({
+            memory_msgs.append({
                 "role": "assistant",
                 "content": f"Last time we spoke, we discussed {memory}. Would you like to continue?"
             })
 
-        # 6) convert DB rows into chat turns
+        # 6) recent turns, older ones via the stored rolling summary
+        summary_msgs: list[dict] = []
+        older_rows: list[dict] = []
+        recent_rows = history
+        if len(history) > self.MAX_HISTORY:
+            if ctx.rolling_summary:
+                summary_msgs.append(
+                    {"role": "assistant", "content": f"Summary of earlier conversation: {ctx.rolling_summary}"}
+                )
+            # older turns the summary does not cover yet go verbatim while the refresh catches up
+            older_rows = self.rolling_summary.unsummarized_rows(ctx, self.MAX_HISTORY)
+            recent_rows = history[-self.MAX_HISTORY:]
+
+        return [
+            PayloadSection("system", [{"role": "system", "content": system_prompt}], required=True),
+            PayloadSection("examples", list(SKY_EXAMPLE_DIALOG), priority=1),
+            PayloadSection("profile", profile_msgs, priority=3),
+            PayloadSection("memory", memory_msgs, priority=5),
+            PayloadSection("summary", summary_msgs, priority=4),
+            PayloadSection("older_turns", self._to_turns(older_rows), priority=2, trim_oldest=True),
+            PayloadSection("recent_turns", self._to_turns(recent_rows), priority=6, trim_oldest=True, min_keep=1),
+        ]
+
+    def _fit_payload(
+        self,
+        conv_id: str,
+        sections: list[PayloadSection],
+        voice_mode: bool,
+        model: str,
+        max_tokens: int,
+    ) -> list[dict]:
+        # 8) reserve the completion and (voice mode) function definitions from the budget
+        reserve = max_tokens + (self._function_def_tokens(model) if voice_mode else 0)
+        assembled = self.payload_assembler.assemble(sections, model, reserve_tokens=reserve)
+        dropped = f", dropped {assembled.dropped}" if assembled.dropped else ""
+        print(f"📦 Payload for conv {conv_id}: {assembled.total_tokens}/{assembled.budget} tokens {assembled.breakdown}{dropped}")
+        return assembled.messages
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _function_def_tokens(model: str) -> int:
+        return count_tokens(json.dumps(FUNCTION_DEFS), model)
+
+    @staticmethod
+    def _to_turns(rows: list[dict]) -> list[dict]:
+        # 5) convert DB rows into chat turns
         turns: list[dict] = []
-        for m in history:
+        for m in rows:
             if m["sender_role"] == "user":
                 turns.append({"role": "user", "content": m["transcription"]})
             else:
                 turns.append({"role": "assistant", "content": m["assistant_text"]})
+        return turns
+
+    def _drift_reminders(self, conv_id: str, ctx: ConversationContext) -> tuple[list[dict], Optional[list[str]]]:
+        """
+        Keyword-triggered profile reminders for the last user message.
+        Returns (reminder messages, updated topics_on_mind to persist or None).
+        """
+        reminders: list[dict] = []
+        updated_topics = None
+        history = ctx.history
+        profile = ctx.profile
 
-        # 7) if too many turns, ask GPT to summarize the older ones
-        if len(turns) > self.MAX_HISTORY:
-            summary_resp = self.openai_client.chat.completions.create(
-                model="gpt-4-turbo" if voice_mode else "gpt-4-turbo",
-                messages=messages
-                         + [{"role": "assistant", "content": "Please summarize the earlier conversation briefly."}]
-                         + turns[:-self.MAX_HISTORY],
-                temperature=0.3,
-                max_tokens=600,
-            )
-            summary = summary_resp.choices[0].message.content
-            messages += [
-                {"role": "assistant", "content": f"Summary of earlier conversation: {summary}"}
-            ] + turns[-self.MAX_HISTORY:]
-        else:
-            messages += turns
-        
-        # ─── 5b) keyword-triggered reminders ───────────────────────────────
         # look at the last user message (if any)
         if conv_id in self._profile_injected_sessions and history:
             print("🔍 [debug] entering drift logic for", conv_id)
             last = history[-1]
             if last["sender_role"] == "user":
                 user_text = (last.get("transcription") or "").lower()
-                # reuse same fetched profile
-                profile = self.user_profile_repo.fetch_profile(patient_id)
                 for field, keywords in self._keyword_map.items():
                     if (
                         field not in self._reminded_fields[conv_id]
@@ -214,71 +288,282 @@ class ChatService:
                         old_topics = profile.get("topics_on_mind") or []
                         if field == "topics_on_mind" and new_topic and new_topic not in old_topics:
                             updated_topics = old_topics + [new_topic]
-                            self.supabase_sync.table("user_profiles") \
-                                .update({"topics_on_mind": updated_topics}) \
-                                .eq("user_id", patient_id) \
-                                .execute()
-                            print(f"💾 Added topic_on_mind '{new_topic}' to user_profiles")
-
-                        print("🔔 Drift reminder injected:", reminder)
-                        messages.append({"role": "system", "content": reminder})
+                            profile["topics_on_mind"] = updated_topics
+
+                        reminders.append({"role": "system", "content": reminder})
                         self._reminded_fields[conv_id].add(field)
 
-        return messages
+        return reminders, updated_topics
+
+    @staticmethod
+    def _needs_continuation(finish_reason: Optional[str], text: str) -> bool:
+        # truncated, or stopped mid‐sentence
+        return finish_reason == "length" or not text.strip().endswith((".", "!", "?"))
+
+    @staticmethod
+    def _crisis_reply(arguments: str) -> str:
+        args = json.loads(arguments)
+        return (
+            "I'm so sorry you’re feeling this way. "
+            f"If you ever think about harming yourself, call {args['hotline_number']}."
+        )
+
+    def _voice_row(self, msg: dict) -> dict:
+        # streamed voice replies start empty; text is published sentence by sentence
+        return {
+            "conversation_id": msg["conversation_id"],
+            "sender_role":     "assistant",
+            "assistant_text":  "",
+            "ai_status":       "pending",
+            "tts_status":      "pending",
+            "snippet_url":     ""
+        }
+
+    def _stream_voice_reply(self, msg: dict, payload: list[dict], model_name: str, max_tokens: int) -> str:
+        """
+        Voice mode, streamed: insert the assistant row up front, then publish
+        assistant_text every time a sentence finishes, so /tts-stream can serve
+        snippet 0 while later sentences are still generating. Function calls
+        (handle_suicidal_mention) are detected from the stream.
+        Returns the assistant message id.
+        """
+        insert_resp = self.supabase_sync.table("messages").insert(self._voice_row(msg)).execute()
+        mid = insert_resp.data[0]["id"]
+        snippet_url = f"/tts-stream/{mid}?snippet=0"
+        reply = VoiceReplyStream()
+        seeded = False
+
+        def publish(text: str) -> None:
+            nonlocal seeded
+            fields = {"assistant_text": text}
+            if not seeded:
+                fields["snippet_url"] = snippet_url
+                seeded = True
+            self.message_repo.update(mid, fields)
+
+        try:
+            t0 = time.monotonic()
+            stream = self.openai_client.chat.completions.create(
+                model=model_name,
+                messages=payload,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                functions=FUNCTION_DEFS,
+                function_call="auto",
+                stream=True,
+            )
+            t_first, chunks = None, 0
+            for chunk in stream:
+                if t_first is None:
+                    t_first = time.monotonic()
+                chunks += 1
+                text = reply.feed(chunk)
+                if text:
+                    publish(text)
+            if t_first is not None:
+                self.model_router.observe(model_name, t_first - t0, chunks, time.monotonic() - t_first)
+
+            if reply.is_function_call:
+                content = self._crisis_reply(reply.function_args)
+            else:
+                if self._needs_continuation(reply.finish_reason, reply.text):
+                    cont = self.openai_client.chat.completions.create(
+                        model=model_name,
+                        messages=payload + [{"role": "assistant", "content": reply.text}],
+                        temperature=0.7,
+                        max_tokens=200,
+                        stream=True,
+                    )
+                    reply.begin_continuation()
+                    for chunk in cont:
+                        text = reply.feed(chunk)
+                        if text:
+                            publish(text)
+                content = reply.text.strip()
+
+            self.message_repo.update(mid, {"assistant_text": content, "ai_status": "done", "snippet_url": snippet_url})
+        except Exception:
+            self._fail_voice_reply(mid)
+            raise
+        return mid
+
+    def _fail_voice_reply(self, mid: str) -> None:
+        # a row left "pending" would make /tts-stream wait for snippets that never come
+        try:
+            self.message_repo.update(mid, {"ai_status": "error", "tts_status": "error"})
+        except Exception as e:
+            print(f"❗ Could not mark voice reply {mid} as failed: {e}")
+        if self.elevenlabs_service is not None and self.elevenlabs_service.plan_cache is not None:
+            # the next plan_for re-reads the row and sees a finished (failed) reply
+            self.elevenlabs_service.plan_cache.pop(mid)
+
+    async def _stream_voice_reply_async(
+        self,
+        msg: dict,
+        payload: list[dict],
+        decision: RouteDecision,
+        therapist_id: Optional[str] = None,
+    ) -> str:
+        """
+        Async twin of _stream_voice_reply. The assistant row insert overlaps with
+        waiting for the first token, and the model is hedged like chat mode.
+        Each published sentence also refreshes the reply's TTS plan and prefetch.
+        """
+        insert_task = asyncio.ensure_future(
+            self.supabase_async.table("messages").insert(self._voice_row(msg)).execute()
+        )
+        voice_id_task = (
+            asyncio.ensure_future(self.elevenlabs_service.voice_id_for_async(therapist_id))
+            if self.elevenlabs_service is not None else None
+        )
+        try:
+            model_name, stream = await self.model_router.stream_hedged(
+                lambda model: self.openai_async_client.chat.completions.create(
+                    model=model,
+                    messages=payload,
+                    temperature=0.7,
+                    max_tokens=decision.max_tokens,
+                    functions=FUNCTION_DEFS,
+                    function_call="auto",
+                    stream=True,
+                ),
+                decision,
+            )
+        except Exception:
+            await self._discard(voice_id_task)
+            try:
+                insert_resp = await insert_task
+                await self._update_message_async(insert_resp.data[0]["id"], {"ai_status": "error", "tts_status": "error"})
+            except Exception as e:
+                # the model error is the one to surface
+                print(f"❗ Could not mark voice reply for {msg['id']} as failed: {e}")
+            raise
+
+        try:
+            insert_resp = await insert_task
+            mid = insert_resp.data[0]["id"]
+        except Exception:
+            await stream.aclose()
+            await self._discard(voice_id_task)
+            raise
+        snippet_url = f"/tts-stream/{mid}?snippet=0"
+        reply = VoiceReplyStream()
+        seeded = False
+
+        async def publish(text: str) -> None:
+            nonlocal seeded
+            fields = {"assistant_text": text}
+            if not seeded:
+                fields["snippet_url"] = snippet_url
+                seeded = True
+            await self._update_message_async(mid, fields)
+            await self._prepare_tts(mid, msg["conversation_id"], voice_id_task, text, complete=False)
+
+        try:
+            async for chunk in stream:
+                text = reply.feed(chunk)
+                if text:
+                    await publish(text)
+
+            if reply.is_function_call:
+                content = self._crisis_reply(reply.function_args)
+            else:
+                if self._needs_continuation(reply.finish_reason, reply.text):
+                    cont = await self.openai_async_client.chat.completions.create(
+                        model=model_name,
+                        messages=payload + [{"role": "assistant", "content": reply.text}],
+                        temperature=0.7,
+                        max_tokens=200,
+                        stream=True,
+                    )
+                    reply.begin_continuation()
+                    async for chunk in cont:
+                        text = reply.feed(chunk)
+                        if text:
+                            await publish(text)
+                content = reply.text.strip()
+
+            await self._update_message_async(mid, {"assistant_text": content, "ai_status": "done", "snippet_url": snippet_url})
+            await self._prepare_tts(mid, msg["conversation_id"], voice_id_task, content, complete=True)
+        except Exception:
+            await stream.aclose()
+            await self._fail_voice_reply_async(mid, msg["conversation_id"], voice_id_task, reply.text.strip())
+            raise
+        return mid
+
+    @staticmethod
+    async def _discard(task: Optional[asyncio.Future]) -> None:
+        # cancel, and retrieve its outcome so a failure is not reported as never retrieved
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def _fail_voice_reply_async(
+        self,
+        mid: str,
+        conv_id: str,
+        voice_id_task: Optional[asyncio.Future],
+        text: str,
+    ) -> None:
+        try:
+            await self._update_message_async(mid, {"ai_status": "error", "tts_status": "error"})
+        except Exception as e:
+            print(f"❗ Could not mark voice reply {mid} as failed: {e}")
+        # close the plan over what was published, so /tts-stream stops waiting for more
+        await self._prepare_tts(mid, conv_id, voice_id_task, text, complete=True)
+
+    async def _prepare_tts(
+        self,
+        mid: str,
+        conv_id: str,
+        voice_id_task: Optional[asyncio.Future],
+        text: str,
+        complete: bool,
+    ) -> None:
+        # cache the TTS plan and start synthesizing the first snippets, so /tts-stream
+        # answers without database round trips and, ideally, from memory
+        if voice_id_task is None:
+            return
+        try:
+            voice_id = await voice_id_task
+            self.elevenlabs_service.prepare_reply(mid, conv_id, voice_id, text, complete)
+        except Exception as e:
+            print(f"❗ TTS prepare skipped for {mid}: {e}")
 
     def handle_ai_record(self, msg: dict) -> None:
         """
-        1) Mark msg.ai_started = True
-        2) Check voice_enabled on the conversation
-        3) Build chat payload
-        4) Pick model based on user_text
+        1) Claim the message (ai_started false → true), or skip if someone else did
+        2) Load the ConversationContext (voice_enabled, persona, profile, history)
+        3) Pick model (text heuristic + live per-model latency)
+        4) Build chat payload within that model's token budget
         5) If chat mode: stream deltas into DB
-           If voice mode: run full completion, insert assistant_text + snippet_url
+           If voice mode: stream, publishing assistant_text sentence by sentence
+           (or, with voice_streaming off, run full completion + snippet_url)
         6) Finally set original msg.ai_status = "done"
+        7) Refresh the rolling summary for the next request
         """
-        # 1) skip if already started
-        if msg.get("ai_started"):
+        # 1) skip if already started; the conditional update makes the claim atomic
+        if msg.get("ai_started") or not self.message_repo.claim_for_ai(msg["id"]):
+            print(f"⏭️ Message {msg['id']} already claimed, skipping")
             return
 
-        self.supabase_sync.table("messages") \
-            .update({"ai_started": True}) \
-            .eq("id", msg["id"]) \
-            .execute()
-
         print(f"💬 ⏳ Generating AI reply for message {msg['id']}…")
         try:
-            # 2) figure out if voice_mode is on
-            conv_row = (
-                self.supabase_sync
-                .table("conversations")
-                .select("voice_enabled")
-                .eq("id", msg["conversation_id"])
-                .single()
-                .execute()
+            # 2) load conversation, persona, profile & history in one go
+            ctx = self.context_repo.load(msg["conversation_id"])
+            voice_mode = ctx.voice_enabled
+            self._voice_modes.set(ctx.conversation_id, voice_mode)
+
+            # 3) model selection
+            decision = self.model_router.choose(msg.get("transcription"), voice_mode)
+            model_name, max_tokens = decision.primary, decision.max_tokens
+            print(f"Selected model: {model_name} ({decision.reason})")
+
+            # 4) build payload within that model's token budget
+            payload = self.build_chat_payload(
+                msg["conversation_id"], voice_mode=voice_mode, ctx=ctx, model=model_name, max_tokens=max_tokens
             )
-            voice_mode = bool(conv_row.data.get("voice_enabled", False))
-
-            # 3) build payload
-            payload = self.build_chat_payload(msg["conversation_id"], voice_mode=voice_mode)
-
-            # 4) model selection
-            user_text = (msg.get("transcription") or "").strip()
-            lc = user_text.lower()
-
-            if lc.startswith(("what is ", "define ")):
-                model_name, max_tokens = "gpt-3.5-turbo", 150
-            elif lc.startswith(("i feel", "i’m feeling", "i am feeling", "i am", "i'm")):
-                model_name, max_tokens = "gpt-4-turbo", 600
-            elif lc.startswith(("why ", "how ", "explain ", "describe ", "compare ", "recommend ", "suggest ")):
-                model_name, max_tokens = "gpt-4-turbo", 600
-            else:
-                words = [w for w in user_text.split() if w.strip()]
-                if len(words) > 6:
-                    model_name, max_tokens = "gpt-4-turbo", 600
-                else:
-                    model_name, max_tokens = "gpt-3.5-turbo", 150
-
-            print("Selected model:", model_name)
 
             # 5) generate & store assistant reply
             if not voice_mode:
@@ -294,6 +579,7 @@ class ChatService:
                 mid = insert_resp.data[0]["id"]
 
                 # stream GPT‐style responses back into that “assistant_text” column
+                t0 = time.monotonic()
                 stream = self.openai_client.chat.completions.create(
                     model=model_name,
                     messages=payload,
@@ -302,22 +588,28 @@ class ChatService:
                     max_tokens=max_tokens
                 )
 
-                accumulated = ""
+                # coalesce partial text writes instead of one UPDATE per chunk
+                writer = DeltaWriter(
+                    write=lambda text: self.message_repo.update(mid, {"assistant_text": text}),
+                    interval_ms=self.stream_flush_interval_ms,
+                    max_chars=self.stream_flush_chars,
+                )
                 finish_reason = None
+                t_first = None
                 for chunk in stream:
-                    delta = chunk.choices[0].delta.content or ""
-                    accumulated += delta
+                    if t_first is None:
+                        t_first = time.monotonic()
+                    writer.append(chunk.choices[0].delta.content or "")
                     if chunk.choices[0].finish_reason:
                         finish_reason = chunk.choices[0].finish_reason
 
-                    # write partial text back
-                    self.supabase_sync.table("messages") \
-                        .update({"assistant_text": accumulated}) \
-                        .eq("id", mid) \
-                        .execute()
+                accumulated = writer.close()
+                if t_first is not None:
+                    self.model_router.observe(model_name, t_first - t0, writer.chunks, time.monotonic() - t_first)
+                print(f"✍️ Streamed {mid}: {writer.writes} writes for {writer.chunks} chunks ({writer.writes_saved} saved)")
 
                 # if truncated mid‐sentence, send a continuation prompt
-                if finish_reason == "length" or not accumulated.strip().endswith((".", "!", "?")):
+                if self._needs_continuation(finish_reason, accumulated):
                     cont = self.openai_client.chat.completions.create(
                         model=model_name,
                         messages=payload + [{"role": "assistant", "content": accumulated}],
@@ -337,8 +629,13 @@ class ChatService:
                     .eq("id", mid) \
                     .execute()
 
+            elif self.voice_streaming:
+                # —— VOICE MODE: stream, publishing each finished sentence ——
+                self._stream_voice_reply(msg, payload, model_name, max_tokens)
+
             else:
                 # —— VOICE MODE: full completion + snippet_url ——
+                t0 = time.monotonic()
                 resp = self.openai_client.chat.completions.create(
                     model=model_name,
                     messages=payload,
@@ -347,20 +644,17 @@ class ChatService:
                     functions=FUNCTION_DEFS,
                     function_call="auto"
                 )
+                latency = time.monotonic() - t0
+                self.model_router.observe(model_name, latency, getattr(resp.usage, "completion_tokens", 0) or 0, latency)
                 choice = resp.choices[0].message
 
                 # handle function calls (e.g. suicidal mentions)
                 if getattr(choice, "function_call", None):
-                    args = json.loads(choice.function_call.arguments)
-                    content = (
-                        "I'm so sorry you’re feeling this way. "
-                        f"If you ever think about harming yourself, call {args['hotline_number']}."
-                    )
+                    content = self._crisis_reply(choice.function_call.arguments)
                 else:
                     # base content
                     content = choice.content or ""
-                    finish_reason = resp.choices[0].finish_reason
-                    if finish_reason == "length" or not content.strip().endswith((".", "!", "?")):
+                    if self._needs_continuation(resp.choices[0].finish_reason, content):
                         cont = self.openai_client.chat.completions.create(
                             model=model_name,
                             messages=payload + [{"role": "assistant", "content": content}],
@@ -409,11 +703,217 @@ class ChatService:
                 .update({"ai_status": "error"}) \
                 .eq("id", msg["id"]) \
                 .execute()
+            return
+
+        # 7) reply is out; fold turns that left the window into the rolling summary
+        try:
+            self.rolling_summary.refresh(ctx, self.MAX_HISTORY)
+        except Exception as e:
+            print(f"❌ Rolling summary error for conv {msg['conversation_id']}: {e}")
+
+    async def handle_ai_record_async(self, msg: dict) -> None:
+        """
+        Async twin of handle_ai_record: AsyncOpenAI + the async Supabase client,
+        with at most `ai_max_concurrency` replies in flight per process.
+        """
+        if msg.get("ai_started"):
+            return
+
+        async with self._ai_slots:
+            if not await self.message_repo.claim_for_ai_async(msg["id"]):
+                print(f"⏭️ Message {msg['id']} already claimed, skipping")
+                return
+
+            print(f"💬 ⏳ Generating AI reply for message {msg['id']}…")
+            if self.elevenlabs_service is not None:
+                # the conversation moved on; audio prefetched for earlier replies won't be played
+                self.elevenlabs_service.cancel_prefetch(msg["conversation_id"])
+            try:
+                ctx = await self.context_repo.load_async(msg["conversation_id"])
+                voice_mode = ctx.voice_enabled
+                self._voice_modes.set(ctx.conversation_id, voice_mode)
+
+                decision = self.model_router.choose(msg.get("transcription"), voice_mode)
+                model_name, max_tokens = decision.primary, decision.max_tokens
+                print(f"Selected model: {model_name} ({decision.reason})")
+
+                payload = await self.build_chat_payload_async(
+                    msg["conversation_id"], voice_mode=voice_mode, ctx=ctx, model=model_name, max_tokens=max_tokens
+                )
+
+                if not voice_mode:
+                    # —— CHAT MODE: stream deltas into a new “assistant” row ——
+                    insert_resp = await self.supabase_async.table("messages").insert({
+                        "conversation_id": msg["conversation_id"],
+                        "sender_role":     "assistant",
+                        "assistant_text":  "",
+                        "ai_status":       "pending",
+                        "ai_started":      False,
+                        "tts_status":      "done"
+                    }).execute()
+                    mid = insert_resp.data[0]["id"]
+
+                    # primary model, hedged with the fallback if its first token is late
+                    model_name, stream = await self.model_router.stream_hedged(
+                        lambda model: self.openai_async_client.chat.completions.create(
+                            model=model,
+                            messages=payload,
+                            temperature=0.7,
+                            stream=True,
+                            max_tokens=max_tokens
+                        ),
+                        decision,
+                    )
+
+                    writer = AsyncDeltaWriter(
+                        write=lambda text: self._update_message_async(mid, {"assistant_text": text}),
+                        interval_ms=self.stream_flush_interval_ms,
+                        max_chars=self.stream_flush_chars,
+                    )
+                    finish_reason = None
+                    async for chunk in stream:
+                        await writer.append(chunk.choices[0].delta.content or "")
+                        if chunk.choices[0].finish_reason:
+                            finish_reason = chunk.choices[0].finish_reason
+
+                    accumulated = await writer.close()
+                    print(f"✍️ Streamed {mid}: {writer.writes} writes for {writer.chunks} chunks ({writer.writes_saved} saved)")
+
+                    if self._needs_continuation(finish_reason, accumulated):
+                        cont = await self.openai_async_client.chat.completions.create(
+                            model=model_name,
+                            messages=payload + [{"role": "assistant", "content": accumulated}],
+                            temperature=0.7,
+                            max_tokens=200
+                        )
+                        extra = cont.choices[0].message.content or ""
+                        accumulated = accumulated.rstrip() + " " + extra.strip()
+                        await self._update_message_async(mid, {"assistant_text": accumulated})
+
+                    await self._update_message_async(mid, {"ai_status": "done"})
+
+                elif self.voice_streaming:
+                    # —— VOICE MODE: stream, publishing each finished sentence ——
+                    await self._stream_voice_reply_async(msg, payload, decision, ctx.therapist_id)
+
+                else:
+                    # —— VOICE MODE: full completion + snippet_url ——
+                    model_name, resp = await self.model_router.complete_hedged(
+                        lambda model: self.openai_async_client.chat.completions.create(
+                            model=model,
+                            messages=payload,
+                            temperature=0.7,
+                            max_tokens=max_tokens,
+                            functions=FUNCTION_DEFS,
+                            function_call="auto"
+                        ),
+                        decision,
+                    )
+                    choice = resp.choices[0].message
+
+                    if getattr(choice, "function_call", None):
+                        content = self._crisis_reply(choice.function_call.arguments)
+                    else:
+                        content = choice.content or ""
+                        if self._needs_continuation(resp.choices[0].finish_reason, content):
+                            cont = await self.openai_async_client.chat.completions.create(
+                                model=model_name,
+                                messages=payload + [{"role": "assistant", "content": content}],
+                                temperature=0.7,
+                                max_tokens=200,
+                                functions=FUNCTION_DEFS,
+                                function_call="auto"
+                            )
+                            extra = cont.choices[0].message.content or ""
+                            content = content.rstrip() + " " + extra.lstrip()
+
+                    insert_resp = await self.supabase_async.table("messages").insert({
+                        "conversation_id": msg["conversation_id"],
+                        "sender_role":     "assistant",
+                        "assistant_text":  content,
+                        "ai_status":       "done",
+                        "tts_status":      "pending",
+                        "snippet_url":     ""
+                    }).execute()
+                    mid = insert_resp.data[0]["id"]
+
+                    try:
+                        await self._update_message_async(mid, {"snippet_url": f"/tts-stream/{mid}?snippet=0"})
+                    except Exception:
+                        await self._update_message_async(mid, {"tts_status": "error"})
+
+                    if self.elevenlabs_service is not None:
+                        await self._prepare_tts(
+                            mid, msg["conversation_id"],
+                            asyncio.ensure_future(self.elevenlabs_service.voice_id_for_async(ctx.therapist_id)),
+                            content,
+                            complete=True,
+                        )
+
+                await self._update_message_async(msg["id"], {"ai_status": "done"})
+
+                print(f"✅ Assistant response created for message {msg['id']}")
+            except Exception as e:
+                print(f"❌ AI error for {msg['id']}: {e}")
+                await self._update_message_async(msg["id"], {"ai_status": "error"})
+                return
+
+        # refresh the rolling summary in the background, outside the reply slot
+        self._spawn(self._refresh_rolling_summary_async(ctx))
+
+    async def _refresh_rolling_summary_async(self, ctx: ConversationContext) -> None:
+        try:
+            await self.rolling_summary.refresh_async(ctx, self.MAX_HISTORY)
+        except Exception as e:
+            print(f"❌ Rolling summary error for conv {ctx.conversation_id}: {e}")
+
+    async def _update_message_async(self, message_id: str, fields: dict) -> None:
+        await self.supabase_async.table("messages").update(fields).eq("id", message_id).execute()
+
+    @property
+    def _ai_slots(self) -> asyncio.Semaphore:
+        # created lazily so it binds to the running loop
+        if self._ai_semaphore is None:
+            self._ai_semaphore = asyncio.Semaphore(self.ai_max_concurrency)
+        return self._ai_semaphore
+
+    def dispatch_ai_record(self, msg: dict) -> None:
+        """
+        Queue a reply for `msg` without blocking the event loop. Must be called
+        from the loop thread. Replies for one conversation never interleave and
+        voice-mode conversations are served before chat mode.
+        """
+        self._spawn(self.reply_queue.submit(msg))
+
+    async def _run_reply(self, msg: dict) -> None:
+        # `ai_pipeline == "sync"` keeps the old thread-pool path around for comparison
+        if self.ai_pipeline == "sync":
+            await asyncio.get_event_loop().run_in_executor(None, self.handle_ai_record, msg)
+        else:
+            await self.handle_ai_record_async(msg)
+
+    async def _reply_priority(self, msg: dict) -> int:
+        conv_id = msg["conversation_id"]
+        voice = self._voice_modes.get(conv_id)
+        if voice is None:
+            info = await self.conversation_repo.fetch_voice_info_async(conv_id)
+            voice = bool(info.get("voice_enabled", False))
+            self._voice_modes.set(conv_id, voice)
+        return VOICE_PRIORITY if voice else CHAT_PRIORITY
+
+    def _spawn(self, coro) -> asyncio.Task:
+        # keep a reference so fire-and-forget tasks are not garbage collected
+        task = asyncio.get_event_loop().create_task(coro)
+        self._ai_tasks.add(task)
+        task.add_done_callback(self._ai_tasks.discard)
+        return task
 
     async def start_realtime(self) -> None:
         """
         Kick off a Realtime subscription to “messages” table. Whenever
         a new user‐message row arrives (or gets edited), call handle_ai_record.
+        Also listens for therapist/profile/conversation UPDATEs to invalidate the
+        prompt cache and the repository caches.
         """
 
         def on_insert(payload):
@@ -425,8 +925,7 @@ class ChatService:
                 and msg.get("transcription_status") == "done"
                 and not msg.get("ai_started")
             ):
-                loop = asyncio.get_event_loop()
-                loop.run_in_executor(None, self.handle_ai_record, msg)
+                self.dispatch_ai_record(msg)
 
         def on_update(payload):
             msg = payload["data"]["record"]
@@ -437,8 +936,7 @@ class ChatService:
                 and msg.get("edited_at")  # only set by your edit‐message call
                 and not msg.get("ai_started")
             ):
-                loop = asyncio.get_event_loop()
-                loop.run_in_executor(None, self.handle_ai_record, msg)
+                self.dispatch_ai_record(msg)
 
         def on_subscribe(status, err):
             if status == RealtimeSubscribeStates.SUBSCRIBED:
@@ -446,11 +944,31 @@ class ChatService:
             else:
                 print("❗ Realtime status:", status, err)
 
+        def on_therapist_update(payload):
+            record = payload["data"]["record"]
+            self.prompt_cache.invalidate_therapist(record["id"])
+            self._invalidate_cached_rows("therapists", record)
+
+        def on_profile_update(payload):
+            record = payload["data"]["record"]
+            self.prompt_cache.invalidate_profile(record["user_id"])
+            self._invalidate_cached_rows("user_profiles", record)
+
+        def on_conversation_update(payload):
+            self._invalidate_cached_rows("conversations", payload["data"]["record"])
+
         channel = self.supabase_async.channel("messages_changes")
         channel.on_postgres_changes(event="INSERT", schema="public", table="messages", callback=on_insert)
         channel.on_postgres_changes(event="UPDATE", schema="public", table="messages", callback=on_update)
         await channel.subscribe(on_subscribe)
 
+        # drop compiled prompts and cached repository rows when a persona, profile or conversation changes
+        invalidation = self.supabase_async.channel("prompt_cache_invalidation")
+        invalidation.on_postgres_changes(event="UPDATE", schema="public", table="therapists", callback=on_therapist_update)
+        invalidation.on_postgres_changes(event="UPDATE", schema="public", table="user_profiles", callback=on_profile_update)
+        invalidation.on_postgres_changes(event="UPDATE", schema="public", table="conversations", callback=on_conversation_update)
+        await invalidation.subscribe(on_subscribe)
+
         # never return
         await asyncio.Event().wait()
 
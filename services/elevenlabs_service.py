@@ -1,12 +1,30 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, AsyncIterator, Optional
 from fastapi import HTTPException
 from supabase import Client
-import requests, re
-from fastapi.responses import StreamingResponse
+import asyncio, base64, json, time, requests
+import httpx
+from fastapi.responses import Response, StreamingResponse
 from repositories.messages import MessageRepository
 from repositories.conversations import ConversationRepository
 from repositories.therapists import TherapistRepository
+from utils.audio_cache import AudioCache
+from utils.ttl_cache import TTLCache
+from utils.upstream import CircuitOpenError, DeadlineExceeded
+from services.tts_prefetcher import TTSPrefetcher
+from services.tts_plan import TTSPlan, TTS_OUTPUT_FORMAT, TTS_VOICE_SETTINGS
+
+
+# a snippet's audio is fixed by its cache key, so clients may keep it
+TTS_CACHE_CONTROL = "private, max-age=86400, immutable"
+NO_CACHE_HEADERS = {
+    "Cache-Control": "no-cache, no-store, must-revalidate",
+    "Transfer-Encoding": "chunked",
+}
+ELEVENLABS_BASE_URL = "https://api.elevenlabs.io"
+# how often /tts-stream/{id}/all re-checks a reply that is still being written
+PENDING_POLL_S = 0.25
+
 
 @dataclass
 class ElevenLabsService:
@@ -16,9 +34,15 @@ class ElevenLabsService:
     supabase_sync: Client
     elevenlabs_session: requests.Session
     default_voice_id: str
+    audio_cache: Optional[AudioCache] = None
+    elevenlabs_async_client: Optional[httpx.AsyncClient] = None
+    base_url: str = ELEVENLABS_BASE_URL
+    prefetcher: Optional[TTSPrefetcher] = None
+    plan_cache: Optional[TTLCache] = None
+    pending_wait_s: float = 30.0
 
     def warmup_elevenlabs_pool(self) -> None:
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.default_voice_id}"
+        url = f"{self.base_url}/v1/text-to-speech/{self.default_voice_id}"
         for _ in range(3):
             try:
                 self.elevenlabs_session.head(url, timeout=1)
@@ -43,55 +67,399 @@ class ElevenLabsService:
         except:
             pass
 
-    def fetch_and_stream(self, message_id: str, snippet: int = 0) -> StreamingResponse:
+    async def warmup_elevenlabs_async_pool(self, connections: int = 3) -> None:
+        # open a few keep-alive connections so the first /tts-stream skips the TLS handshake
+        url = f"/v1/text-to-speech/{self.default_voice_id}"
+        await asyncio.gather(
+            *(self.elevenlabs_async_client.head(url, timeout=1) for _ in range(connections)),
+            return_exceptions=True,
+        )
+
+    def fetch_and_stream(self, message_id: str, snippet: int = 0, if_none_match: Optional[str] = None) -> Response:
         """
         Full flow for the /tts-stream/{message_id} endpoint:
-          1) fetch assistant_text + conversation_id
-          2) sanitize & split
-          3) verify voice_enabled & pick voice_id from therapist
-          4) proxy the stream to ElevenLabs and return a FastAPI StreamingResponse
+          1) get the message's TTS plan (cached; built from assistant_text +
+             voice_enabled + therapist voice_id on a miss)
+          2) pick the snippet, verify voice_enabled
+          3) serve from the audio cache (304 if the client already has it), or
+             proxy the stream to ElevenLabs, tee'ing it into the cache
         """
-        msg = self.message_repo.fetch_text(message_id)
-        text = msg.get("assistant_text", "")
-        if not text:
-            raise HTTPException(404, "No assistant_text for that message")
+        plan = self.plan_for(message_id, snippet)
+        self._check_snippet(plan, snippet)
+        piece = plan.sentences[snippet]
+        voice_id = plan.voice_id
 
-        sanitized = re.sub(r"[*/{}\[\]<>&#@_\\|+=%]", "", text)
-        sentences = re.split(r'(?<=[.!?])\s+', sanitized)
-        if snippet < 0 or snippet >= len(sentences):
-            raise HTTPException(400, "snippet index out of range")
-        piece = sentences[snippet].strip()
+        if self.audio_cache is None:
+            chunk_generator = self.stream_tts_snippet(piece, custom_voice_id=voice_id)
+            return StreamingResponse(chunk_generator, media_type="audio/mpeg", headers=NO_CACHE_HEADERS)
 
-        convo = self.conversation_repo.fetch_voice_info(msg["conversation_id"])
+        key, headers = self._cache_headers(plan, snippet)
+        if self._etag_matches(headers["ETag"], if_none_match):
+            return Response(status_code=304, headers=headers)
 
-        if not convo.get("voice_enabled"):
-            raise HTTPException(403, "TTS only in Voice Mode")
+        audio = self.audio_cache.get(key)
+        if audio is not None:
+            return Response(audio, media_type="audio/mpeg", headers=headers)
 
-        therapist_id = convo.get("therapist_id")
-        if therapist_id:
-            eleven_id = self.therapist_repo.fetch_voice_id(therapist_id)
-            voice_id = eleven_id or self.default_voice_id
+        chunk_generator = self.stream_tts_snippet(piece, custom_voice_id=voice_id)
+        return StreamingResponse(
+            self.audio_cache.tee(key, chunk_generator),
+            media_type="audio/mpeg",
+            headers={**headers, "Transfer-Encoding": "chunked"},
+        )
+
+    async def fetch_and_stream_async(
+        self,
+        message_id: str,
+        snippet: int = 0,
+        if_none_match: Optional[str] = None,
+    ) -> Response:
+        """
+        Same flow as fetch_and_stream, without blocking the event loop: async Supabase
+        lookups, and the upstream request on the pooled httpx client. Chunks are forwarded
+        as they arrive; if the client disconnects, the upstream request is closed too.
+        Snippets n+1..n+k are prefetched in the background while snippet n is served.
+        """
+        plan = await self.plan_for_async(message_id, snippet)
+        self._check_snippet(plan, snippet)
+        piece = plan.sentences[snippet]
+
+        self.prefetch_snippets(plan, start=snippet + 1)
+
+        key, headers = self._cache_headers(plan, snippet)
+        if self.audio_cache is None:
+            headers = {"Cache-Control": NO_CACHE_HEADERS["Cache-Control"]}
         else:
-            voice_id = self.default_voice_id
+            if self._etag_matches(headers["ETag"], if_none_match):
+                return Response(status_code=304, headers=headers)
+            audio = await asyncio.to_thread(self.audio_cache.get, key)
+            if audio is not None:
+                return Response(audio, media_type="audio/mpeg", headers=headers)
 
-        chunk_generator = self.stream_tts_snippet(piece, custom_voice_id=voice_id)
+        if self.prefetcher is not None:
+            audio = await self.prefetcher.take(key)
+            if audio is not None:
+                if self.audio_cache is not None:
+                    await asyncio.to_thread(self.audio_cache.put, key, audio)
+                return Response(audio, media_type="audio/mpeg", headers=headers)
 
+        chunks = await self.stream_tts_snippet_async(piece, custom_voice_id=plan.voice_id)
+        if self.audio_cache is not None:
+            chunks = self.audio_cache.atee(key, chunks)
         return StreamingResponse(
-            chunk_generator,
+            chunks,
             media_type="audio/mpeg",
-            headers={
-                "Cache-Control": "no-cache, no-store, must-revalidate",
-                "Transfer-Encoding": "chunked",
-            },
+            headers={**headers, "Transfer-Encoding": "chunked"},
+        )
+
+    async def stream_all_async(self, message_id: str, markers: bool = False) -> StreamingResponse:
+        """
+        /tts-stream/{message_id}/all: the whole reply as one response. Sentence n+1 is
+        synthesized while sentence n is still being forwarded, over the same pooled
+        keep-alive connection. A reply that is still being written is followed until
+        it completes.
+
+        By default the body is plain audio/mpeg. With `markers`, it is NDJSON:
+        sentence_start / audio (base64) / sentence_end events carrying byte offsets
+        into the audio, then a final done event, so clients can highlight text.
+        """
+        plan = await self.plan_for_async(message_id, 0)
+        self._check_snippet(plan, 0)
+
+        events = self._pipelined_audio(self._follow_plan(plan))
+        headers = {"Cache-Control": NO_CACHE_HEADERS["Cache-Control"]}
+        if plan.complete:
+            headers["X-Snippet-Count"] = str(plan.snippet_count)
+        if markers:
+            return StreamingResponse(_marker_lines(events), media_type="application/x-ndjson", headers=headers)
+        return StreamingResponse(_audio_only(events), media_type="audio/mpeg", headers=headers)
+
+    async def _follow_plan(self, plan: TTSPlan) -> AsyncIterator[tuple[TTSPlan, int]]:
+        # yields (plan, index) per snippet; waits for more while the reply is still pending
+        i, waiting_since = 0, None
+        while True:
+            if i < plan.snippet_count:
+                if plan.sentences[i]:
+                    yield plan, i
+                i, waiting_since = i + 1, None
+                continue
+            if plan.complete:
+                return
+            waiting_since = waiting_since or time.monotonic()
+            if time.monotonic() - waiting_since > self.pending_wait_s:
+                print(f"⏱️ Gave up waiting for snippet {i} of {plan.message_id}")
+                return
+            await asyncio.sleep(PENDING_POLL_S)
+            plan = await self.plan_for_async(plan.message_id, i)
+
+    async def _pipelined_audio(
+        self,
+        snippets: AsyncIterator[tuple[TTSPlan, int]],
+    ) -> AsyncIterator[tuple[str, int, Any]]:
+        """
+        Yields ("start", i, text), ("audio", i, chunk)..., ("end", i, None) per snippet.
+        A snippet's synthesis starts once it is next in line, so exactly one sentence
+        is in flight ahead of the one being forwarded.
+        """
+        ready: asyncio.Queue = asyncio.Queue(maxsize=1)
+        pumps: set[asyncio.Task] = set()
+
+        async def produce():
+            try:
+                async for plan, i in snippets:
+                    chunks: asyncio.Queue = asyncio.Queue()
+                    await ready.put((plan, i, chunks))
+                    pumps.add(asyncio.ensure_future(self._pump_snippet(plan, i, chunks)))
+            except Exception as e:
+                await ready.put(e)
+                return
+            await ready.put(None)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                item = await ready.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                plan, i, chunks = item
+                yield "start", i, plan.sentences[i]
+                while True:
+                    chunk = await chunks.get()
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    yield "audio", i, chunk
+                yield "end", i, None
+        finally:
+            # client went away (or upstream failed): stop synthesizing what is left
+            producer.cancel()
+            for task in pumps:
+                task.cancel()
+
+    async def _pump_snippet(self, plan: TTSPlan, i: int, out: asyncio.Queue) -> None:
+        try:
+            async for chunk in await self._snippet_chunks(plan, i):
+                out.put_nowait(chunk)
+            out.put_nowait(None)
+        except Exception as e:
+            print(f"❌ TTS failed for {plan.message_id} snippet {i}: {e}")
+            out.put_nowait(e)
+
+    async def _snippet_chunks(self, plan: TTSPlan, i: int) -> AsyncIterator[bytes]:
+        # audio cache, then prefetch buffer, then a live upstream stream (tee'd into the cache)
+        key = plan.key(i)
+        if self.audio_cache is not None:
+            audio = await asyncio.to_thread(self.audio_cache.get, key)
+            if audio is not None:
+                return _once(audio)
+        if self.prefetcher is not None:
+            audio = await self.prefetcher.take(key)
+            if audio is not None:
+                if self.audio_cache is not None:
+                    await asyncio.to_thread(self.audio_cache.put, key, audio)
+                return _once(audio)
+        chunks = await self.stream_tts_snippet_async(plan.sentences[i], custom_voice_id=plan.voice_id)
+        return self.audio_cache.atee(key, chunks) if self.audio_cache is not None else chunks
+
+    def plan_for(self, message_id: str, snippet: Optional[int] = None) -> TTSPlan:
+        """
+        The message's TTS plan, from the plan cache when it covers `snippet`;
+        otherwise rebuilt from the database (reusing the cached voice lookup if any).
+        """
+        cached = self._cached_plan(message_id)
+        if cached is not None and cached.covers(snippet):
+            return cached
+
+        msg = self.message_repo.fetch_text(message_id)
+        if not msg:
+            raise HTTPException(404, "No assistant_text for that message")
+        if cached is not None and cached.conversation_id == msg.get("conversation_id"):
+            voice_enabled, voice_id = cached.voice_enabled, cached.voice_id
+        else:
+            convo = self.conversation_repo.fetch_voice_info(msg["conversation_id"])
+            voice_enabled = bool(convo.get("voice_enabled"))
+            voice_id = self.default_voice_id
+            if voice_enabled and convo.get("therapist_id"):
+                voice_id = self.therapist_repo.fetch_voice_id(convo["therapist_id"]) or self.default_voice_id
+        return self._store_plan(message_id, msg, voice_id, voice_enabled)
+
+    async def plan_for_async(self, message_id: str, snippet: Optional[int] = None) -> TTSPlan:
+        cached = self._cached_plan(message_id)
+        if cached is not None and cached.covers(snippet):
+            return cached
+
+        msg = await self.message_repo.fetch_text_async(message_id)
+        if not msg:
+            raise HTTPException(404, "No assistant_text for that message")
+        if cached is not None and cached.conversation_id == msg.get("conversation_id"):
+            voice_enabled, voice_id = cached.voice_enabled, cached.voice_id
+        else:
+            convo = await self.conversation_repo.fetch_voice_info_async(msg["conversation_id"])
+            voice_enabled = bool(convo.get("voice_enabled"))
+            voice_id = self.default_voice_id
+            if voice_enabled:
+                voice_id = await self.voice_id_for_async(convo.get("therapist_id"))
+        return self._store_plan(message_id, msg, voice_id, voice_enabled)
+
+    def _cached_plan(self, message_id: str) -> Optional[TTSPlan]:
+        return self.plan_cache.get(message_id) if self.plan_cache is not None else None
+
+    def _store_plan(self, message_id: str, msg: dict, voice_id: str, voice_enabled: bool) -> TTSPlan:
+        plan = TTSPlan.from_text(
+            message_id,
+            msg.get("conversation_id"),
+            msg.get("assistant_text", ""),
+            voice_id,
+            voice_enabled,
+            # voice replies are published sentence by sentence; later snippets may not exist yet
+            complete=msg.get("ai_status") != "pending",
         )
+        if self.plan_cache is not None:
+            self.plan_cache.set(message_id, plan)
+        return plan
+
+    async def voice_id_for_async(self, therapist_id: Optional[str]) -> str:
+        if therapist_id:
+            eleven_id = await self.therapist_repo.fetch_voice_id_async(therapist_id)
+            return eleven_id or self.default_voice_id
+        return self.default_voice_id
+
+    def prepare_reply(
+        self,
+        message_id: str,
+        conversation_id: str,
+        voice_id: str,
+        text: str,
+        complete: bool,
+    ) -> TTSPlan:
+        """
+        Called while a voice reply is being written: caches its TTS plan, so snippet
+        requests need no database round trips, and starts on snippets 0..k, which
+        the client is about to ask for.
+        """
+        plan = TTSPlan.from_text(message_id, conversation_id, text, voice_id, True, complete)
+        if self.plan_cache is not None:
+            self.plan_cache.set(message_id, plan)
+        if self.prefetcher is not None:
+            self.prefetch_snippets(plan, start=0, count=self.prefetcher.lookahead + 1)
+        return plan
+
+    def prefetch_snippets(self, plan: TTSPlan, start: int, count: Optional[int] = None) -> int:
+        """
+        Synthesize the plan's snippets [start, start+count) in the background (count
+        defaults to the prefetcher's lookahead), skipping anything already in the
+        audio cache. Returns how many syntheses were started.
+        """
+        if self.prefetcher is None or not plan.voice_enabled:
+            return 0
+        count = self.prefetcher.lookahead if count is None else count
+        started = 0
+        for i in range(start, min(start + count, plan.snippet_count)):
+            piece = plan.sentences[i]
+            if not piece:
+                continue
+            key = plan.key(i)
+            if self.audio_cache is not None and key in self.audio_cache:
+                continue
+            started += self.prefetcher.schedule(
+                key, plan.message_id, plan.conversation_id,
+                lambda piece=piece: self.synthesize_async(piece, plan.voice_id),
+            )
+        return started
+
+    def cancel_prefetch(self, conversation_id: str, keep_message_id: Optional[str] = None) -> int:
+        if self.prefetcher is None:
+            return 0
+        return self.prefetcher.cancel_conversation(conversation_id, keep_message_id)
+
+    async def synthesize_async(self, text: str, voice_id: str) -> bytes:
+        chunks = await self.stream_tts_snippet_async(text, custom_voice_id=voice_id)
+        return b"".join([chunk async for chunk in chunks])
+
+    @staticmethod
+    def _check_snippet(plan: TTSPlan, snippet: int) -> None:
+        """
+        Raises unless `snippet` indexes one of the plan's snippets and the
+        conversation is in Voice Mode.
+        """
+        if not plan.snippet_count:
+            if not plan.complete:
+                raise HTTPException(425, "snippet not generated yet")
+            raise HTTPException(404, "No assistant_text for that message")
+
+        if snippet < 0 or snippet >= plan.snippet_count:
+            if not plan.complete and snippet >= 0:
+                raise HTTPException(425, "snippet not generated yet")
+            raise HTTPException(400, "snippet index out of range")
+
+        if not plan.voice_enabled:
+            raise HTTPException(403, "TTS only in Voice Mode")
+
+    @staticmethod
+    def _cache_headers(plan: TTSPlan, snippet: int) -> tuple[str, dict]:
+        key = plan.key(snippet)
+        return key, {"ETag": f'"{key}"', "Cache-Control": TTS_CACHE_CONTROL}
+
+    @staticmethod
+    def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+        return bool(if_none_match) and etag in [t.strip() for t in if_none_match.split(",")]
+
+    async def stream_tts_snippet_async(
+        self,
+        text: str,
+        custom_voice_id: Optional[str] = None,
+        voice_settings: dict = TTS_VOICE_SETTINGS,
+    ) -> AsyncIterator[bytes]:
+        """
+        Async proxy of a streaming TTS call. The upstream status is checked before this
+        returns (so failures become a 502, not a truncated 200); the returned iterator
+        yields audio chunks and always closes the upstream response, including when the
+        consumer is cancelled because the client went away.
+        """
+        voice_id = custom_voice_id or self.default_voice_id
+        request = self.elevenlabs_async_client.build_request(
+            "POST",
+            f"/v1/text-to-speech/{voice_id}",
+            params={"output_format": TTS_OUTPUT_FORMAT},
+            json={"text": text, "voice_settings": voice_settings, "stream": True},
+        )
+        try:
+            upstream = await self.elevenlabs_async_client.send(request, stream=True)
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            raise HTTPException(503, f"TTS upstream unavailable: {e}")
+        except httpx.TimeoutException:
+            raise HTTPException(504, "TTS upstream timed out")
+        except httpx.HTTPError as e:
+            raise HTTPException(502, f"TTS upstream unavailable: {e}")
+
+        if upstream.status_code >= 400:
+            await upstream.aread()
+            await upstream.aclose()
+            raise HTTPException(502, f"TTS upstream returned {upstream.status_code}")
+
+        async def chunks():
+            try:
+                # the client's read timeout bounds the wait for each chunk
+                async for chunk in upstream.aiter_bytes(chunk_size=4096):
+                    yield chunk
+            except httpx.TimeoutException:
+                print(f"⏱️ TTS upstream stalled mid-stream for voice {voice_id}")
+                raise
+            finally:
+                await upstream.aclose()
+
+        return chunks()
 
     def stream_tts_snippet(
             self,
             text: str,
             custom_voice_id: Optional[str] = None,
-            stability: float = 0.45,
-            similarity_boost: float = 0.45,
-            latency_boost: bool = True,
+            stability: float = TTS_VOICE_SETTINGS["stability"],
+            similarity_boost: float = TTS_VOICE_SETTINGS["similarity_boost"],
+            latency_boost: bool = TTS_VOICE_SETTINGS["latency_boost"],
         ):
             """
             Proxy a streaming TTS call for a given chunk of text.
@@ -99,7 +467,8 @@ class ElevenLabsService:
             """
             voice_id = custom_voice_id or self.default_voice_id
             upstream = self.elevenlabs_session.post(
-                f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}",
+                f"{self.base_url}/v1/text-to-speech/{voice_id}",
+                params={"output_format": TTS_OUTPUT_FORMAT},
                 json={
                     "text": text,
                     "voice_settings": {
@@ -114,3 +483,29 @@ class ElevenLabsService:
             )
             upstream.raise_for_status()
             return upstream.iter_content(chunk_size=4096)
+
+
+async def _once(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+async def _audio_only(events: AsyncIterator[tuple[str, int, Any]]) -> AsyncIterator[bytes]:
+    async for kind, _, value in events:
+        if kind == "audio":
+            yield value
+
+
+async def _marker_lines(events: AsyncIterator[tuple[str, int, Any]]) -> AsyncIterator[bytes]:
+    offset = 0
+    count = 0
+    async for kind, i, value in events:
+        if kind == "start":
+            line = {"event": "sentence_start", "index": i, "text": value, "offset": offset}
+        elif kind == "audio":
+            line = {"event": "audio", "index": i, "data": base64.b64encode(value).decode("ascii")}
+            offset += len(value)
+        else:
+            line = {"event": "sentence_end", "index": i, "offset": offset}
+            count += 1
+        yield (json.dumps(line) + "\n").encode("utf-8")
+    yield (json.dumps({"event": "done", "snippets": count, "bytes": offset}) + "\n").encode("utf-8")
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    params: dict
+    status: str = "queued"
+    submitted_at: str = field(default_factory=_now_iso)
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    wait_s: Optional[float] = None
+    duration_s: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    _submitted: float = field(default_factory=time.monotonic, repr=False)
+    _future: Optional[Future] = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wait_s": self.wait_s,
+            "duration_s": self.duration_s,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+@dataclass
+class JobRunner:
+    """
+    Runs blocking work (summaries, sweeps) on a bounded thread pool so request
+    handlers can return a job id right away. Keeps every unfinished job plus the
+    last `max_history` finished ones for status queries.
+    """
+    max_workers: int = 4
+    max_history: int = 1000
+
+    _jobs: OrderedDict = field(default_factory=OrderedDict, init=False)
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="jobs")
+
+    def submit(self, kind: str, func: Callable[[], Any], **params) -> Job:
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        job._future = self._executor.submit(self._run, job, func)
+        return job
+
+    def _run(self, job: Job, func: Callable[[], Any]) -> Any:
+        started = time.monotonic()
+        job.status, job.started_at = "running", _now_iso()
+        job.wait_s = round(started - job._submitted, 4)
+        try:
+            job.result = func()
+            job.status = "done"
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+            print(f"❌ Job {job.kind} {job.id} failed: {e}")
+        finally:
+            job.finished_at = _now_iso()
+            job.duration_s = round(time.monotonic() - started, 4)
+        return job.result
+
+    async def wait(self, job: Job) -> Job:
+        await asyncio.wrap_future(job._future)
+        return job
+
+    def shutdown(self) -> None:
+        # queued jobs are dropped; running ones finish in the background
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _trim(self) -> None:
+        # caller holds the lock; drop the oldest finished jobs beyond max_history
+        finished = [k for k, j in self._jobs.items() if j.status in ("done", "failed")]
+        for k in finished[:max(len(finished) - self.max_history, 0)]:
+            del self._jobs[k]
+
+    def list_jobs(self, status: Optional[str] = None, kind: Optional[str] = None, limit: int = 100) -> list[dict]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        picked = [
+            j for j in reversed(jobs)
+            if (status is None or j.status == status) and (kind is None or j.kind == kind)
+        ]
+        return [j.to_dict() for j in picked[:limit]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        finished = [j for j in jobs if j.duration_s is not None]
+        started = [j for j in jobs if j.wait_s is not None]
+        return {
+            "workers": self.max_workers,
+            **{status: sum(1 for j in jobs if j.status == status) for status in JOB_STATUSES},
+            "avg_wait_s": round(sum(j.wait_s for j in started) / len(started), 4) if started else None,
+            "avg_duration_s": round(sum(j.duration_s for j in finished) / len(finished), 4) if finished else None,
+        }
@@ -0,0 +1,210 @@
+import asyncio
+import inspect
+import os
+import random
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Optional, Union
+from repositories.maintenance_leases import LocalLeaseRepository, MaintenanceLeaseRepository
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class LeaseHeld(Exception):
+    """
+    A job was not run: another replica holds its lease, or it is already running here.
+    """
+
+
+@dataclass
+class MaintenanceJob:
+    name: str
+    func: Callable[[], Any]
+    interval_s: float
+    jitter_s: float = 0.0
+    run_on_start: bool = False
+
+    runs: int = field(default=0, init=False)
+    failures: int = field(default=0, init=False)
+    skipped_not_leader: int = field(default=0, init=False)
+    skipped_running: int = field(default=0, init=False)
+    lease_renewals: int = field(default=0, init=False)
+    leases_lost: int = field(default=0, init=False)
+    running: bool = field(default=False, init=False)
+    last_started_at: Optional[str] = field(default=None, init=False)
+    last_finished_at: Optional[str] = field(default=None, init=False)
+    last_duration_s: Optional[float] = field(default=None, init=False)
+    last_result: Optional[str] = field(default=None, init=False)
+    next_run_at: Optional[str] = field(default=None, init=False)
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "interval_s": self.interval_s,
+            "jitter_s": self.jitter_s,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped_not_leader": self.skipped_not_leader,
+            "skipped_running": self.skipped_running,
+            "lease_renewals": self.lease_renewals,
+            "leases_lost": self.leases_lost,
+            "last_started_at": self.last_started_at,
+            "last_finished_at": self.last_finished_at,
+            "last_duration_s": self.last_duration_s,
+            "last_result": self.last_result,
+            "next_run_at": self.next_run_at,
+        }
+
+
+@dataclass
+class MaintenanceScheduler:
+    """
+    Periodic housekeeping on the event loop.
+
+    - every job ticks every `interval_s` plus up to `jitter_s` of random delay, so
+      replicas started together do not all hit the database at once
+    - before each run the job's lease is taken for one interval; only the holder runs
+      it, so each job runs once per cluster per interval (the holder keeps renewing
+      it, another replica takes over once it lapses)
+    - while a job runs its lease is renewed every third of that interval, so a run
+      longer than the interval is not picked up by a second replica
+    - run_now() starts a registered job on demand under the same lease
+    - coroutine jobs run on the loop; plain functions run on a dedicated executor
+    """
+    leases: Union[MaintenanceLeaseRepository, LocalLeaseRepository]
+    max_workers: int = 2
+
+    holder: str = field(
+        default_factory=lambda: f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}",
+        init=False,
+    )
+    _jobs: dict = field(default_factory=dict, init=False)
+    _tasks: list[asyncio.Task] = field(default_factory=list, init=False)
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, init=False)
+
+    def register(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        interval_s: float,
+        jitter_s: float = 0.0,
+        run_on_start: bool = False,
+    ) -> MaintenanceJob:
+        job = MaintenanceJob(name, func, interval_s, jitter_s, run_on_start)
+        self._jobs[name] = job
+        if self._tasks:
+            # registered after start(): begin ticking right away
+            self._tasks.append(asyncio.create_task(self._loop(job)))
+        return job
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="maintenance")
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self._jobs.values()]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        for job in self._jobs.values():
+            try:
+                await asyncio.to_thread(self.leases.release, job.name, self.holder)
+            except Exception as e:
+                print(f"⚠️ Could not release lease {job.name}: {e}")
+
+    async def _loop(self, job: MaintenanceJob) -> None:
+        first = True
+        while True:
+            delay = random.uniform(0, job.jitter_s)
+            if not (first and job.run_on_start):
+                delay += job.interval_s
+            first = False
+            job.next_run_at = (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+            await asyncio.sleep(delay)
+            await self.run_once(job)
+
+    async def run_once(self, job: MaintenanceJob) -> None:
+        try:
+            await self._run_leased(job)
+        except Exception:
+            pass    # skips and failures are recorded on the job
+
+    async def run_now(self, name: str) -> Any:
+        """
+        Run the registered job `name` right away, e.g. from an admin endpoint, and return
+        its result. Raises LeaseHeld if another replica holds the lease or the job is
+        already running here; the job's own exceptions propagate.
+        """
+        return await self._run_leased(self._jobs[name])
+
+    async def _run_leased(self, job: MaintenanceJob) -> Any:
+        if job.running:
+            job.skipped_running += 1
+            job.last_result = "skipped: already running"
+            raise LeaseHeld(f"{job.name} is already running")
+
+        ttl_s = job.interval_s + job.jitter_s
+        try:
+            leader = await asyncio.to_thread(self.leases.acquire, job.name, self.holder, ttl_s)
+        except Exception as e:
+            print(f"❗ Lease check failed for {job.name}: {e}")
+            leader = False
+        if not leader:
+            job.skipped_not_leader += 1
+            job.last_result = "skipped: not leader"
+            raise LeaseHeld(f"{job.name} is leased by another replica")
+
+        job.running = True
+        job.last_started_at = _now_iso()
+        started = time.monotonic()
+        renewer = asyncio.create_task(self._renew_lease(job, ttl_s))
+        try:
+            if inspect.iscoroutinefunction(job.func):
+                result = await job.func()
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(self._executor, job.func)
+            job.last_result = "ok"
+            return result
+        except Exception as e:
+            job.failures += 1
+            job.last_result = f"error: {e}"
+            print(f"❌ Maintenance job {job.name} failed: {e}")
+            raise
+        finally:
+            renewer.cancel()
+            job.runs += 1
+            job.running = False
+            job.last_finished_at = _now_iso()
+            job.last_duration_s = round(time.monotonic() - started, 3)
+
+    async def _renew_lease(self, job: MaintenanceJob, ttl_s: float) -> None:
+        while True:
+            await asyncio.sleep(ttl_s / 3)
+            try:
+                held = await asyncio.to_thread(self.leases.acquire, job.name, self.holder, ttl_s)
+            except Exception as e:
+                # keep trying; the lease is still ours for up to two more attempts
+                print(f"⚠️ Could not renew lease {job.name}: {e}")
+                continue
+            if not held:
+                job.leases_lost += 1
+                print(f"❗ Lost lease {job.name} while it was running")
+                return
+            job.lease_renewals += 1
+
+    def status(self) -> dict:
+        return {
+            "holder": self.holder,
+            "jobs": [job.status() for job in self._jobs.values()],
+        }
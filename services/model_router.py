@@ -0,0 +1,263 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+
+FAST_MODEL = "gpt-3.5-turbo"
+STRONG_MODEL = "gpt-4-turbo"
+
+
+@dataclass
+class ModelStats:
+    """
+    Rolling (EWMA) latency/throughput for one model.
+    """
+    ttft_s: Optional[float] = None
+    tokens_per_s: Optional[float] = None
+    samples: int = 0
+    errors: int = 0
+    hedges_started: int = 0
+    hedges_won: int = 0
+
+    def observe(self, alpha: float, ttft_s: float, tokens_per_s: Optional[float]) -> None:
+        self.samples += 1
+        self.ttft_s = ttft_s if self.ttft_s is None else alpha * ttft_s + (1 - alpha) * self.ttft_s
+        if tokens_per_s is not None:
+            self.tokens_per_s = (
+                tokens_per_s if self.tokens_per_s is None
+                else alpha * tokens_per_s + (1 - alpha) * self.tokens_per_s
+            )
+
+
+@dataclass
+class RouteDecision:
+    primary: str
+    max_tokens: int
+    fallback: Optional[str]
+    hedge_after_s: Optional[float]
+    reason: str
+
+
+@dataclass
+class ModelRouter:
+    """
+    Picks the reply model from the text heuristic *and* how each model is doing right now.
+
+    - the prefix/word-count heuristic gives the preferred model and max_tokens
+    - if that model's rolling time-to-first-token is over the mode's latency budget
+      (voice is tighter than chat) and the other model is within it, route to the other
+    - with hedging on, the other model is started as a fallback when the primary has
+      not produced a first token within the budget; whichever streams first wins
+    """
+    latency_budgets: dict[str, float] = field(default_factory=lambda: {"voice": 1.2, "chat": 2.5})
+    hedging: bool = True
+    alpha: float = 0.2
+
+    _stats: dict[str, ModelStats] = field(default_factory=dict, init=False)
+
+    @staticmethod
+    def heuristic(user_text: str) -> tuple[str, int]:
+        """
+        Pick (model_name, max_tokens) from the shape of the user's text.
+        """
+        user_text = (user_text or "").strip()
+        lc = user_text.lower()
+
+        if lc.startswith(("what is ", "define ")):
+            return FAST_MODEL, 150
+        elif lc.startswith(("i feel", "i’m feeling", "i am feeling", "i am", "i'm")):
+            return STRONG_MODEL, 600
+        elif lc.startswith(("why ", "how ", "explain ", "describe ", "compare ", "recommend ", "suggest ")):
+            return STRONG_MODEL, 600
+        else:
+            words = [w for w in user_text.split() if w.strip()]
+            if len(words) > 6:
+                return STRONG_MODEL, 600
+            else:
+                return FAST_MODEL, 150
+
+    def stats_for(self, model: str) -> ModelStats:
+        return self._stats.setdefault(model, ModelStats())
+
+    def choose(self, user_text: str, voice_mode: bool) -> RouteDecision:
+        preferred, max_tokens = self.heuristic(user_text)
+        other = FAST_MODEL if preferred == STRONG_MODEL else STRONG_MODEL
+        budget = self.latency_budgets["voice" if voice_mode else "chat"]
+
+        primary, reason = preferred, "heuristic"
+        pref_ttft = self.stats_for(preferred).ttft_s
+        other_ttft = self.stats_for(other).ttft_s
+        if pref_ttft is not None and pref_ttft > budget and other_ttft is not None and other_ttft <= budget:
+            primary, other, reason = other, preferred, f"{preferred} ttft {pref_ttft:.2f}s over {budget}s budget"
+
+        return RouteDecision(
+            primary=primary,
+            max_tokens=max_tokens,
+            fallback=other,
+            hedge_after_s=budget if self.hedging else None,
+            reason=reason,
+        )
+
+    def observe(self, model: str, ttft_s: float, tokens: int = 0, duration_s: float = 0.0) -> None:
+        """
+        Record one completion: time to first token, and tokens generated over the
+        streaming part (`duration_s` after the first token).
+        """
+        tps = tokens / duration_s if tokens and duration_s > 0 else None
+        self.stats_for(model).observe(self.alpha, ttft_s, tps)
+
+    def observe_error(self, model: str) -> None:
+        self.stats_for(model).errors += 1
+
+    async def stream_hedged(
+        self,
+        open_stream: Callable[[str], Awaitable[Any]],
+        decision: RouteDecision,
+    ) -> tuple[str, "HedgedStream"]:
+        """
+        Opens `open_stream(model)` for the primary and, if it has no first chunk within
+        `hedge_after_s` (or fails), for the fallback too. Returns the winning model and
+        an iterator over its chunks; the loser is cancelled and its stream closed.
+        Throughput is recorded once the returned iterator is exhausted; a caller that
+        stops early must aclose() it, which also closes the winner's stream.
+        """
+        async def first_chunk(model: str):
+            t0 = time.monotonic()
+            stream = await open_stream(model)
+            try:
+                chunk = await stream.__anext__()
+            except BaseException:
+                await _close(stream)
+                raise
+            return model, stream, chunk, time.monotonic() - t0
+
+        model, stream, chunk, ttft = await self._race(first_chunk, decision)
+
+        async def chunks():
+            t_first = time.monotonic()
+            tokens = 1
+            yield chunk
+            async for c in stream:
+                tokens += 1
+                yield c
+            self.observe(model, ttft, tokens, time.monotonic() - t_first)
+
+        return model, HedgedStream(chunks(), stream)
+
+    async def complete_hedged(
+        self,
+        create: Callable[[str], Awaitable[Any]],
+        decision: RouteDecision,
+    ) -> tuple[str, Any]:
+        """
+        Non-streaming variant: the whole completion counts as the first token.
+        """
+        async def attempt(model: str):
+            t0 = time.monotonic()
+            resp = await create(model)
+            return model, resp, None, time.monotonic() - t0
+
+        model, resp, _, latency = await self._race(attempt, decision)
+        usage = getattr(resp, "usage", None)
+        self.observe(model, latency, getattr(usage, "completion_tokens", 0) or 0, latency)
+        return model, resp
+
+    async def _race(self, attempt: Callable[[str], Awaitable[tuple]], decision: RouteDecision) -> tuple:
+        primary = asyncio.ensure_future(attempt(decision.primary))
+        # task -> (model, when that attempt started)
+        tasks = {primary: (decision.primary, time.monotonic())}
+
+        done, _ = await asyncio.wait({primary}, timeout=decision.hedge_after_s)
+        if primary in done and primary.exception() is None:
+            return primary.result()
+        if primary in done:
+            self.observe_error(decision.primary)
+            if not decision.fallback:
+                return primary.result()
+            del tasks[primary]
+
+        if decision.fallback:
+            if primary in tasks:
+                print(f"⏱️ {decision.primary} slow to first token, hedging with {decision.fallback}")
+                self.stats_for(decision.fallback).hedges_started += 1
+            tasks[asyncio.ensure_future(attempt(decision.fallback))] = (decision.fallback, time.monotonic())
+
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(set(tasks), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    model, _ = tasks.pop(task)
+                    if task.exception() is None:
+                        if model != decision.primary:
+                            self.stats_for(model).hedges_won += 1
+                        return task.result()
+                    self.observe_error(model)
+                    if not tasks:
+                        return task.result()
+        finally:
+            for task, (model, started) in tasks.items():
+                self._observe_loser(model, time.monotonic() - started)
+                task.cancel()
+                task.add_done_callback(_close_result)
+
+    def _observe_loser(self, model: str, waited_s: float) -> None:
+        # a cancelled attempt's first token is at least `waited_s` late; that only tells
+        # us something when it is worse than the current estimate, so routing adapts
+        # to a stalled model without a quick loss dragging its estimate down
+        stats = self.stats_for(model)
+        if stats.ttft_s is None or waited_s > stats.ttft_s:
+            stats.observe(self.alpha, waited_s, None)
+
+    def stats(self) -> dict:
+        return {
+            "latency_budgets": self.latency_budgets,
+            "hedging": self.hedging,
+            "models": {
+                name: {
+                    "ttft_s": round(s.ttft_s, 4) if s.ttft_s is not None else None,
+                    "tokens_per_s": round(s.tokens_per_s, 2) if s.tokens_per_s is not None else None,
+                    "samples": s.samples,
+                    "errors": s.errors,
+                    "hedges_started": s.hedges_started,
+                    "hedges_won": s.hedges_won,
+                }
+                for name, s in self._stats.items()
+            },
+        }
+
+
+class HedgedStream:
+    """
+    The winning stream's chunks, first one included. aclose() closes the upstream
+    stream too, also when iteration never started.
+    """
+    def __init__(self, chunks: AsyncIterator, stream: Any):
+        self._chunks = chunks
+        self._stream = stream
+
+    def __aiter__(self) -> "HedgedStream":
+        return self
+
+    async def __anext__(self):
+        return await self._chunks.__anext__()
+
+    async def aclose(self) -> None:
+        await self._chunks.aclose()
+        await _close(self._stream)
+
+
+async def _close(stream) -> None:
+    close = getattr(stream, "close", None)
+    if close is not None:
+        result = close()
+        if asyncio.iscoroutine(result):
+            await result
+
+
+def _close_result(task: asyncio.Task) -> None:
+    # a cancelled loser may still have opened its stream just before cancellation
+    if task.cancelled() or task.exception() is not None:
+        return
+    stream = task.result()[1]
+    asyncio.ensure_future(_close(stream))
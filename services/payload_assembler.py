@@ -0,0 +1,77 @@
+from dataclasses import dataclass, field
+from utils.tokens import count_message_tokens
+
+
+@dataclass
+class PayloadSection:
+    """
+    One named block of chat messages. When the payload is over budget, sections
+    with the lowest `priority` go first; `trim_oldest` sections shed their oldest
+    messages one at a time (down to `min_keep`) before being dropped entirely.
+    `required` sections are never dropped.
+    """
+    name: str
+    messages: list[dict]
+    priority: int = 0
+    required: bool = False
+    trim_oldest: bool = False
+    min_keep: int = 0
+
+
+@dataclass
+class AssembledPayload:
+    messages: list[dict]
+    breakdown: dict[str, int]       # tokens per section that made it in
+    total_tokens: int
+    budget: int
+    dropped: dict[str, int] = field(default_factory=dict)   # messages dropped per section
+
+
+@dataclass
+class PayloadAssembler:
+    """
+    Fits payload sections into a per-model prompt token budget.
+    `budgets` is the total request budget per model (prompt + completion);
+    the completion's max_tokens and any function definitions are reserved from it.
+    """
+    budgets: dict[str, int]
+    default_budget: int = 8000
+
+    def assemble(self, sections: list[PayloadSection], model: str, reserve_tokens: int = 0) -> AssembledPayload:
+        budget = max(self.budgets.get(model, self.default_budget) - reserve_tokens, 0)
+        sections = [
+            PayloadSection(s.name, list(s.messages), s.priority, s.required, s.trim_oldest, s.min_keep)
+            for s in sections if s.messages
+        ]
+        sizes = {id(s): count_message_tokens(s.messages, model) for s in sections}
+        total = sum(sizes.values())
+        dropped: dict[str, int] = {}
+
+        while total > budget:
+            victim = min(
+                (s for s in sections if not s.required and s.messages),
+                key=lambda s: s.priority,
+                default=None,
+            )
+            if victim is None:
+                break
+            if victim.trim_oldest and len(victim.messages) > victim.min_keep:
+                gone = [victim.messages.pop(0)]
+                # never leave an assistant turn dangling at the front of a turn block
+                if victim.messages and victim.messages[0]["role"] == "assistant" \
+                        and len(victim.messages) > victim.min_keep:
+                    gone.append(victim.messages.pop(0))
+            else:
+                if victim.min_keep and victim.trim_oldest:
+                    # nothing left to trim without going below min_keep; stop shrinking it
+                    victim.required = True
+                    continue
+                gone, victim.messages = victim.messages, []
+            dropped[victim.name] = dropped.get(victim.name, 0) + len(gone)
+            new_size = count_message_tokens(victim.messages, model)
+            total -= sizes[id(victim)] - new_size
+            sizes[id(victim)] = new_size
+
+        messages = [m for s in sections for m in s.messages]
+        breakdown = {s.name: sizes[id(s)] for s in sections if s.messages}
+        return AssembledPayload(messages, breakdown, total, budget, dropped)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from repositories.therapists import TherapistRepository
+from utils.ttl_cache import TTLCache
+
+from constants.prompts import (
+    DEFAULT_SYSTEM_PROMPT,
+    PERSONA_TEMPLATE,
+    PROFILE_PROMPT_TEMPLATE,
+)
+
+
+def render_system_prompt(trow: dict[str, Any]) -> str:
+    """
+    Therapist override > persona template > default, plus the identity block.
+    """
+    if trow.get("system_prompt"):
+        system_prompt = trow["system_prompt"]
+    elif trow:
+        specialties_list = ", ".join(trow.get("specialties", []))
+        system_prompt = PERSONA_TEMPLATE.format(
+            name=trow["name"],
+            description=trow["description"],
+            bio=trow["bio"],
+            approach=trow["approach"],
+            session_structure=trow["session_structure"],
+            specialties_list=specialties_list,
+        )
+    else:
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+
+    identity = trow.get("identity", {})               # e.g. {"orientation":"gay","gender":"female"}
+    if identity:
+        # build a little “identity details” string
+        id_parts = [f"{k.replace('_',' ')}: {v}" for k,v in identity.items()]
+        id_details = "; ".join(id_parts)
+        # tack it onto the chosen system_prompt
+        system_prompt += (
+            "\n\n"
+            f"Identity details: {id_details}.\n"
+            "Please only reference these aspects of your identity when they "
+            "help you empathize or illustrate a point—e.g. when discussing LGBTQ+ "
+            "topics, coming-out, relationship dynamics, or identity stress. "
+            "Otherwise, focus on the user’s concerns."
+        )
+    return system_prompt
+
+
+def render_profile_block(profile: dict[str, Any]) -> str:
+    # render only non‐empty fields
+    details = []
+    for key, val in profile.items():
+        if val:
+            label = key.replace("_", " ").capitalize()
+            # arrays → comma list
+            if isinstance(val, list):
+                val = ", ".join(val)
+            details.append(f"{label}: {val}")
+    return PROFILE_PROMPT_TEMPLATE.format(profile_details="\n".join(details))
+
+
+def profile_hash(profile: dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(profile, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@dataclass
+class PromptCache:
+    """
+    Rendered system-prompt prefixes, keyed by (therapist_id, persona updated_at)
+    and profile blocks keyed by (patient_id, profile hash).
+
+    A persona is only fetched from the database on a miss, so the per-message path
+    needs nothing but the therapist's `updated_at`. Entries are also dropped
+    explicitly when realtime reports an UPDATE on `therapists` / `user_profiles`.
+    `therapist_repo` must read from the database, not through a CachedRepository:
+    a miss usually means a new persona version, newer than any cached row.
+    """
+    therapist_repo: TherapistRepository
+    maxsize: int = 512
+    ttl_s: float = 3600.0
+
+    _personas: TTLCache = field(init=False)
+    _profiles: TTLCache = field(init=False)
+
+    def __post_init__(self):
+        self._personas = TTLCache(maxsize=self.maxsize, ttl_s=self.ttl_s)
+        self._profiles = TTLCache(maxsize=self.maxsize, ttl_s=self.ttl_s)
+
+    def system_prompt(self, therapist_id: Optional[str], version: Optional[str]) -> str:
+        key = (therapist_id, version)
+        prompt = self._personas.get(key)
+        if prompt is None:
+            trow = self.therapist_repo.fetch_therapist_persona(therapist_id) if therapist_id else {}
+            prompt = render_system_prompt(trow)
+            self._personas.set(key, prompt)
+        return prompt
+
+    async def system_prompt_async(self, therapist_id: Optional[str], version: Optional[str]) -> str:
+        key = (therapist_id, version)
+        prompt = self._personas.get(key)
+        if prompt is None:
+            trow = await self.therapist_repo.fetch_therapist_persona_async(therapist_id) if therapist_id else {}
+            prompt = render_system_prompt(trow)
+            self._personas.set(key, prompt)
+        return prompt
+
+    def profile_block(self, patient_id: str, profile: dict[str, Any]) -> str:
+        key = (patient_id, profile_hash(profile))
+        block = self._profiles.get(key)
+        if block is None:
+            block = render_profile_block(profile)
+            self._profiles.set(key, block)
+        return block
+
+    def invalidate_therapist(self, therapist_id: str) -> None:
+        self._personas.invalidate_where(lambda k: k[0] == therapist_id)
+
+    def invalidate_profile(self, patient_id: str) -> None:
+        self._profiles.invalidate_where(lambda k: k[0] == patient_id)
+
+    def stats(self) -> dict:
+        return {"personas": self._personas.stats(), "profiles": self._profiles.stats()}
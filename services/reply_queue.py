@@ -0,0 +1,143 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+
+VOICE_PRIORITY = 0
+CHAT_PRIORITY = 1
+
+
+@dataclass
+class _Job:
+    msg: dict
+    enqueued_at: float
+    priority: Optional[int] = None   # None until priority_of() has answered
+
+
+@dataclass
+class ReplyQueue:
+    """
+    In-process work queue in front of the AI reply handler.
+
+    - jobs for the same conversation run one at a time, in arrival order
+    - among conversations, lower `priority` runs first (voice before chat), FIFO within a priority
+    - a message id already queued or running is not queued again
+    - `workers` bounds how many replies run at once
+    """
+    handler: Callable[[dict], Awaitable[None]]
+    priority_of: Callable[[dict], Awaitable[int]]
+    workers: int = 50
+
+    processed: int = field(default=0, init=False)
+    failed: int = field(default=0, init=False)
+    duplicates: int = field(default=0, init=False)
+    wait_total_s: float = field(default=0.0, init=False)
+    wait_max_s: float = field(default=0.0, init=False)
+
+    _ready: Optional[asyncio.PriorityQueue] = field(default=None, init=False)
+    _pending: dict[str, deque] = field(default_factory=dict, init=False)
+    _scheduled: set[str] = field(default_factory=set, init=False)
+    _running: set[str] = field(default_factory=set, init=False)
+    _known_ids: set[str] = field(default_factory=set, init=False)
+    _seq: itertools.count = field(default_factory=itertools.count, init=False)
+    _tasks: list[asyncio.Task] = field(default_factory=list, init=False)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._ready = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, msg: dict) -> bool:
+        """
+        Queue a reply for `msg`. Returns False if that message is already queued/running.
+        """
+        self.start()
+        if msg["id"] in self._known_ids:
+            self.duplicates += 1
+            return False
+        self._known_ids.add(msg["id"])
+
+        # take the message's place in its conversation before awaiting anything, so a
+        # slow priority lookup cannot let a later message overtake it
+        conv_id = msg["conversation_id"]
+        job = _Job(msg, time.monotonic())
+        self._pending.setdefault(conv_id, deque()).append(job)
+
+        try:
+            job.priority = await self.priority_of(msg)
+        except Exception as e:
+            print(f"❗ Reply priority lookup failed for {msg['id']}: {e}")
+            job.priority = CHAT_PRIORITY
+        except asyncio.CancelledError:
+            # give up the place, or the messages behind it would never be scheduled
+            self._pending[conv_id].remove(job)
+            if not self._pending[conv_id]:
+                del self._pending[conv_id]
+            self._known_ids.discard(msg["id"])
+            self._schedule(conv_id)
+            raise
+        self._schedule(conv_id)
+        return True
+
+    def _schedule(self, conv_id: str) -> None:
+        # a conversation sits in the ready queue at most once, and never while it is running
+        if conv_id in self._scheduled or conv_id in self._running or not self._pending.get(conv_id):
+            return
+        head = self._pending[conv_id][0]
+        if head.priority is None:
+            # its submit() schedules the conversation once the lookup returns
+            return
+        self._scheduled.add(conv_id)
+        self._ready.put_nowait((head.priority, next(self._seq), conv_id))
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, conv_id = await self._ready.get()
+            self._scheduled.discard(conv_id)
+            job = self._pending[conv_id].popleft()
+            self._running.add(conv_id)
+
+            wait = time.monotonic() - job.enqueued_at
+            self.wait_total_s += wait
+            self.wait_max_s = max(self.wait_max_s, wait)
+            try:
+                await self.handler(job.msg)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Reply job failed for {job.msg['id']}: {e}")
+            finally:
+                self._known_ids.discard(job.msg["id"])
+                self._running.discard(conv_id)
+                if not self._pending[conv_id]:
+                    del self._pending[conv_id]
+                self._schedule(conv_id)
+                self._ready.task_done()
+
+    def stats(self) -> dict:
+        started = self.processed + self.failed
+        waiting = [job for q in self._pending.values() for job in q]
+        now = time.monotonic()
+        return {
+            "depth": len(waiting),
+            "depth_voice": sum(1 for j in waiting if j.priority == VOICE_PRIORITY),
+            "conversations_waiting": sum(1 for q in self._pending.values() if q),
+            "running": len(self._running),
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates_skipped": self.duplicates,
+            "wait_avg_s": round(self.wait_total_s / started, 4) if started else None,
+            "wait_max_s": round(self.wait_max_s, 4),
+            "oldest_waiting_s": round(max((now - j.enqueued_at for j in waiting), default=0.0), 4),
+        }
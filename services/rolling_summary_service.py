@@ -0,0 +1,115 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+from openai import OpenAI, AsyncOpenAI
+from repositories.conversations import ConversationRepository
+from repositories.conversation_context import ConversationContext
+
+
+ROLLING_SUMMARY_PROMPT = """
+You maintain a running summary of a supportive therapy conversation.
+Fold the new turns into the existing summary. Keep what the user shared about
+their feelings, circumstances and goals, and any suggestions already offered.
+Reply with the updated summary only, in a few short paragraphs at most.
+""".strip()
+
+
+def _ts(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+
+@dataclass
+class RollingSummaryService:
+    """
+    Incremental summary of the turns that fell out of the chat window.
+
+    The summary and a watermark (created_at of the last folded message) live on the
+    conversations row, so each refresh only sends the turns that left the window since
+    the previous one instead of re-summarizing the whole prefix on every message.
+    """
+    conversation_repo: ConversationRepository
+    openai_client: OpenAI
+    openai_async_client: AsyncOpenAI
+    model: str = "gpt-4-turbo"
+
+    _in_flight: set[str] = field(default_factory=set, init=False)
+
+    def unsummarized_rows(self, ctx: ConversationContext, window: int, lookahead: int = 0) -> list[dict]:
+        """
+        History rows outside the last `window` turns that are newer than the watermark.
+        `lookahead` shifts the window as if that many more messages had arrived.
+        """
+        cut = len(ctx.history) + lookahead - window
+        if cut <= 0:
+            return []
+        until = _ts(ctx.rolling_summary_until)
+        return [
+            m for m in ctx.history[:cut]
+            if until is None or _ts(m["created_at"]) > until
+        ]
+
+    def refresh(self, ctx: ConversationContext, window: int, lookahead: int = 2) -> None:
+        """
+        Fold newly out-of-window turns into the stored summary. Meant to run after
+        a reply is sent; `lookahead=2` accounts for that reply and the next user
+        message so the next request finds the summary already up to date.
+        """
+        rows = self._claim(ctx, window, lookahead)
+        if not rows:
+            return
+        try:
+            resp = self.openai_client.chat.completions.create(**self._fold_request(ctx, rows))
+            self._store(ctx, rows, resp.choices[0].message.content)
+            self.conversation_repo.update_rolling_summary(
+                ctx.conversation_id, ctx.rolling_summary, ctx.rolling_summary_until
+            )
+        finally:
+            self._in_flight.discard(ctx.conversation_id)
+
+    async def refresh_async(self, ctx: ConversationContext, window: int, lookahead: int = 2) -> None:
+        rows = self._claim(ctx, window, lookahead)
+        if not rows:
+            return
+        try:
+            resp = await self.openai_async_client.chat.completions.create(**self._fold_request(ctx, rows))
+            self._store(ctx, rows, resp.choices[0].message.content)
+            await self.conversation_repo.update_rolling_summary_async(
+                ctx.conversation_id, ctx.rolling_summary, ctx.rolling_summary_until
+            )
+        finally:
+            self._in_flight.discard(ctx.conversation_id)
+
+    def _claim(self, ctx: ConversationContext, window: int, lookahead: int) -> list[dict]:
+        # one refresh per conversation at a time, so the same turns are not folded twice
+        if ctx.conversation_id in self._in_flight:
+            return []
+        rows = self.unsummarized_rows(ctx, window, lookahead)
+        if rows:
+            self._in_flight.add(ctx.conversation_id)
+        return rows
+
+    def _fold_request(self, ctx: ConversationContext, rows: list[dict]) -> dict:
+        lines = []
+        for m in rows:
+            if m["sender_role"] == "user":
+                lines.append(f"User: {m.get('transcription') or ''}")
+            else:
+                lines.append(f"Assistant: {m.get('assistant_text') or ''}")
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": ROLLING_SUMMARY_PROMPT},
+                {"role": "user", "content": (
+                    f"Summary so far:\n{ctx.rolling_summary or '(none yet)'}\n\n"
+                    "New turns:\n" + "\n".join(lines)
+                )},
+            ],
+            temperature=0.3,
+            max_tokens=600,
+        )
+
+    @staticmethod
+    def _store(ctx: ConversationContext, rows: list[dict], summary: Optional[str]) -> None:
+        ctx.rolling_summary = (summary or "").strip()
+        ctx.rolling_summary_until = rows[-1]["created_at"]
+        print(f"🧾 Rolling summary for conv {ctx.conversation_id} now covers up to {ctx.rolling_summary_until}")
@@ -1,89 +1,441 @@
-from dataclasses import dataclass
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone, timedelta
+from typing import Optional, Union
 from supabase import Client
 from services.openai_service import OpenAIService
 from repositories.messages import MessageRepository
 from repositories.conversations import ConversationRepository
+from repositories.summary_batches import LocalSummaryBatchRepository, SummaryBatchRepository
+from services.batch_backends import BatchBackend, BatchFailed, batch_request_line
+from services.maintenance_scheduler import MaintenanceScheduler
+from utils.tokens import count_message_tokens
 import threading
 
+# maintenance job name for the inactive-conversation sweep (and its lease)
+CLEANUP_JOB = "close_inactive_conversations"
+
+
+@dataclass
+class SweepReport:
+    cutoff: str
+    started_at: str
+    mode: str = "interactive"
+    running: bool = True
+    pages: int = 0
+    scanned: int = 0
+    summarized: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    ended: int = 0
+    # picked up as inactive, but updated again before they could be ended
+    still_active: int = 0
+    batches: int = 0
+    batched: int = 0
+    cursor: Optional[str] = None
+    duration_s: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
 @dataclass
 class SummarizerService:
     supabase_sync: Client
     openai_service: OpenAIService
     message_repo: MessageRepository
     conversation_repo: ConversationRepository
+    # inactive-conversation sweep: rows per keyset page, concurrent summaries per page
+    sweep_page_size: int = 100
+    sweep_concurrency: int = 4
+    sweep_jitter_s: float = 60.0
+    # summary prompt sample: opening turns, recent turns, token ceiling across both
+    summary_head_turns: int = 6
+    summary_tail_turns: int = 30
+    summary_token_budget: int = 1500
+    # "interactive": one chat completion per conversation; "batch": one batch job per sweep
+    sweep_mode: str = "interactive"
+    batch_backend: Optional[BatchBackend] = None
+    batch_repo: Optional[Union[SummaryBatchRepository, LocalSummaryBatchRepository]] = None
+    batch_wait_s: float = 0.0
+    batch_poll_s: float = 10.0
 
-    def summarize_and_store(self, conversation_id: str) -> None:
+    current_sweep: Optional[SweepReport] = field(default=None, init=False)
+    last_sweep: Optional[SweepReport] = field(default=None, init=False)
+    _sweep_lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def summarize_and_store(self, conversation_id: str) -> bool:
         """
-        1) Fetch all messages for `conversation_id`.
-        2) If there are ≥4 assistant replies, ask OpenAI for a short summary.
-        3) Store that summary in `conversations.memory_summary`.
+        1) Compare the conversation against the watermark stored with its summary;
+           stop if no message was added or removed since.
+        2) If there are ≥4 assistant replies, ask OpenAI for a short summary from a
+           token-bounded sample: the opening turns, the latest turns and the prior summary.
+        3) Store that summary and the new watermark on the conversations row.
+
+        Returns True if a new summary was written.
         """
-        history = self.message_repo.fetch_all_history_for_conversation(conversation_id)
+        plan = self._plan_summary(conversation_id)
+        if plan is None:
+            return False
+        self._store_summary(conversation_id, self._complete(plan), plan)
+        return True
 
-        # 2) require at least 4 assistant replies
-        assistant_count = sum(1 for m in history if m["sender_role"] == "assistant")
+    def _complete(self, plan: dict) -> str:
+        resp = self.openai_service.client.chat.completions.create(**plan["body"])
+        return resp.choices[0].message.content
+
+    def _plan_summary(self, conversation_id: str) -> Optional[dict]:
+        """
+        The chat-completion request body for a new summary plus the watermark it will
+        be stored with, or None if the conversation needs no (new) summary.
+        """
+        state = self.conversation_repo.fetch_summary_state(conversation_id)
+        total = self.message_repo.count_messages(conversation_id)
+        until = state.get("memory_summary_until")
+        if (
+            until
+            and not state.get("needs_resummarization")
+            and state.get("memory_summary_count") == total
+            and self.message_repo.count_messages(conversation_id, since=until) == 0
+        ):
+            print(f"⏭️ Summary for conv {conversation_id} is up to date")
+            return None
+
+        # require at least 4 assistant replies
+        assistant_count = self.message_repo.count_messages(conversation_id, sender_role="assistant")
         if assistant_count < 4:
             print(f"🛑 Skipping summary for conv {conversation_id} — only {assistant_count} assistant replies")
-            return
+            return None
 
-        # 3) build chat history for OpenAI
-        chat_history = []
-        for m in history:
-            role = "user" if m["sender_role"] == "user" else "assistant"
-            content = m["transcription"] if role == "user" else m["assistant_text"]
-            chat_history.append({"role": role, "content": content})
+        head, tail = self.message_repo.fetch_history_edges(
+            conversation_id, self.summary_head_turns, self.summary_tail_turns
+        )
+        chat_history = self._sample_history(head, tail)
 
-        # 4) ask OpenAI for a noun‐phrase summary
+        # ask OpenAI for a noun‐phrase summary
         prompt = """
         You are a concise summarizer. Return a single plain noun phrase (≤8 words)
         that captures the conversation topic. Do NOT return a full sentence,
         no punctuation, no articles like “the” or “a”.
         """.strip()
+        previous = "" if state.get("needs_resummarization") else (state.get("memory_summary") or "")
+        if previous:
+            prompt += f"\nThe topic so far was: {previous}. Keep it unless the conversation moved on."
+
+        return {
+            "body": {
+                "model": "gpt-3.5-turbo",
+                "messages": [{"role": "system", "content": prompt}] + chat_history,
+                "temperature": 0.5,
+                "max_tokens": 30,
+            },
+            # stored with the summary: the newest message and the count it was computed at
+            "until": tail[-1]["created_at"] if tail else None,
+            "count": total,
+            "sampled": len(chat_history),
+        }
 
-        resp = self.openai_service.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "system", "content": prompt}] + chat_history,
-            temperature=0.5,
-            max_tokens=30,
+    @staticmethod
+    def _clean_summary(raw: str) -> str:
+        return raw.strip().rstrip(".!?,;").strip()
+
+    def _store_summary(self, conversation_id: str, raw: str, plan: dict) -> None:
+        summary = self._clean_summary(raw)
+        self.conversation_repo.update_summary(
+            conversation_id, summary, until=plan["until"], message_count=plan["count"]
         )
-        raw = resp.choices[0].message.content.strip()
-        summary = raw.rstrip(".!?,;").strip()
+        print(f"🧠 Stored memory for conv {conversation_id}: {summary} ({plan['sampled']}/{plan['count']} turns sampled)")
+
+    def _sample_history(self, head: list[dict], tail: list[dict]) -> list[dict]:
+        """
+        Chat turns for the summary prompt within `summary_token_budget`: opening turns
+        take up to a third of it, the rest goes to the most recent turns.
+        """
+        def turn(m: dict) -> Optional[dict]:
+            role = "user" if m["sender_role"] == "user" else "assistant"
+            content = m["transcription"] if role == "user" else m["assistant_text"]
+            return {"role": role, "content": content} if content else None
 
-        # 5) store it
-        self.conversation_repo.update_summary(conversation_id, summary)
-        print(f"🧠 Stored memory for conv {conversation_id}: {summary}")
+        budget = self.summary_token_budget
+        opening, used = [], 0
+        for m in head:
+            t = turn(m)
+            if t is None:
+                continue
+            cost = count_message_tokens([t])
+            if used + cost > budget // 3:
+                break
+            opening.append(m["id"])
+            used += cost
 
-    def close_inactive_conversations(self, interval_hours: int = 1) -> None:
+        recent = []
+        for m in reversed(tail):
+            if m["id"] in opening:
+                break
+            t = turn(m)
+            if t is None:
+                continue
+            cost = count_message_tokens([t])
+            if used + cost > budget:
+                break
+            recent.append(m)
+            used += cost
+
+        picked = [m for m in head if m["id"] in opening] + list(reversed(recent))
+        return [t for t in map(turn, picked) if t is not None]
+
+    def close_inactive_conversations(self, interval_hours: int = 1) -> SweepReport:
         """
-        1) Find conversations where `ended = False` and `updated_at` < (now − 1h).
-        2) For each, run summarize_and_store and then set `ended = True`.
+        1) Page through conversations where `ended = False` and `updated_at` < (now − 1h),
+           ordered by id.
+        2) Summarize them and mark them `ended = True`, either interactively page by
+           page or, with `sweep_mode == "batch"`, through one batch job for the sweep.
+
+        If a sweep is already running, returns its report instead of starting another.
         """
+        if not self._sweep_lock.acquire(blocking=False):
+            print("⏭️ Inactive-conversation sweep already running")
+            return self.current_sweep
+
         now = datetime.now(timezone.utc)
-        cutoff = now - timedelta(hours=interval_hours)
+        cutoff_iso = (now - timedelta(hours=interval_hours)).isoformat()
+        report = SweepReport(cutoff=cutoff_iso, started_at=now.isoformat(), mode=self.sweep_mode)
+        self.current_sweep = report
+        started = time.monotonic()
         print("⏰ Checking for inactive conversations...")
 
-        # 1) find only active convs that have gone quiet for >1h
-        cutoff_iso = cutoff.isoformat()
-        stale_ids = self.conversation_repo.fetch_stale_conversation_ids(cutoff_iso)
+        try:
+            with ThreadPoolExecutor(max_workers=self.sweep_concurrency, thread_name_prefix="sweep") as pool:
+                if self.sweep_mode == "batch":
+                    self._sweep_batch(pool, report, started)
+                else:
+                    self._sweep_interactive(pool, report, started)
+        finally:
+            report.running = False
+            report.duration_s = round(time.monotonic() - started, 3)
+            self.last_sweep, self.current_sweep = report, None
+            self._sweep_lock.release()
 
-        for conv_id in stale_ids:
-            self.summarize_and_store(conv_id)
-            self.conversation_repo.mark_ended(conv_id)
+        print(
+            f"✅ Sweep done: {report.ended} ended, {report.failed} failed, {report.still_active} active again "
+            f"in {report.pages} pages, {report.duration_s}s"
+        )
+        return report
+
+    def _stale_pages(self, report: SweepReport, started: float):
+        while True:
+            page = self.conversation_repo.fetch_stale_conversation_ids(
+                report.cutoff, after_id=report.cursor, limit=self.sweep_page_size
+            )
+            if not page:
+                return
+            report.pages += 1
+            report.scanned += len(page)
+            report.cursor = page[-1]
+            yield page
+            report.duration_s = round(time.monotonic() - started, 3)
+            if len(page) < self.sweep_page_size:
+                return
 
-    def schedule_cleanup(self, interval_hours: int = 1) -> None:
+    def _sweep_interactive(self, pool: ThreadPoolExecutor, report: SweepReport, started: float) -> None:
         """
-        Kick off `close_inactive_conversations()` immediately, then
-        schedule it to run again every `interval_hours` hours.
+        Summarize each page with `sweep_concurrency` workers, then store the summaries
+        and mark the page ended (see _end_conversations). Each page is settled before the
+        next is fetched, so a sweep that dies midway only loses its current page; the
+        next sweep picks up whatever is still not ended. Conversations whose summary
+        failed stay open and are retried.
         """
-        def _job():
+        for page in self._stale_pages(report, started):
+            results = list(pool.map(self._summarize_for_sweep, page))
+            summaries, unchanged = {}, []
+            for conv_id, (ok, plan, raw) in zip(page, results):
+                if not ok:
+                    report.failed += 1
+                elif plan is None:
+                    unchanged.append(conv_id)
+                else:
+                    summaries[conv_id] = (raw, plan)
+            ended = self._end_conversations(summaries, unchanged, report.cutoff, report)
+            print(
+                f"🧹 Sweep page {report.pages}: {len(ended)}/{len(page)} ended "
+                f"({report.scanned} scanned, {round(time.monotonic() - started, 3)}s)"
+            )
+
+    def _summarize_for_sweep(self, conversation_id: str) -> tuple[bool, Optional[dict], Optional[str]]:
+        # (ok, plan, summary); plan is None when no new summary is needed
+        try:
+            plan = self._plan_summary(conversation_id)
+            if plan is None:
+                return True, None, None
+            return True, plan, self._complete(plan)
+        except Exception as e:
+            print(f"❌ Summary failed for conv {conversation_id}: {e}")
+            return False, None, None
+
+    def _end_conversations(
+        self,
+        summaries: dict[str, tuple[str, dict]],
+        unchanged: list[str],
+        cutoff_iso: str,
+        report: SweepReport,
+    ) -> list[str]:
+        """
+        Store `summaries` (conversation id → (summary, plan)) and end those conversations
+        plus the `unchanged` ones, but only where the conversation is still inactive since
+        `cutoff_iso`, the cutoff it was planned under: one that got a new message after the
+        plan's watermark keeps its summary state and stays open for the next sweep.
+        Staleness is decided once, up front; storing a summary bumps `updated_at`, so the
+        ending update only checks that the conversation is still open. A summary that
+        could not be stored leaves its conversation open. Returns the ids that were ended.
+        """
+        ids = list(summaries) + list(unchanged)
+        if not ids:
+            return []
+        stale = self.conversation_repo.filter_stale_conversation_ids(ids, cutoff_iso)
+
+        stored = []
+        for conv_id, (raw, plan) in summaries.items():
+            if conv_id not in stale:
+                continue
             try:
-                self.close_inactive_conversations(interval_hours=interval_hours)
-            except Exception:
-                # swallow exceptions so the Timer loop does not die
-                pass
-            # schedule next run
-            threading.Timer(interval_hours * 3600, _job).start()
-
-        # run for the first time right away
-        _job()
+                # a plain update: a row deleted meanwhile is skipped, never re-created
+                self.conversation_repo.update_summary(
+                    conv_id, self._clean_summary(raw), until=plan["until"], message_count=plan["count"]
+                )
+                stored.append(conv_id)
+            except Exception as e:
+                print(f"❌ Storing sweep summary for conv {conv_id} failed: {e}")
+                report.failed += 1
+        if stored:
+            print(f"🧠 Stored {len(stored)} sweep summaries")
+        ended = self.conversation_repo.mark_ended_many(
+            stored + [conv_id for conv_id in unchanged if conv_id in stale]
+        )
+
+        report.summarized += len(stored)
+        report.unchanged += sum(1 for conv_id in unchanged if conv_id in stale)
+        report.still_active += len(ids) - len(stale)
+        report.ended += len(ended)
+        return ended
+
+    def _sweep_batch(self, pool: ThreadPoolExecutor, report: SweepReport, started: float) -> None:
+        """
+        1) Apply any earlier batch that has finished since the last sweep.
+        2) Plan summaries for every stale conversation not already in a pending batch;
+           ones that need no summary are ended right away, page by page.
+        3) Write the planned requests to one JSONL file and submit it to the batch backend.
+        4) Poll for up to `batch_wait_s`; a batch still running is applied by a later sweep.
+
+        Pending batches are recorded through `batch_repo`, so they survive a restart and
+        any replica's next sweep can apply them. Conversations whose request failed stay open and are planned again next sweep.
+        """
+        self._collect_batches(report)
+        in_flight = self._pending_conversation_ids()
+
+        plans = {}
+        for page in self._stale_pages(report, started):
+            page = [conv_id for conv_id in page if conv_id not in in_flight]
+            results = list(pool.map(self._plan_for_sweep, page))
+            settled = []
+            for conv_id, (ok, plan) in zip(page, results):
+                if not ok:
+                    report.failed += 1
+                elif plan is None:
+                    settled.append(conv_id)
+                else:
+                    plans[conv_id] = plan
+            self._end_conversations({}, settled, report.cutoff, report)
+
+        if not plans:
+            return
+        batch = self._submit_batch(plans, report.cutoff)
+        report.batches += 1
+        report.batched += len(plans)
+        print(f"📦 Submitted summary batch {batch['batch_id']} with {len(plans)} conversations")
+
+        deadline = time.monotonic() + self.batch_wait_s
+        while not self._collect_batch(batch, report) and time.monotonic() < deadline:
+            time.sleep(self.batch_poll_s)
+
+    def _plan_for_sweep(self, conversation_id: str) -> tuple[bool, Optional[dict]]:
+        try:
+            return True, self._plan_summary(conversation_id)
+        except Exception as e:
+            print(f"❌ Summary planning failed for conv {conversation_id}: {e}")
+            return False, None
+
+    def _submit_batch(self, plans: dict[str, dict], cutoff_iso: str) -> dict:
+        fd, input_path = tempfile.mkstemp(prefix="summaries-", suffix=".jsonl")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for conv_id, plan in plans.items():
+                    f.write(batch_request_line(conv_id, plan["body"]) + "\n")
+            batch_id = self.batch_backend.submit(input_path)
+        finally:
+            os.remove(input_path)
+
+        # everything needed to apply the results, minus the prompts
+        pending = {conv_id: {k: v for k, v in plan.items() if k != "body"} for conv_id, plan in plans.items()}
+        self.batch_repo.add(batch_id, cutoff_iso, pending)
+        return {"batch_id": batch_id, "cutoff": cutoff_iso, "conversations": pending}
+
+    def _pending_conversation_ids(self) -> set[str]:
+        return {conv_id for batch in self.batch_repo.fetch_pending() for conv_id in batch["conversations"]}
+
+    def _collect_batches(self, report: SweepReport) -> None:
+        for batch in self.batch_repo.fetch_pending():
+            self._collect_batch(batch, report)
+
+    def _collect_batch(self, batch: dict, report: SweepReport) -> bool:
+        """
+        Apply a finished batch: store every summary that came back, then end those
+        conversations in one update. Returns False while the batch is still running or
+        could not be polled; a batch that failed outright is dropped, and its
+        conversations are planned again by the next sweep.
+        """
+        batch_id, conversations = batch["batch_id"], batch["conversations"]
+        try:
+            results = self.batch_backend.poll(batch_id)
+        except BatchFailed as e:
+            print(f"❌ Summary batch {batch_id} failed: {e}")
+            results = {}
+        except Exception as e:
+            print(f"⚠️ Could not poll summary batch {batch_id}, keeping it pending: {e}")
+            return False
+        if results is None:
+            return False
+
+        summaries = {
+            conv_id: (results[conv_id], plan)
+            for conv_id, plan in conversations.items()
+            if results.get(conv_id) is not None
+        }
+        # the conversations were checked for activity against the cutoff of the sweep that planned them
+        ended = self._end_conversations(summaries, [], batch["cutoff"], report)
+        self.batch_repo.remove(batch_id)
+
+        report.failed += len(conversations) - len(summaries)
+        print(f"📦 Applied summary batch {batch_id}: {len(ended)}/{len(conversations)} ended")
+        return True
+
+    def sweep_status(self) -> dict:
+        return {
+            "current": self.current_sweep.to_dict() if self.current_sweep else None,
+            "last": self.last_sweep.to_dict() if self.last_sweep else None,
+        }
+
+    def schedule_cleanup(self, scheduler: MaintenanceScheduler, interval_hours: int = 1) -> None:
+        """
+        Register `close_inactive_conversations()` with the maintenance scheduler: first
+        run shortly after startup, then every `interval_hours` hours, on one replica.
+        """
+        scheduler.register(
+            CLEANUP_JOB,
+            lambda: self.close_inactive_conversations(interval_hours=interval_hours),
+            interval_s=interval_hours * 3600,
+            jitter_s=self.sweep_jitter_s,
+            run_on_start=True,
+        )
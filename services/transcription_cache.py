@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+from utils.ttl_cache import TTLCache
+
+
+def transcription_cache_key(audio_sha256: str, model: str, language: Optional[str]) -> str:
+    material = json.dumps({"audio": audio_sha256, "model": model, "language": language}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class TranscriptionCache:
+    """
+    Transcripts keyed by the audio's content hash (plus model and language), so the
+    same recording attached to several messages is only sent to Whisper once.
+
+    - memory: LRU of `maxsize` entries, each kept for `ttl_s`
+    - sqlite: optional store at `db_path` that survives restarts (disabled when empty)
+    """
+    maxsize: int = 2048
+    ttl_s: float = 7 * 24 * 3600
+    db_path: str = ""
+
+    hits: int = field(default=0, init=False)
+    store_hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    stores: int = field(default=0, init=False)
+
+    _memory: TTLCache = field(init=False)
+    _db: Optional[sqlite3.Connection] = field(default=None, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        self._memory = TTLCache(self.maxsize, self.ttl_s)
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            with self._lock, self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS transcriptions "
+                    "(key TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.execute("DELETE FROM transcriptions WHERE created_at < ?", (time.time() - self.ttl_s,))
+
+    def get(self, key: str) -> Optional[str]:
+        text = self._memory.get(key)
+        if text is not None:
+            with self._lock:
+                self.hits += 1
+            return text
+
+        if self._db is not None:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT text, created_at FROM transcriptions WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - self.ttl_s),
+                ).fetchone()
+            if row is not None:
+                text, created_at = row
+                self._memory.set(key, text, ttl_s=max(created_at + self.ttl_s - time.time(), 0))
+                with self._lock:
+                    self.store_hits += 1
+                return text
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, text: str) -> None:
+        self._memory.set(key, text)
+        with self._lock:
+            self.stores += 1
+            if self._db is not None:
+                try:
+                    with self._db:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO transcriptions (key, text, created_at) VALUES (?, ?, ?)",
+                            (key, text, time.time()),
+                        )
+                except sqlite3.Error as e:
+                    print(f"⚠️ Transcription cache write failed for {key}: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.store_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl_s,
+            "persistent": self._db is not None,
+            "memory_hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.store_hits) / lookups, 4) if lookups else None,
+            "stores": self.stores,
+        }
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+@dataclass
+class _Job:
+    msg: dict
+    attempt: int
+    enqueued_at: float
+
+
+@dataclass
+class TranscriptionWorkerPool:
+    """
+    Queue of transcription jobs drained by `workers` concurrent workers.
+
+    - `handler(msg) -> bool` does the (blocking) work on a dedicated thread pool,
+      so transcriptions never run on the event loop or compete with other executors
+    - a message id already queued or running is not queued again
+    - a failed job is queued again after `retry_delay_s * attempt`, up to `max_attempts`
+    """
+    handler: Callable[[dict], bool]
+    workers: int = 4
+    max_attempts: int = 3
+    retry_delay_s: float = 5.0
+
+    submitted: int = field(default=0, init=False)
+    processed: int = field(default=0, init=False)
+    failed: int = field(default=0, init=False)
+    retried: int = field(default=0, init=False)
+    gave_up: int = field(default=0, init=False)
+    duplicates: int = field(default=0, init=False)
+    wait_total_s: float = field(default=0.0, init=False)
+    wait_max_s: float = field(default=0.0, init=False)
+    work_total_s: float = field(default=0.0, init=False)
+
+    _queue: Optional[asyncio.Queue] = field(default=None, init=False)
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, init=False)
+    _tasks: list[asyncio.Task] = field(default_factory=list, init=False)
+    _known_ids: set[str] = field(default_factory=set, init=False)
+    _running: int = field(default=0, init=False)
+    _started_at: Optional[float] = field(default=None, init=False)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transcribe")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._started_at = time.monotonic()
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def submit(self, msg: dict) -> bool:
+        """
+        Queue `msg` for transcription. Returns False if it is already queued/running.
+        Must be called from the event loop thread.
+        """
+        self.start()
+        if msg["id"] in self._known_ids:
+            self.duplicates += 1
+            return False
+        self._known_ids.add(msg["id"])
+        self.submitted += 1
+        self._queue.put_nowait(_Job(msg, 1, time.monotonic()))
+        return True
+
+    def _retry(self, job: _Job) -> None:
+        self.retried += 1
+        self._queue.put_nowait(_Job(job.msg, job.attempt + 1, time.monotonic()))
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            wait = time.monotonic() - job.enqueued_at
+            self.wait_total_s += wait
+            self.wait_max_s = max(self.wait_max_s, wait)
+
+            self._running += 1
+            started = time.monotonic()
+            retry_later = False
+            try:
+                ok = await loop.run_in_executor(self._executor, self.handler, job.msg)
+            except Exception as e:
+                print(f"❌ Transcription job crashed for {job.msg['id']}: {e}")
+                ok = False
+            finally:
+                self._running -= 1
+                self.work_total_s += time.monotonic() - started
+
+            try:
+                if ok:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+                    if job.attempt < self.max_attempts:
+                        retry_later = True
+                        loop.call_later(self.retry_delay_s * job.attempt, self._retry, job)
+                    else:
+                        self.gave_up += 1
+                        print(f"⛔ Giving up on transcription of {job.msg['id']} after {job.attempt} attempts")
+            finally:
+                if not retry_later:
+                    self._known_ids.discard(job.msg["id"])
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        started = self.processed + self.failed
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            "workers": self.workers,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "gave_up": self.gave_up,
+            "duplicates_skipped": self.duplicates,
+            "throughput_per_min": round(self.processed / uptime * 60, 2) if uptime else None,
+            "work_avg_s": round(self.work_total_s / started, 4) if started else None,
+            "wait_avg_s": round(self.wait_total_s / started, 4) if started else None,
+            "wait_max_s": round(self.wait_max_s, 4),
+        }
@@ -0,0 +1,78 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Optional
+from utils.text import split_sentences
+
+
+TTS_OUTPUT_FORMAT = "mp3_44100_128"
+TTS_VOICE_SETTINGS = {"stability": 0.45, "similarity_boost": 0.45, "latency_boost": True}
+
+
+def tts_cache_key(voice_id: str, text: str, voice_settings: dict, output_format: str = TTS_OUTPUT_FORMAT) -> str:
+    """
+    Content address for a synthesized snippet: same voice, text, settings and format
+    always produce the same audio, whichever user or message asked for it.
+    """
+    material = json.dumps(
+        {"voice_id": voice_id, "text": text, "settings": voice_settings, "format": output_format},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class TTSPlan:
+    """
+    Everything /tts-stream needs to serve any snippet of one assistant message:
+    the sanitized sentence list plus who speaks it and how. `complete` is False
+    while a voice reply is still being written, in which case more sentences
+    may follow.
+    """
+    message_id: str
+    conversation_id: str
+    sentences: list[str]
+    voice_id: str
+    voice_enabled: bool
+    complete: bool
+    voice_settings: dict = field(default_factory=lambda: dict(TTS_VOICE_SETTINGS))
+    output_format: str = TTS_OUTPUT_FORMAT
+
+    @classmethod
+    def from_text(
+        cls,
+        message_id: str,
+        conversation_id: str,
+        text: str,
+        voice_id: str,
+        voice_enabled: bool,
+        complete: bool,
+    ) -> "TTSPlan":
+        sentences = [s.strip() for s in split_sentences(text)] if text else []
+        return cls(message_id, conversation_id, sentences, voice_id, voice_enabled, complete)
+
+    @property
+    def snippet_count(self) -> int:
+        return len(self.sentences)
+
+    def covers(self, snippet: Optional[int]) -> bool:
+        """
+        True if this plan can answer for `snippet` without reloading the message.
+        """
+        return self.complete or (snippet is not None and 0 <= snippet < self.snippet_count)
+
+    def key(self, snippet: int) -> str:
+        return tts_cache_key(self.voice_id, self.sentences[snippet], self.voice_settings, self.output_format)
+
+    def to_dict(self) -> dict:
+        return {
+            "message_id": self.message_id,
+            "snippet_count": self.snippet_count,
+            "complete": self.complete,
+            "voice_enabled": self.voice_enabled,
+            "snippets": [
+                {"index": i, "text": s, "url": f"/tts-stream/{self.message_id}?snippet={i}"}
+                for i, s in enumerate(self.sentences)
+            ],
+        }
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+
+@dataclass
+class _Prefetch:
+    message_id: str
+    conversation_id: str
+    task: asyncio.Task
+    created_at: float
+    size: int = 0
+
+
+@dataclass
+class TTSPrefetcher:
+    """
+    Background synthesis of the snippets a voice client is about to ask for.
+
+    - entries are keyed by the TTS cache key and live at most `ttl_s` seconds
+    - finished audio is capped at `max_bytes` overall; the oldest entries go first
+    - at most `max_in_flight` syntheses run at once, so prefetch never starves live requests
+    - take() hands an entry over exactly once (waiting for it if still in flight)
+    - cancel_conversation() drops everything for a conversation that has moved on
+
+    An entry that is dropped (expired, evicted, cancelled) after its audio was
+    synthesized counts as wasted.
+    """
+    lookahead: int = 2
+    ttl_s: float = 30.0
+    max_bytes: int = 32 * 1024 * 1024
+    max_in_flight: int = 8
+
+    scheduled: int = field(default=0, init=False)
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    failed: int = field(default=0, init=False)
+    wasted: int = field(default=0, init=False)
+    wasted_bytes: int = field(default=0, init=False)
+    cancelled: int = field(default=0, init=False)
+
+    _entries: OrderedDict = field(default_factory=OrderedDict, init=False)
+    _bytes: int = field(default=0, init=False)
+    _slots: Optional[asyncio.Semaphore] = field(default=None, init=False)
+
+    def schedule(
+        self,
+        key: str,
+        message_id: str,
+        conversation_id: str,
+        synthesize: Callable[[], Awaitable[bytes]],
+    ) -> bool:
+        """
+        Start synthesizing `key` in the background unless it is already buffered.
+        Must be called from the event loop.
+        """
+        self._expire()
+        if key in self._entries:
+            return False
+        if self._slots is None:
+            # created lazily so it binds to the running loop
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        task = asyncio.ensure_future(self._run(key, synthesize))
+        self._entries[key] = _Prefetch(message_id, conversation_id, task, time.monotonic())
+        self.scheduled += 1
+        return True
+
+    async def _run(self, key: str, synthesize: Callable[[], Awaitable[bytes]]) -> bytes:
+        async with self._slots:
+            data = await synthesize()
+        entry = self._entries.get(key)
+        if entry is not None and entry.task is asyncio.current_task():
+            entry.size = len(data)
+            self._bytes += entry.size
+            self._enforce_cap()
+        return data
+
+    async def take(self, key: str) -> Optional[bytes]:
+        """
+        Returns the prefetched audio for `key`, or None if there is none (or it failed).
+        """
+        self._expire()
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._bytes -= entry.size
+        try:
+            data = await entry.task
+        except Exception as e:
+            print(f"❗ TTS prefetch failed for {entry.message_id}: {e}")
+            self.failed += 1
+            return None
+        self.hits += 1
+        return data
+
+    def cancel_message(self, message_id: str) -> int:
+        return self._drop_where(lambda e: e.message_id == message_id)
+
+    def cancel_conversation(self, conversation_id: str, keep_message_id: Optional[str] = None) -> int:
+        return self._drop_where(
+            lambda e: e.conversation_id == conversation_id and e.message_id != keep_message_id
+        )
+
+    def _drop_where(self, predicate: Callable[[_Prefetch], bool]) -> int:
+        doomed = [k for k, e in self._entries.items() if predicate(e)]
+        for key in doomed:
+            self._drop(key)
+        return len(doomed)
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if entry.task.done():
+            if not entry.task.cancelled() and entry.task.exception() is None:
+                self.wasted += 1
+                self.wasted_bytes += entry.size
+        else:
+            entry.task.cancel()
+            self.cancelled += 1
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_s
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.created_at > cutoff:
+                break
+            self._drop(key)
+
+    def _enforce_cap(self) -> None:
+        while self._bytes > self.max_bytes:
+            key = next((k for k, e in self._entries.items() if e.size), None)
+            if key is None:
+                break
+            self._drop(key)
+
+    def stats(self) -> dict:
+        settled = self.hits + self.wasted + self.cancelled
+        return {
+            "entries": len(self._entries),
+            "in_flight": sum(1 for e in self._entries.values() if not e.task.done()),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "lookahead": self.lookahead,
+            "scheduled": self.scheduled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "failed": self.failed,
+            "prefetch_hit_rate": round(self.hits / settled, 4) if settled else None,
+            "wasted": self.wasted,
+            "wasted_bytes": self.wasted_bytes,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,53 @@
+from dataclasses import dataclass, field
+from typing import Optional
+from utils.text import SentenceStream
+
+
+@dataclass
+class VoiceReplyStream:
+    """
+    Consumes streamed chat-completion chunks for a voice reply.
+
+    Content deltas go through a SentenceStream; feed() returns the text up to the
+    latest finished sentence when a new one completes. Function-call deltas
+    (e.g. handle_suicidal_mention) are collected instead of published.
+    """
+    sentences: SentenceStream = field(default_factory=SentenceStream)
+    function_name: Optional[str] = None
+    function_args: str = ""
+    finish_reason: Optional[str] = None
+    _joining: bool = False
+
+    def feed(self, chunk) -> Optional[str]:
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        fc = getattr(choice.delta, "function_call", None)
+        if fc is not None:
+            self.function_name = fc.name or self.function_name
+            self.function_args += fc.arguments or ""
+            return None
+        if self.function_name:
+            return None
+        content = choice.delta.content or ""
+        if self._joining:
+            content = content.lstrip()
+            self._joining = not content
+        return self.sentences.feed(content)
+
+    def begin_continuation(self) -> None:
+        """
+        Prepare to append a continuation request's chunks, joined the same way as the
+        non-streamed path: text.rstrip() + " " + continuation.lstrip().
+        """
+        self.sentences.text = self.sentences.text.rstrip() + " "
+        self.finish_reason = None
+        self._joining = True
+
+    @property
+    def is_function_call(self) -> bool:
+        return self.function_name is not None
+
+    @property
+    def text(self) -> str:
+        return self.sentences.text
@@ -1,62 +1,318 @@
+import asyncio
+import hashlib
 import io
-from dataclasses import dataclass
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Optional
 from openai import OpenAI
 from supabase import Client
-from datetime import datetime, timezone
+from supabase._async.client import AsyncClient
+from realtime import RealtimeSubscribeStates
+from datetime import datetime, timezone, timedelta
 import requests
+from repositories.messages import MessageRepository
+from services.maintenance_scheduler import MaintenanceScheduler
+from services.transcription_cache import TranscriptionCache, transcription_cache_key
+from services.transcription_pool import TranscriptionWorkerPool
+from utils.audio import preprocess_audio
+from utils.ttl_cache import TTLCache
+from utils.upstream import deadline
+
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
 
 @dataclass
 class WhisperService:
     supabase_sync: Client
     openai_client: OpenAI
-    elevenlabs_session: requests.Session
+    storage_session: requests.Session
+    message_repo: MessageRepository
+    supabase_async: Optional[AsyncClient] = None
     START_TS: str = datetime.now(timezone.utc).isoformat()
+    # download + Whisper share one deadline, so a slow download leaves less time for Whisper
+    transcription_deadline_s: float = 120.0
+    transcription_workers: int = 4
+    transcription_max_attempts: int = 3
+    transcription_retry_delay_s: float = 5.0
+    # a row in "processing" whose claim is older than this is taken over by the next worker
+    transcription_claim_timeout_s: float = 300.0
+    # storage paths are immutable, so a signed URL can be reused until shortly before it expires
+    signed_url_cache: Optional[TTLCache] = None
+    signed_url_ttl_s: int = 3600
+    signed_url_margin_s: int = 60
+    # audio up to this size is spooled in memory, anything larger goes to a temp file
+    spool_max_memory_bytes: int = 8 * 1024 * 1024
+    # trim silence / downmix / downsample PCM WAV before upload (other formats pass through)
+    audio_preprocess: bool = False
+    preprocess_silence_db: float = -45.0
+    transcription_model: str = "whisper-1"
+    transcription_language: Optional[str] = None
+    # transcripts by audio content hash, so re-sent recordings skip Whisper
+    transcription_cache: Optional[TranscriptionCache] = None
+    # called on the event loop with the message row once its transcript is stored
+    # (main.py points it at ChatService.dispatch_ai_record)
+    on_transcribed: Optional[Callable[[dict], None]] = None
 
-    def download_audio(self, path: str, bucket: str = "raw-audio") -> bytes:
-        """
-        Given a Supabase storage path, generate a signed URL and fetch the audio bytes.
-        """
-        signed = (
-            self.supabase
-                .client.storage
+    downloads: int = field(default=0, init=False)
+    download_bytes: int = field(default=0, init=False)
+    spilled_to_disk: int = field(default=0, init=False)
+    expired_urls: int = field(default=0, init=False)
+    preprocessed: int = field(default=0, init=False)
+    preprocess_bytes_saved: int = field(default=0, init=False)
+    preprocess_seconds_saved: float = field(default=0.0, init=False)
+    preprocess_audio_s: float = field(default=0.0, init=False)
+    preprocess_cpu_s: float = field(default=0.0, init=False)
+
+    reclaimed: int = field(default=0, init=False)
+
+    pool: TranscriptionWorkerPool = field(init=False)
+    _loop: Optional[asyncio.AbstractEventLoop] = field(default=None, init=False)
+
+    def __post_init__(self):
+        self.pool = TranscriptionWorkerPool(
+            self.handle_transcription_record,
+            workers=self.transcription_workers,
+            max_attempts=self.transcription_max_attempts,
+            retry_delay_s=self.transcription_retry_delay_s,
+        )
+
+    def signed_url(self, path: str, bucket: str = "raw-audio", fresh: bool = False) -> str:
+        key = (bucket, path)
+        if self.signed_url_cache is not None and not fresh:
+            url = self.signed_url_cache.get(key)
+            if url is not None:
+                return url
+        url = (
+            self.supabase_sync
+                .storage
                 .from_(bucket)
-                .create_signed_url(path, 60)["signedURL"]
+                .create_signed_url(path, self.signed_url_ttl_s)["signedURL"]
         )
-        resp = self.elevenlabs_session.get(signed, timeout=5)
-        resp.raise_for_status()
-        return resp.content
+        if self.signed_url_cache is not None:
+            self.signed_url_cache.set(key, url, ttl_s=max(self.signed_url_ttl_s - self.signed_url_margin_s, 0))
+        return url
 
-    def handle_transcription_record(self, msg: dict) -> None:
+    def download_audio(self, path: str, bucket: str = "raw-audio") -> tuple[BinaryIO, str]:
+        """
+        Given a Supabase storage path, stream the audio into memory, or into a temp
+        file once it outgrows `spool_max_memory_bytes`, and return that file rewound,
+        together with the sha256 of its bytes. The caller owns the file and must close it.
         """
-        1) Download raw audio from Supabase storage.
-        2) Call Whisper to transcribe.
-        3) Update messages.transcription & transcription_status.
+        resp = self.storage_session.get(self.signed_url(path, bucket), timeout=5, stream=True)
+        if resp.status_code in (400, 403):
+            # a cached URL the storage API no longer accepts; sign a new one once
+            resp.close()
+            self.expired_urls += 1
+            resp = self.storage_session.get(self.signed_url(path, bucket, fresh=True), timeout=5, stream=True)
+
+        # not a SpooledTemporaryFile: httpx sizes the upload via fileno(), which would
+        # roll an in-memory spool over to disk; a BytesIO has no fileno and is sized by seeking
+        spool: BinaryIO = io.BytesIO()
+        size, spilled = 0, False
+        digest = hashlib.sha256()
+        try:
+            with resp:
+                resp.raise_for_status()
+                for chunk in resp.iter_content(DOWNLOAD_CHUNK_BYTES):
+                    digest.update(chunk)
+                    if not spilled and size + len(chunk) > self.spool_max_memory_bytes:
+                        spool = self._spill(spool)
+                        spilled = True
+                    spool.write(chunk)
+                    size += len(chunk)
+            spool.seek(0)
+        except BaseException:
+            spool.close()
+            raise
+
+        self.downloads += 1
+        self.download_bytes += size
+        self.spilled_to_disk += spilled
+        return spool, digest.hexdigest()
+
+    @staticmethod
+    def _spill(buf: io.BytesIO) -> BinaryIO:
+        f = tempfile.TemporaryFile()
+        try:
+            with buf.getbuffer() as view:
+                f.write(view)
+        except BaseException:
+            f.close()
+            raise
+        buf.close()
+        return f
+
+    def _upload(self, message_id: str, audio_path: str, audio: BinaryIO) -> tuple:
+        name = os.path.basename(audio_path)
+        if self.audio_preprocess:
+            result = preprocess_audio(
+                audio,
+                silence_threshold_db=self.preprocess_silence_db,
+                max_memory_bytes=self.spool_max_memory_bytes,
+            )
+            if result is not None:
+                self.preprocessed += 1
+                self.preprocess_bytes_saved += result.bytes_saved
+                self.preprocess_seconds_saved += result.seconds_saved
+                self.preprocess_audio_s += result.seconds_in
+                self.preprocess_cpu_s += result.elapsed_s
+                print(
+                    f"🎚️ Preprocessed {message_id}: saved {result.bytes_saved} bytes, "
+                    f"{result.seconds_saved:.2f}s of audio in {result.elapsed_s * 1000:.1f}ms"
+                )
+                return os.path.splitext(name)[0] + ".wav", result.file
+        return name, audio
+
+    def _transcribe(self, message_id: str, audio_path: str) -> str:
+        audio, audio_sha256 = self.download_audio(audio_path)
+        with audio:
+            key = transcription_cache_key(audio_sha256, self.transcription_model, self.transcription_language)
+            if self.transcription_cache is not None:
+                text = self.transcription_cache.get(key)
+                if text is not None:
+                    print(f"♻️ Reusing transcript of identical audio for {message_id}")
+                    return text
+
+            extra = {"language": self.transcription_language} if self.transcription_language else {}
+            name, upload = self._upload(message_id, audio_path, audio)
+            # the preprocessed copy may be a temp file of its own
+            with upload:
+                resp = self.openai_client.audio.transcriptions.create(
+                    model=self.transcription_model,
+                    file=(name, upload),
+                    **extra,
+                )
+        if self.transcription_cache is not None:
+            self.transcription_cache.put(key, resp.text)
+        return resp.text
+
+    def handle_transcription_record(self, msg: dict) -> bool:
+        """
+        1) Claim the message (pending/error, or processing with a stale claim → processing),
+           so only one worker on one replica transcribes it.
+        2) Download raw audio from Supabase storage.
+        3) Reuse the transcript of identical audio, or call Whisper to transcribe.
+        4) Update messages.transcription & transcription_status, then hand the message
+           to `on_transcribed` for its reply.
+
+        Returns False only when the transcription failed and is worth retrying; the row
+        is left at transcription_status='error' in that case.
         """
         message_id = msg["id"]
         audio_path = msg.get("audio_path")
         if not audio_path:
-            return
+            return True
+        if not self.message_repo.claim_for_transcription(message_id, self._stale_claim_cutoff()):
+            print(f"⏭️ Transcription of {message_id} already claimed")
+            return True
 
         print(f"📝 ⏳ Transcribing message {message_id}…")
         try:
-            audio_bytes = self.download_audio(audio_path)
-            resp = self.openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=io.BytesIO(audio_bytes),
+            with deadline(self.transcription_deadline_s):
+                text = self._transcribe(message_id, audio_path)
+            self.message_repo.update(
+                message_id, {"transcription": text, "transcription_status": "done"}
             )
-            self.supabase_sync \
-            .table("messages") \
-            .update({"transcription": resp.text, "transcription_status": "done"}) \
-            .eq("id", message_id) \
-            .execute()
-            print(f"✅ Transcribed {message_id}: “{resp.text[:30]}…”")
+            print(f"✅ Transcribed {message_id}: “{text[:30]}…”")
         except Exception as e:
-            self.supabase_sync \
-                .table("messages") \
-                .update({"transcription": resp.text, "transcription_status": "done"}) \
-                .eq("id", message_id) \
-                .execute()
             print(f"❌ Transcription error for {message_id}:", e)
+            try:
+                self.message_repo.update(message_id, {"transcription_status": "error"})
+            except Exception as update_error:
+                print(f"❌ Could not mark {message_id} as failed:", update_error)
+            return False
+
+        if self.on_transcribed is not None and self._loop is not None:
+            # workers run off the loop; the reply is queued on it
+            self._loop.call_soon_threadsafe(
+                self.on_transcribed, {**msg, "transcription": text, "transcription_status": "done"}
+            )
+        return True
+
+    def _stale_claim_cutoff(self) -> str:
+        return (datetime.now(timezone.utc) - timedelta(seconds=self.transcription_claim_timeout_s)).isoformat()
+
+    def dispatch_transcription(self, msg: dict) -> bool:
+        """
+        Queue `msg` on the worker pool. Must be called from the event loop thread.
+        """
+        self._loop = asyncio.get_running_loop()
+        return self.pool.submit(msg)
+
+    async def reclaim_stuck_transcriptions(self) -> int:
+        """
+        Queue every voice message whose transcription claim timed out in "processing"
+        (the replica working on it crashed or restarted). Returns how many were queued.
+        """
+        rows = await asyncio.to_thread(self.message_repo.fetch_stuck_transcriptions, self._stale_claim_cutoff())
+        queued = sum(1 for msg in rows if msg.get("audio_path") and self.dispatch_transcription(msg))
+        if queued:
+            self.reclaimed += queued
+            print(f"♻️ Reclaimed {queued} stuck transcriptions")
+        return queued
+
+    def schedule_reclaim(self, scheduler: MaintenanceScheduler) -> None:
+        """
+        Register `reclaim_stuck_transcriptions()` with the maintenance scheduler, once
+        per claim timeout on one replica.
+        """
+        scheduler.register(
+            "reclaim_stuck_transcriptions",
+            self.reclaim_stuck_transcriptions,
+            interval_s=self.transcription_claim_timeout_s,
+            jitter_s=self.transcription_claim_timeout_s / 10,
+            run_on_start=True,
+        )
+
+    async def start_realtime(self) -> None:
+        """
+        Subscribe to INSERTs on “messages” and queue every new user voice message
+        that still needs a transcription.
+        """
+
+        def on_insert(payload):
+            msg = payload["data"]["record"]
+            if (
+                msg["sender_role"] == "user"
+                and msg.get("transcription_status") == "pending"
+                and msg.get("audio_path")
+            ):
+                self.dispatch_transcription(msg)
+
+        def on_subscribe(status, err):
+            if status == RealtimeSubscribeStates.SUBSCRIBED:
+                print("🔌 SUBSCRIBED to transcription_changes")
+            else:
+                print("❗ Realtime status:", status, err)
+
+        channel = self.supabase_async.channel("transcription_changes")
+        channel.on_postgres_changes(event="INSERT", schema="public", table="messages", callback=on_insert)
+        await channel.subscribe(on_subscribe)
+
+        # never return
+        await asyncio.Event().wait()
+
+    def stats(self) -> dict:
+        return {
+            **self.pool.stats(),
+            "reclaimed": self.reclaimed,
+            "downloads": self.downloads,
+            "download_bytes": self.download_bytes,
+            "spilled_to_disk": self.spilled_to_disk,
+            "expired_signed_urls": self.expired_urls,
+            "preprocess": {
+                "enabled": self.audio_preprocess,
+                "preprocessed": self.preprocessed,
+                "bytes_saved": self.preprocess_bytes_saved,
+                "audio_seconds_saved": round(self.preprocess_seconds_saved, 3),
+                "cpu_ms_per_audio_s": (
+                    round(self.preprocess_cpu_s / self.preprocess_audio_s * 1000, 3)
+                    if self.preprocess_audio_s else None
+                ),
+            },
+            "signed_url_cache": self.signed_url_cache.stats() if self.signed_url_cache is not None else None,
+            "transcript_cache": self.transcription_cache.stats() if self.transcription_cache is not None else None,
+        }
 
     def fetch_pending(self, table: str, **conds) -> list[dict]:
         """
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+from typing import Any, Callable
+
+
+class FakeQuery:
+    """
+    Records the builder calls of one query; execute() counts as one round trip.
+    """
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.ops: list[tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str) -> Callable[..., "FakeQuery"]:
+        def op(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return self
+        return op
+
+    def op_names(self) -> list[str]:
+        return [name for name, _, _ in self.ops]
+
+    def execute(self):
+        self.client.round_trips.append(self)
+        return SimpleNamespace(data=self.client.respond(self), count=None)
+
+
+class AsyncFakeQuery(FakeQuery):
+    async def execute(self):
+        return FakeQuery.execute(self)
+
+
+class FakeSupabase:
+    """
+    Stand-in for the supabase Client: every executed query is kept in `round_trips`,
+    and `respond(query)` decides its data.
+    """
+    query_class = FakeQuery
+
+    def __init__(self, respond: Callable[[FakeQuery], Any] = lambda q: None):
+        self.respond = respond
+        self.round_trips: list[FakeQuery] = []
+
+    def table(self, name: str) -> FakeQuery:
+        return self.query_class(self, name)
+
+
+class AsyncFakeSupabase(FakeSupabase):
+    query_class = AsyncFakeQuery
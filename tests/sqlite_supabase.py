@@ -0,0 +1,124 @@
+import sqlite3
+import threading
+from types import SimpleNamespace
+from typing import Any, Optional
+
+
+class SqliteQuery:
+    """
+    The subset of the PostgREST query builder the repositories use, run as SQL on a
+    SQLite table, so constraints (NOT NULL, primary keys) and triggers behave like the
+    database rather than a dict. Writes return the affected rows, as PostgREST does.
+    """
+    def __init__(self, client: "SqliteSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.action: Optional[str] = None
+        self.payload: Any = None
+        self.columns = "*"
+        self.on_conflict: Optional[str] = None
+        self.where: list[tuple[str, list]] = []
+        self.order_by: Optional[str] = None
+        self.limit_n: Optional[int] = None
+        self.one = False
+
+    def select(self, columns: str = "*", **kwargs) -> "SqliteQuery":
+        self.action = self.action or "select"
+        self.columns = columns
+        return self
+
+    def update(self, fields: dict) -> "SqliteQuery":
+        self.action, self.payload = "update", fields
+        return self
+
+    def insert(self, rows) -> "SqliteQuery":
+        self.action, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", **kwargs) -> "SqliteQuery":
+        self.action, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        self.on_conflict = on_conflict
+        return self
+
+    def eq(self, column: str, value) -> "SqliteQuery":
+        self.where.append((f"{column} = ?", [value]))
+        return self
+
+    def lt(self, column: str, value) -> "SqliteQuery":
+        self.where.append((f"{column} < ?", [value]))
+        return self
+
+    def gt(self, column: str, value) -> "SqliteQuery":
+        self.where.append((f"{column} > ?", [value]))
+        return self
+
+    def in_(self, column: str, values) -> "SqliteQuery":
+        values = list(values)
+        self.where.append((f"{column} in ({', '.join('?' * len(values))})", values))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "SqliteQuery":
+        self.order_by = f"{column} {'desc' if desc else 'asc'}"
+        return self
+
+    def limit(self, n: int) -> "SqliteQuery":
+        self.limit_n = n
+        return self
+
+    def single(self) -> "SqliteQuery":
+        self.one = True
+        return self
+
+    def _where(self) -> tuple[str, list]:
+        if not self.where:
+            return "", []
+        return " where " + " and ".join(c for c, _ in self.where), [v for _, vs in self.where for v in vs]
+
+    def _rows(self, sql: str, params: list) -> list[dict]:
+        cur = self.client.conn.execute(sql, params)
+        names = [d[0] for d in cur.description or []]
+        return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    def execute(self):
+        self.client.round_trips += 1
+        where, params = self._where()
+        with self.client.lock, self.client.conn:
+            if self.action == "update":
+                sets = ", ".join(f"{k} = ?" for k in self.payload)
+                data = self._rows(
+                    f"update {self.table} set {sets}{where} returning *", list(self.payload.values()) + params
+                )
+            elif self.action in ("insert", "upsert"):
+                data = []
+                for row in self.payload:
+                    cols = ", ".join(row)
+                    sql = f"insert into {self.table} ({cols}) values ({', '.join('?' * len(row))})"
+                    if self.action == "upsert":
+                        sets = ", ".join(f"{k} = excluded.{k}" for k in row if k != self.on_conflict)
+                        sql += f" on conflict ({self.on_conflict}) do update set {sets}"
+                    data += self._rows(sql + " returning *", list(row.values()))
+            else:
+                sql = f"select {self.columns} from {self.table}{where}"
+                if self.order_by:
+                    sql += f" order by {self.order_by}"
+                if self.limit_n is not None:
+                    sql += f" limit {self.limit_n}"
+                data = self._rows(sql, params)
+        if self.one:
+            data = data[0] if data else None
+        return SimpleNamespace(data=data, count=None)
+
+
+class SqliteSupabase:
+    """
+    Stand-in for the supabase Client over an in-memory SQLite database; create the
+    tables (and triggers) with `conn.executescript(...)`.
+    """
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        # the sweep queries from its worker threads
+        self.lock = threading.Lock()
+        self.round_trips = 0
+
+    def table(self, name: str) -> SqliteQuery:
+        return SqliteQuery(self, name)
@@ -0,0 +1,105 @@
+import io
+import time
+import tracemalloc
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.audio import WHISPER_SAMPLE_RATE, preprocess_audio
+
+
+def _recording(rate: int, channels: int, silence_s: float, voice_s: float) -> io.BytesIO:
+    """
+    16-bit PCM WAV: `silence_s` of near-silence, `voice_s` of a 300 Hz tone, `silence_s` again.
+    """
+    rng = np.random.default_rng(0)
+    quiet = 1e-4 * rng.standard_normal(int(rate * silence_s))
+    tone = 0.5 * np.sin(2 * np.pi * 300 * np.arange(int(rate * voice_s)) / rate)
+    x = np.concatenate([quiet, tone, quiet])
+    pcm = (np.repeat(x[:, None], channels, axis=1) * 32767).astype("<i2")
+    f = io.BytesIO()
+    with wave.open(f, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    f.seek(0)
+    return f
+
+
+def test_trims_silence_downmixes_and_downsamples():
+    result = preprocess_audio(_recording(48000, 2, silence_s=2.0, voice_s=3.0))
+
+    assert result is not None
+    with wave.open(result.file, "rb") as w:
+        assert (w.getnchannels(), w.getframerate()) == (1, WHISPER_SAMPLE_RATE)
+    # 3s of voice plus 200ms padding on each side
+    assert result.seconds_out == pytest.approx(3.4, abs=0.05)
+    # stereo 48 kHz → mono 16 kHz is 6x smaller, before trimming
+    assert result.bytes_out < result.bytes_in / 6
+
+
+def test_non_wav_passes_through_rewound():
+    f = io.BytesIO(b"ID3" + b"\0" * 100)
+
+    assert preprocess_audio(f) is None
+    assert f.tell() == 0
+
+
+def test_already_minimal_audio_is_left_alone():
+    assert preprocess_audio(_recording(WHISPER_SAMPLE_RATE, 1, silence_s=0.0, voice_s=2.0)) is None
+
+
+@pytest.mark.parametrize("rate,channels", [(48000, 2), (44100, 1), (16000, 1)])
+def test_preprocessing_benchmark(rate, channels):
+    """
+    Cost per second of audio for a 60s voice message; preprocessing only pays off
+    while it stays far below what the smaller upload saves.
+    """
+    audio = _recording(rate, channels, silence_s=5.0, voice_s=50.0)
+
+    runs = []
+    for _ in range(3):
+        audio.seek(0)
+        started = time.perf_counter()
+        result = preprocess_audio(audio)
+        runs.append(time.perf_counter() - started)
+    best = min(runs)
+    ms_per_audio_s = best / result.seconds_in * 1000
+
+    print(
+        f"\n{rate} Hz x{channels}: {result.seconds_in:.0f}s audio in {best * 1000:.1f}ms "
+        f"({ms_per_audio_s:.2f}ms per audio second), {result.bytes_in} → {result.bytes_out} bytes"
+    )
+    assert result.seconds_in == pytest.approx(60.0, abs=0.01)
+    assert ms_per_audio_s < 20
+
+
+@pytest.mark.parametrize("rate,channels", [(48000, 2), (44100, 1), (8000, 1)])
+def test_block_size_does_not_change_the_output(rate, channels):
+    audio = _recording(rate, channels, silence_s=1.0, voice_s=2.0)
+
+    whole = preprocess_audio(audio, block_s=100.0)
+    blocked = preprocess_audio(audio, block_s=0.013)
+
+    assert blocked.file.read() == whole.file.read()
+
+
+def test_memory_stays_flat_for_long_recordings():
+    # 10 minutes of 48 kHz stereo, about 110 MB decoded
+    audio = _recording(48000, 2, silence_s=5.0, voice_s=590.0)
+
+    tracemalloc.start()
+    try:
+        result = preprocess_audio(audio, max_memory_bytes=1024 * 1024)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    with result.file:
+        assert result.file.fileno()     # spilled to a temp file
+        assert result.seconds_in == pytest.approx(600.0, abs=0.01)
+    # a few one-second blocks in flight, independent of the recording's length
+    assert peak < 4 * 1024 * 1024
@@ -0,0 +1,131 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+from services.batch_backends import (
+    BatchFailed,
+    LocalBatchBackend,
+    OpenAIBatchBackend,
+    batch_request_line,
+    parse_batch_output,
+)
+
+
+class FakeCompletion:
+    def __init__(self, content: str):
+        self.content = content
+
+    def model_dump(self) -> dict:
+        return {"choices": [{"message": {"role": "assistant", "content": self.content}}]}
+
+
+class FakeOpenAI:
+    """
+    chat.completions.create echoes the last message back, or raises for "fail".
+    """
+    def __init__(self):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **body):
+        self.requests.append(body)
+        text = body["messages"][-1]["content"]
+        if text == "fail":
+            raise RuntimeError("rate limited")
+        return FakeCompletion(f"re: {text}")
+
+
+def _write_input(path, items: dict[str, str]) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, text in items.items():
+            body = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": text}]}
+            f.write(batch_request_line(custom_id, body) + "\n")
+    return str(path)
+
+
+def test_request_line_matches_batch_api_format():
+    line = json.loads(batch_request_line("conv-1", {"model": "m"}))
+
+    assert line == {"custom_id": "conv-1", "method": "POST", "url": "/v1/chat/completions", "body": {"model": "m"}}
+
+
+def test_parse_output_maps_failures_to_none():
+    text = "\n".join([
+        json.dumps({"custom_id": "a", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "ok"}}]}}}),
+        json.dumps({"custom_id": "b", "response": {"status_code": 500, "body": {}}}),
+        json.dumps({"custom_id": "c", "response": None, "error": {"message": "boom"}}),
+        "",
+    ])
+
+    assert parse_batch_output(text) == {"a": "ok", "b": None, "c": None}
+
+
+def test_local_backend_runs_batch_on_first_poll(tmp_path):
+    client = FakeOpenAI()
+    backend = LocalBatchBackend(client, str(tmp_path / "batches"))
+    batch_id = backend.submit(_write_input(tmp_path / "in.jsonl", {"a": "hello", "b": "fail", "c": "bye"}))
+
+    assert client.requests == []
+    results = backend.poll(batch_id)
+
+    assert results == {"a": "re: hello", "b": None, "c": "re: bye"}
+    assert len(client.requests) == 3
+
+
+def test_local_backend_polls_reuse_the_output_file(tmp_path):
+    client = FakeOpenAI()
+    backend = LocalBatchBackend(client, str(tmp_path))
+    batch_id = backend.submit(_write_input(tmp_path / "in.jsonl", {"a": "hello"}))
+
+    first = backend.poll(batch_id)
+    second = backend.poll(batch_id)
+
+    assert first == second == {"a": "re: hello"}
+    assert len(client.requests) == 1
+
+
+def test_local_backend_keeps_its_own_copy_of_the_input(tmp_path):
+    backend = LocalBatchBackend(FakeOpenAI(), str(tmp_path / "batches"))
+    input_path = _write_input(tmp_path / "in.jsonl", {"a": "hello"})
+    batch_id = backend.submit(input_path)
+
+    (tmp_path / "in.jsonl").unlink()
+
+    assert backend.poll(batch_id) == {"a": "re: hello"}
+
+
+def _batches_client(status: str, output: str = "", errors: str = ""):
+    files = {"out": output, "err": errors}
+    batch = SimpleNamespace(
+        status=status,
+        output_file_id="out" if output else None,
+        error_file_id="err" if errors else None,
+    )
+    return SimpleNamespace(
+        batches=SimpleNamespace(retrieve=lambda batch_id: batch),
+        files=SimpleNamespace(content=lambda file_id: SimpleNamespace(text=files[file_id])),
+    )
+
+
+def test_openai_backend_running_batch_polls_none():
+    assert OpenAIBatchBackend(_batches_client("in_progress")).poll("batch_1") is None
+
+
+@pytest.mark.parametrize("status", ["failed", "expired", "cancelled"])
+def test_openai_backend_terminal_failure_raises_batch_failed(status):
+    with pytest.raises(BatchFailed) as e:
+        OpenAIBatchBackend(_batches_client(status)).poll("batch_1")
+
+    assert e.value.status == status
+
+
+def test_openai_backend_merges_output_and_error_files():
+    output = json.dumps({"custom_id": "a", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "ok"}}]}}})
+    errors = json.dumps({"custom_id": "b", "response": None, "error": {"message": "boom"}})
+
+    results = OpenAIBatchBackend(_batches_client("completed", output, errors)).poll("batch_1")
+
+    assert results == {"a": "ok", "b": None}
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("supabase")
+pytest.importorskip("realtime")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("requests")
+
+from services.chat_service import ChatService
+from services.model_router import FAST_MODEL, STRONG_MODEL, ModelRouter, RouteDecision
+from tests.fake_supabase import AsyncFakeSupabase
+from tests.test_model_router import FakeOpenAI
+
+
+class FakeVoices:
+    """
+    Just voice_id_for_async, which never answers within a test; counts cancellations.
+    """
+    def __init__(self):
+        self.cancelled = 0
+
+    async def voice_id_for_async(self, therapist_id):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def _service(openai: FakeOpenAI, insert_rows) -> tuple[ChatService, FakeVoices]:
+    def respond(query):
+        if isinstance(insert_rows, Exception):
+            raise insert_rows
+        return insert_rows
+
+    voices = FakeVoices()
+    service = ChatService(
+        supabase_sync=None,
+        supabase_async=AsyncFakeSupabase(respond),
+        openai_client=None,
+        openai_async_client=openai,
+        message_repo=None,
+        conversation_repo=None,
+        therapist_repo=None,
+        user_profile_repo=None,
+        context_repo=None,
+        rolling_summary=None,
+        prompt_cache=None,
+        payload_assembler=None,
+        model_router=ModelRouter(),
+        elevenlabs_service=voices,
+    )
+    return service, voices
+
+
+def _decision() -> RouteDecision:
+    return RouteDecision(primary=STRONG_MODEL, max_tokens=100, fallback=FAST_MODEL, hedge_after_s=0.05, reason="test")
+
+
+def _reply(service: ChatService) -> None:
+    msg = {"id": "m1", "conversation_id": "conv-1"}
+    asyncio.run(service._stream_voice_reply_async(msg, [], _decision(), therapist_id="ther-1"))
+
+
+def test_model_error_is_raised_when_the_insert_also_failed():
+    openai = FakeOpenAI({STRONG_MODEL: 0.01, FAST_MODEL: 0.01}, failing=(STRONG_MODEL, FAST_MODEL))
+    # the insert returned no rows
+    service, voices = _service(openai, insert_rows=[])
+
+    with pytest.raises(RuntimeError, match="unavailable"):
+        _reply(service)
+    assert voices.cancelled == 1
+
+
+def test_failed_insert_closes_the_model_stream():
+    openai = FakeOpenAI({STRONG_MODEL: 0.01, FAST_MODEL: 0.01})
+    service, voices = _service(openai, insert_rows=ConnectionError("insert failed"))
+
+    with pytest.raises(ConnectionError):
+        _reply(service)
+    assert openai.streams[STRONG_MODEL].closed
+    assert voices.cancelled == 1
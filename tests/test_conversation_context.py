@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from repositories.conversation_context import ConversationContextRepository
+from repositories.user_profiles import UserProfileRepository
+from tests.fake_supabase import AsyncFakeSupabase, FakeSupabase
+
+
+PROFILE = {"age": 34, "career": "nurse"}
+
+
+def _row(needs_resummarization: bool = False) -> dict:
+    return {
+        "id": "conv-1",
+        "patient_id": "user-1",
+        "therapist_id": "ther-1",
+        "voice_enabled": True,
+        "memory_summary": "work stress",
+        "needs_resummarization": needs_resummarization,
+        "rolling_summary": "talked about shifts",
+        "rolling_summary_until": "2026-01-01T00:10:00",
+        "therapists": {"updated_at": "2026-01-01T00:00:00"},
+        "messages": [
+            {"sender_role": "user", "transcription": "hi", "assistant_text": None, "created_at": "2026-01-01T00:11:00"},
+            {"sender_role": "assistant", "transcription": None, "assistant_text": "hello", "created_at": "2026-01-01T00:12:00"},
+        ],
+    }
+
+
+def _responder(row: dict):
+    def respond(query):
+        if query.table == "conversations" and "select" in query.op_names():
+            return row
+        if query.table == "user_profiles":
+            return PROFILE
+        return [row]
+    return respond
+
+
+def _repo(client) -> ConversationContextRepository:
+    return ConversationContextRepository(
+        supabase_sync_client=client,
+        user_profile_repo=UserProfileRepository(client, client),
+        supabase_async_client=client,
+    )
+
+
+def test_load_takes_two_round_trips():
+    client = FakeSupabase(_responder(_row()))
+
+    ctx = _repo(client).load("conv-1")
+
+    assert [q.table for q in client.round_trips] == ["conversations", "user_profiles"]
+    assert ctx.persona_version == "2026-01-01T00:00:00"
+    assert ctx.memory_summary == "work stress"
+    assert ctx.profile == PROFILE
+    assert len(ctx.history) == 2
+
+
+def test_load_async_takes_two_round_trips():
+    client = AsyncFakeSupabase(_responder(_row()))
+
+    ctx = asyncio.run(_repo(client).load_async("conv-1"))
+
+    assert [q.table for q in client.round_trips] == ["conversations", "user_profiles"]
+    assert ctx.rolling_summary == "talked about shifts"
+    assert ctx.profile == PROFILE
+
+
+def test_resummarization_flag_costs_one_extra_write():
+    client = FakeSupabase(_responder(_row(needs_resummarization=True)))
+
+    ctx = _repo(client).load("conv-1")
+
+    assert [q.table for q in client.round_trips] == ["conversations", "conversations", "user_profiles"]
+    assert "update" in client.round_trips[1].op_names()
+    assert ctx.memory_summary == ""
+    assert ctx.rolling_summary == ""
+    assert ctx.rolling_summary_until is None
+
+
+def test_history_is_embedded_not_fetched():
+    client = FakeSupabase(_responder(_row()))
+
+    _repo(client).load("conv-1")
+
+    select = client.round_trips[0]
+    assert "messages(" in select.ops[0][1][0]
+    assert ("eq", ("messages.invalidated", False), {}) in select.ops
+
+
+def test_missing_patient_skips_profile_lookup():
+    row = dict(_row(), patient_id=None)
+    client = FakeSupabase(_responder(row))
+
+    ctx = _repo(client).load("conv-1")
+
+    assert [q.table for q in client.round_trips] == ["conversations"]
+    assert ctx.profile == {}
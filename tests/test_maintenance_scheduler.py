@@ -0,0 +1,223 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from repositories.maintenance_leases import LocalLeaseRepository
+from services.maintenance_scheduler import LeaseHeld, MaintenanceScheduler
+
+
+def test_lease_is_exclusive_until_it_expires():
+    leases = LocalLeaseRepository()
+
+    assert leases.acquire("sweep", "a", ttl_s=0.05)
+    assert not leases.acquire("sweep", "b", ttl_s=0.05)
+    # the holder may renew
+    assert leases.acquire("sweep", "a", ttl_s=0.05)
+
+    time.sleep(0.06)
+    assert leases.acquire("sweep", "b", ttl_s=0.05)
+
+
+def test_release_only_by_holder():
+    leases = LocalLeaseRepository()
+    leases.acquire("sweep", "a", ttl_s=60)
+
+    leases.release("sweep", "b")
+    assert not leases.acquire("sweep", "b", ttl_s=60)
+
+    leases.release("sweep", "a")
+    assert leases.acquire("sweep", "b", ttl_s=60)
+
+
+def test_leases_are_per_job():
+    leases = LocalLeaseRepository()
+
+    assert leases.acquire("sweep", "a", ttl_s=60)
+    assert leases.acquire("vacuum", "b", ttl_s=60)
+
+
+def test_only_one_replica_runs_each_tick():
+    leases = LocalLeaseRepository()
+    calls = []
+    replicas = [MaintenanceScheduler(leases), MaintenanceScheduler(leases)]
+    jobs = [s.register("sweep", lambda s=s: calls.append(s.holder), interval_s=60) for s in replicas]
+
+    async def run():
+        for s in replicas:
+            s.start()
+        await asyncio.gather(*(s.run_once(job) for s, job in zip(replicas, jobs)))
+        for s in replicas:
+            await s.stop()
+    asyncio.run(run())
+
+    assert len(calls) == 1
+    assert sorted(job.runs for job in jobs) == [0, 1]
+    assert sorted(job.skipped_not_leader for job in jobs) == [0, 1]
+
+
+def test_run_on_start_and_interval():
+    scheduler = MaintenanceScheduler(LocalLeaseRepository())
+    calls = []
+
+    async def tick():
+        calls.append(time.monotonic())
+
+    async def run():
+        scheduler.register("tick", tick, interval_s=0.05, run_on_start=True)
+        scheduler.start()
+        await asyncio.sleep(0.13)
+        await scheduler.stop()
+    asyncio.run(run())
+
+    # once right away, then every interval
+    assert 2 <= len(calls) <= 3
+
+
+def test_failing_job_is_recorded_and_keeps_its_schedule():
+    scheduler = MaintenanceScheduler(LocalLeaseRepository())
+
+    def boom():
+        raise RuntimeError("database unavailable")
+
+    async def run():
+        job = scheduler.register("boom", boom, interval_s=60)
+        scheduler.start()
+        await scheduler.run_once(job)
+        await scheduler.run_once(job)
+        await scheduler.stop()
+        return job
+    job = asyncio.run(run())
+
+    assert job.runs == 2
+    assert job.failures == 2
+    assert job.last_result == "error: database unavailable"
+    assert not job.running
+
+
+def test_stop_releases_leases_for_other_replicas():
+    leases = LocalLeaseRepository()
+    first, second = MaintenanceScheduler(leases), MaintenanceScheduler(leases)
+
+    async def run():
+        job = first.register("sweep", lambda: None, interval_s=3600)
+        first.start()
+        await first.run_once(job)
+        await first.stop()
+    asyncio.run(run())
+
+    assert leases.acquire("sweep", second.holder, ttl_s=60)
+
+
+def test_lease_is_renewed_while_a_long_job_runs():
+    leases = LocalLeaseRepository()
+    first, second = MaintenanceScheduler(leases), MaintenanceScheduler(leases)
+    calls = []
+
+    async def slow(name):
+        calls.append(name)
+        # four lease lifetimes
+        await asyncio.sleep(0.2)
+
+    async def tick_first():
+        await slow("first")
+
+    async def tick_second():
+        await slow("second")
+
+    async def run():
+        job_a = first.register("sweep", tick_first, interval_s=0.05)
+        job_b = second.register("sweep", tick_second, interval_s=0.05)
+        running = asyncio.create_task(first.run_once(job_a))
+        await asyncio.sleep(0.12)
+        await second.run_once(job_b)
+        await running
+        return job_a, job_b
+    job_a, job_b = asyncio.run(run())
+
+    assert calls == ["first"]
+    assert job_a.lease_renewals >= 3
+    assert job_b.skipped_not_leader == 1
+
+
+def test_run_now_returns_the_result_under_the_lease():
+    leases = LocalLeaseRepository()
+    scheduler = MaintenanceScheduler(leases)
+
+    async def run():
+        scheduler.register("sweep", lambda: {"ended": 3}, interval_s=3600)
+        scheduler.start()
+        result = await scheduler.run_now("sweep")
+        held_by_us = not leases.acquire("sweep", "other", ttl_s=60)
+        await scheduler.stop()
+        return result, held_by_us
+    result, held_by_us = asyncio.run(run())
+
+    assert result == {"ended": 3}
+    # the manual run counts as this interval's run
+    assert held_by_us
+
+
+def test_run_now_is_refused_while_another_replica_holds_the_lease():
+    leases = LocalLeaseRepository()
+    leases.acquire("sweep", "other-replica", ttl_s=60)
+    scheduler = MaintenanceScheduler(leases)
+    calls = []
+
+    async def run():
+        scheduler.register("sweep", lambda: calls.append(1), interval_s=3600)
+        scheduler.start()
+        try:
+            with pytest.raises(LeaseHeld):
+                await scheduler.run_now("sweep")
+        finally:
+            await scheduler.stop()
+    asyncio.run(run())
+
+    assert calls == []
+
+
+def test_run_now_does_not_overlap_a_scheduled_run():
+    scheduler = MaintenanceScheduler(LocalLeaseRepository())
+    release = None
+    calls = []
+
+    async def sweep():
+        calls.append(1)
+        await release.wait()
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        job = scheduler.register("sweep", sweep, interval_s=3600)
+        scheduled = asyncio.create_task(scheduler.run_once(job))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LeaseHeld):
+            await scheduler.run_now("sweep")
+        release.set()
+        await scheduled
+        return job
+    job = asyncio.run(run())
+
+    assert calls == [1]
+    assert job.skipped_running == 1
+    assert job.runs == 1
+
+
+def test_run_now_propagates_job_errors():
+    scheduler = MaintenanceScheduler(LocalLeaseRepository())
+
+    async def boom():
+        raise RuntimeError("database unavailable")
+
+    async def run():
+        job = scheduler.register("boom", boom, interval_s=3600)
+        with pytest.raises(RuntimeError):
+            await scheduler.run_now("boom")
+        return job
+    job = asyncio.run(run())
+
+    assert job.failures == 1
+    assert job.last_result == "error: database unavailable"
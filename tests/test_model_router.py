@@ -0,0 +1,172 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.model_router import FAST_MODEL, STRONG_MODEL, ModelRouter, RouteDecision
+
+
+class FakeStream:
+    def __init__(self, chunks: list[str], first_chunk_s: float):
+        self._chunks = list(chunks)
+        self._first_chunk_s = first_chunk_s
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._first_chunk_s:
+            await asyncio.sleep(self._first_chunk_s)
+            self._first_chunk_s = 0
+        if not self._chunks:
+            raise StopAsyncIteration
+        return self._chunks.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeOpenAI:
+    """
+    Just enough of AsyncOpenAI for the router: chat.completions.create(model=..., stream=True)
+    answers after the injected per-model latency, or raises if the model is in `failing`.
+    """
+    def __init__(self, latencies: dict[str, float], failing: tuple = ()):
+        self.latencies = latencies
+        self.failing = failing
+        self.streams: dict[str, FakeStream] = {}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model: str, stream: bool = False, **kwargs):
+        if model in self.failing:
+            raise RuntimeError(f"{model} unavailable")
+        if stream:
+            self.streams[model] = FakeStream([f"{model}-a", f"{model}-b"], self.latencies[model])
+            return self.streams[model]
+        await asyncio.sleep(self.latencies[model])
+        return SimpleNamespace(model=model, usage=SimpleNamespace(completion_tokens=10))
+
+
+def _decision(hedge_after_s=0.05) -> RouteDecision:
+    return RouteDecision(
+        primary=STRONG_MODEL,
+        max_tokens=100,
+        fallback=FAST_MODEL,
+        hedge_after_s=hedge_after_s,
+        reason="test",
+    )
+
+
+def _stream(router: ModelRouter, client: FakeOpenAI, decision: RouteDecision) -> tuple[str, list]:
+    async def run():
+        model, chunks = await router.stream_hedged(
+            lambda m: client.chat.completions.create(model=m, messages=[], stream=True),
+            decision,
+        )
+        return model, [c async for c in chunks]
+    return asyncio.run(run())
+
+
+def test_fast_primary_is_not_hedged():
+    router = ModelRouter()
+    client = FakeOpenAI({STRONG_MODEL: 0.01, FAST_MODEL: 0.01})
+
+    model, chunks = _stream(router, client, _decision())
+
+    assert model == STRONG_MODEL
+    assert chunks == [f"{STRONG_MODEL}-a", f"{STRONG_MODEL}-b"]
+    assert FAST_MODEL not in client.streams
+    assert router.stats_for(STRONG_MODEL).samples == 1
+
+
+def test_slow_primary_loses_to_fallback():
+    router = ModelRouter()
+    client = FakeOpenAI({STRONG_MODEL: 0.5, FAST_MODEL: 0.01})
+
+    model, chunks = _stream(router, client, _decision(hedge_after_s=0.05))
+
+    assert model == FAST_MODEL
+    assert chunks == [f"{FAST_MODEL}-a", f"{FAST_MODEL}-b"]
+    assert router.stats_for(FAST_MODEL).hedges_started == 1
+    assert router.stats_for(FAST_MODEL).hedges_won == 1
+    # the primary waited the hedge delay plus the fallback's latency before being cancelled
+    assert router.stats_for(STRONG_MODEL).ttft_s >= 0.05
+
+
+def test_fallback_estimate_uses_its_own_start_time():
+    router = ModelRouter(alpha=1.0)
+    router.stats_for(FAST_MODEL).observe(1.0, 0.3, None)
+    # the primary starts first and wins well after the fallback was started
+    client = FakeOpenAI({STRONG_MODEL: 0.15, FAST_MODEL: 1.0})
+
+    model, _ = _stream(router, client, _decision(hedge_after_s=0.1))
+
+    assert model == STRONG_MODEL
+    # the fallback only ran ~0.05s; that says nothing against its 0.3s estimate
+    assert router.stats_for(FAST_MODEL).ttft_s == pytest.approx(0.3)
+
+
+def test_slow_loser_raises_its_estimate():
+    router = ModelRouter(alpha=1.0)
+    router.stats_for(FAST_MODEL).observe(1.0, 0.01, None)
+    client = FakeOpenAI({STRONG_MODEL: 0.3, FAST_MODEL: 1.0})
+
+    model, _ = _stream(router, client, _decision(hedge_after_s=0.05))
+
+    assert model == STRONG_MODEL
+    waited = router.stats_for(FAST_MODEL).ttft_s
+    assert 0.2 <= waited < 0.3
+
+
+def test_failing_primary_falls_back_without_waiting():
+    router = ModelRouter()
+    client = FakeOpenAI({FAST_MODEL: 0.01}, failing=(STRONG_MODEL,))
+
+    model, _ = _stream(router, client, _decision(hedge_after_s=5.0))
+
+    assert model == FAST_MODEL
+    assert router.stats_for(STRONG_MODEL).errors == 1
+    assert router.stats_for(FAST_MODEL).hedges_started == 0
+
+
+def test_complete_hedged_records_latency():
+    router = ModelRouter()
+    client = FakeOpenAI({STRONG_MODEL: 0.02, FAST_MODEL: 0.02})
+
+    async def run():
+        return await router.complete_hedged(
+            lambda m: client.chat.completions.create(model=m, messages=[]),
+            _decision(hedge_after_s=1.0),
+        )
+    model, resp = asyncio.run(run())
+
+    assert model == STRONG_MODEL == resp.model
+    assert router.stats_for(STRONG_MODEL).ttft_s >= 0.02
+    assert router.stats_for(STRONG_MODEL).tokens_per_s is not None
+
+
+def test_router_avoids_model_over_budget():
+    router = ModelRouter()
+    router.observe(STRONG_MODEL, 3.0)
+    router.observe(FAST_MODEL, 0.4)
+
+    decision = router.choose("I feel like nothing is working out lately", voice_mode=True)
+
+    assert decision.primary == FAST_MODEL
+    assert decision.fallback == STRONG_MODEL
+
+
+def test_closing_before_iterating_closes_the_winning_stream():
+    router = ModelRouter()
+    client = FakeOpenAI({STRONG_MODEL: 0.01, FAST_MODEL: 0.01})
+
+    async def run():
+        _, chunks = await router.stream_hedged(
+            lambda m: client.chat.completions.create(model=m, messages=[], stream=True),
+            _decision(),
+        )
+        await chunks.aclose()
+    asyncio.run(run())
+
+    assert client.streams[STRONG_MODEL].closed
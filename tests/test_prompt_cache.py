@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from repositories.cache import CachedRepository
+from services.prompt_cache import PromptCache
+
+
+class FakeTherapists:
+    def __init__(self):
+        self.persona = {"system_prompt": "You are Dr. A."}
+        self.persona_reads = 0
+
+    def fetch_therapist_persona(self, therapist_id):
+        self.persona_reads += 1
+        return dict(self.persona)
+
+    async def fetch_therapist_persona_async(self, therapist_id):
+        return self.fetch_therapist_persona(therapist_id)
+
+    def fetch_voice_id(self, therapist_id):
+        return "voice-1"
+
+
+def test_same_version_is_rendered_once():
+    therapists = FakeTherapists()
+    cache = PromptCache(therapists)
+
+    first = cache.system_prompt("ther-1", "v1")
+    second = asyncio.run(cache.system_prompt_async("ther-1", "v1"))
+
+    assert first == second
+    assert therapists.persona_reads == 1
+
+
+def test_new_version_reads_the_current_persona():
+    therapists = FakeTherapists()
+    # wired like containers.py: the repository cache in front of the same repository
+    cached = CachedRepository(therapists, "therapists", ttls={"fetch_voice_id": 3600})
+    cache = PromptCache(cached.repository)
+    assert cache.system_prompt("ther-1", "v1").startswith("You are Dr. A.")
+
+    therapists.persona = {"system_prompt": "You are Dr. B."}
+
+    assert cache.system_prompt("ther-1", "v2").startswith("You are Dr. B.")
+    assert therapists.persona_reads == 2
+
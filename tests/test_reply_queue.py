@@ -0,0 +1,98 @@
+import asyncio
+
+from services.reply_queue import CHAT_PRIORITY, VOICE_PRIORITY, ReplyQueue
+
+
+def _msg(message_id: str, conversation_id: str) -> dict:
+    return {"id": message_id, "conversation_id": conversation_id}
+
+
+def _queue(handled: list, lookup_s: dict = None, priorities: dict = None, workers: int = 1) -> ReplyQueue:
+    lookup_s, priorities = lookup_s or {}, priorities or {}
+
+    async def handler(msg):
+        handled.append(msg["id"])
+
+    async def priority_of(msg):
+        # injected lookup latency per message
+        await asyncio.sleep(lookup_s.get(msg["id"], 0))
+        return priorities.get(msg["conversation_id"], CHAT_PRIORITY)
+
+    return ReplyQueue(handler, priority_of, workers=workers)
+
+
+async def _drain(queue: ReplyQueue, count: int, handled: list) -> None:
+    for _ in range(300):
+        if len(handled) >= count:
+            break
+        await asyncio.sleep(0.01)
+    await queue.stop()
+
+
+def test_slow_priority_lookup_keeps_arrival_order():
+    handled = []
+    queue = _queue(handled, lookup_s={"m1": 0.05})
+
+    async def run():
+        first = asyncio.create_task(queue.submit(_msg("m1", "conv-1")))
+        second = asyncio.create_task(queue.submit(_msg("m2", "conv-1")))
+        await asyncio.gather(first, second)
+        await _drain(queue, 2, handled)
+    asyncio.run(run())
+
+    assert handled == ["m1", "m2"]
+
+
+def test_voice_conversations_go_first():
+    handled = []
+    queue = _queue(handled, priorities={"voice": VOICE_PRIORITY}, workers=1)
+
+    async def run():
+        blocker = asyncio.Event()
+
+        async def handler(msg):
+            if msg["id"] == "busy":
+                await blocker.wait()
+            handled.append(msg["id"])
+        queue.handler = handler
+
+        await queue.submit(_msg("busy", "other"))
+        await asyncio.sleep(0)
+        await queue.submit(_msg("chat", "chat"))
+        await queue.submit(_msg("voice", "voice"))
+        blocker.set()
+        await _drain(queue, 3, handled)
+    asyncio.run(run())
+
+    assert handled == ["busy", "voice", "chat"]
+
+
+def test_duplicate_submissions_are_skipped():
+    handled = []
+    queue = _queue(handled)
+
+    async def run():
+        results = await asyncio.gather(queue.submit(_msg("m1", "c")), queue.submit(_msg("m1", "c")))
+        await _drain(queue, 1, handled)
+        return results
+    results = asyncio.run(run())
+
+    assert sorted(results) == [False, True]
+    assert handled == ["m1"]
+    assert queue.stats()["duplicates_skipped"] == 1
+
+
+def test_cancelled_lookup_does_not_block_the_conversation():
+    handled = []
+    queue = _queue(handled, lookup_s={"m1": 10})
+
+    async def run():
+        first = asyncio.create_task(queue.submit(_msg("m1", "conv-1")))
+        await asyncio.sleep(0)
+        await queue.submit(_msg("m2", "conv-1"))
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await _drain(queue, 1, handled)
+    asyncio.run(run())
+
+    assert handled == ["m2"]
@@ -0,0 +1,256 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("supabase")
+
+from repositories.summary_batches import LocalSummaryBatchRepository
+from services.batch_backends import BatchFailed, LocalBatchBackend
+from services.summarizer_service import SummarizerService
+
+
+class FakeConversations:
+    """
+    In-memory conversations table: every id is stale unless it is in `active`.
+    """
+    def __init__(self, ids: list[str]):
+        self.ids = ids
+        self.ended: set[str] = set()
+        self.active: set[str] = set()
+        self.summaries: dict[str, dict] = {}
+
+    def fetch_summary_state(self, conversation_id):
+        return {}
+
+    def fetch_stale_conversation_ids(self, cutoff_iso, after_id=None, limit=None):
+        ids = [i for i in self.ids if i not in self.ended and i not in self.active]
+        ids = [i for i in ids if after_id is None or i > after_id]
+        return ids[:limit]
+
+    def filter_stale_conversation_ids(self, conversation_ids, cutoff_iso):
+        return {i for i in conversation_ids if i not in self.ended and i not in self.active}
+
+    def update_summary(self, conversation_id, summary, until=None, message_count=None):
+        self.summaries[conversation_id] = {
+            "memory_summary": summary, "memory_summary_until": until, "memory_summary_count": message_count,
+        }
+
+    def mark_ended_many(self, conversation_ids):
+        ended = [i for i in conversation_ids if i not in self.ended]
+        self.ended.update(ended)
+        return ended
+
+
+class FakeMessages:
+    def count_messages(self, conversation_id, since=None, sender_role=None):
+        return 10 if sender_role is None else 5
+
+    def fetch_history_edges(self, conversation_id, head, tail):
+        rows = [
+            {"id": f"{conversation_id}-{i}", "sender_role": "user" if i % 2 == 0 else "assistant",
+             "transcription": f"turn {i}", "assistant_text": f"turn {i}", "created_at": f"2026-01-01T00:0{i}:00"}
+            for i in range(10)
+        ]
+        return rows[:head], rows[-tail:]
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **body):
+        self.calls += 1
+        content = "Night shift stress."
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            model_dump=lambda: {"choices": [{"message": {"content": content}}]},
+        )
+
+
+class FlakyBackend:
+    """
+    Wraps a backend; poll raises `error` while it is set.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.error = None
+
+    def submit(self, input_path):
+        return self.backend.submit(input_path)
+
+    def poll(self, batch_id):
+        if self.error is not None:
+            raise self.error
+        return self.backend.poll(batch_id)
+
+
+def _service(conversations, backend=None, batch_repo=None, mode="batch", openai=None) -> SummarizerService:
+    openai = openai or FakeOpenAI()
+    return SummarizerService(
+        supabase_sync=None,
+        openai_service=SimpleNamespace(client=openai),
+        message_repo=FakeMessages(),
+        conversation_repo=conversations,
+        sweep_page_size=2,
+        sweep_mode=mode,
+        batch_backend=backend,
+        batch_repo=batch_repo if batch_repo is not None else LocalSummaryBatchRepository(),
+    )
+
+
+def test_batch_sweep_stores_summaries_and_ends_conversations(tmp_path):
+    conversations = FakeConversations(["a", "b", "c"])
+    service = _service(conversations, LocalBatchBackend(FakeOpenAI(), str(tmp_path)))
+
+    report = service.close_inactive_conversations()
+
+    assert conversations.ended == {"a", "b", "c"}
+    assert conversations.summaries["a"]["memory_summary"] == "Night shift stress"
+    assert conversations.summaries["a"]["memory_summary_count"] == 10
+    assert (report.batches, report.batched, report.summarized, report.ended) == (1, 3, 3, 3)
+    assert service.batch_repo.fetch_pending() == []
+
+
+def test_conversation_active_again_keeps_summary_state_and_stays_open(tmp_path):
+    conversations = FakeConversations(["a", "b"])
+    backend = FlakyBackend(LocalBatchBackend(FakeOpenAI(), str(tmp_path)))
+    backend.error = ConnectionError("timeout")
+    service = _service(conversations, backend)
+    service.close_inactive_conversations()
+
+    # "b" gets a new message while its batch is running
+    conversations.active.add("b")
+    backend.error = None
+    report = service.close_inactive_conversations()
+
+    assert conversations.ended == {"a"}
+    assert set(conversations.summaries) == {"a"}
+    assert report.still_active == 1
+
+
+def test_poll_errors_keep_the_batch_for_any_replica(tmp_path):
+    conversations = FakeConversations(["a", "b"])
+    shared = LocalSummaryBatchRepository()
+    backend = FlakyBackend(LocalBatchBackend(FakeOpenAI(), str(tmp_path)))
+    backend.error = ConnectionError("timeout")
+
+    first = _service(conversations, backend, shared).close_inactive_conversations()
+    assert first.batches == 1 and first.ended == 0
+    assert len(shared.fetch_pending()) == 1
+
+    # another replica's sweep: collects the batch instead of planning the conversations again
+    backend.error = None
+    second = _service(conversations, backend, shared).close_inactive_conversations()
+
+    assert second.batches == 0
+    assert second.ended == 2
+    assert shared.fetch_pending() == []
+
+
+def test_failed_batch_is_dropped_and_replanned(tmp_path):
+    conversations = FakeConversations(["a"])
+    backend = FlakyBackend(LocalBatchBackend(FakeOpenAI(), str(tmp_path)))
+    backend.error = BatchFailed("batch_1", "expired")
+    service = _service(conversations, backend)
+    service.close_inactive_conversations()
+
+    report = service.close_inactive_conversations()
+
+    # the expired batch was dropped, so "a" went into a new batch (which failed too)
+    assert report.failed == 1
+    assert report.batches == 1
+    assert conversations.ended == set()
+
+
+def test_interactive_sweep_ends_pages_and_skips_active(monkeypatch):
+    conversations = FakeConversations(["a", "b", "c"])
+    service = _service(conversations, mode="interactive")
+    conversations_planned = []
+    plan = service._plan_summary
+
+    def plan_and_touch(conversation_id):
+        conversations_planned.append(conversation_id)
+        if conversation_id == "c":
+            conversations.active.add("c")   # new message while summarizing
+        return plan(conversation_id)
+    monkeypatch.setattr(service, "_plan_summary", plan_and_touch)
+
+    report = service.close_inactive_conversations()
+
+    assert conversations_planned == ["a", "b", "c"]
+    assert conversations.ended == {"a", "b"}
+    assert (report.pages, report.summarized, report.still_active) == (2, 2, 1)
+
+
+CONVERSATIONS_SQL = """
+create table conversations (
+    id                   text primary key,
+    patient_id           text not null,
+    ended                boolean not null default false,
+    updated_at           text not null,
+    memory_summary       text,
+    memory_summary_until text,
+    memory_summary_count integer,
+    needs_resummarization boolean default false
+);
+-- like the moddatetime trigger on the real table: every update bumps updated_at
+create trigger conversations_touch after update on conversations
+begin
+    update conversations set updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') where id = new.id;
+end;
+"""
+
+
+def _sqlite_conversations(rows: dict[str, str]):
+    from repositories.conversations import ConversationRepository
+    from tests.sqlite_supabase import SqliteSupabase
+
+    db = SqliteSupabase()
+    db.conn.executescript(CONVERSATIONS_SQL)
+    db.conn.executemany(
+        "insert into conversations (id, patient_id, updated_at) values (?, 'patient-1', ?)", rows.items()
+    )
+    return db, ConversationRepository(db)
+
+
+def test_sweep_against_not_null_columns_and_the_updated_at_trigger():
+    db, conversations = _sqlite_conversations({
+        "a": "2026-01-01T00:00:00+00:00",
+        "b": "2026-01-01T00:00:00+00:00",
+        "live": "2999-01-01T00:00:00+00:00",
+    })
+    service = _service(conversations, mode="interactive")
+
+    report = service.close_inactive_conversations()
+    rows = {r["id"]: r for r in db.table("conversations").select("*").execute().data}
+
+    # summaries stored although patient_id is NOT NULL, and the summary write
+    # bumping updated_at does not keep the conversations open
+    assert (report.summarized, report.ended) == (2, 2)
+    assert rows["a"]["ended"] and rows["b"]["ended"]
+    assert rows["a"]["memory_summary"] == "Night shift stress"
+    assert rows["a"]["memory_summary_count"] == 10
+    assert not rows["live"]["ended"]
+    # nothing left to plan on the next sweep
+    assert service.close_inactive_conversations().scanned == 0
+
+
+def test_summary_for_a_conversation_deleted_mid_sweep_creates_no_row():
+    db, conversations = _sqlite_conversations({"a": "2026-01-01T00:00:00+00:00"})
+    service = _service(conversations, mode="interactive")
+    filter_stale = conversations.filter_stale_conversation_ids
+
+    def filter_then_delete(conversation_ids, cutoff_iso):
+        # deleted after it was found stale, before its summary is written
+        stale = filter_stale(conversation_ids, cutoff_iso)
+        with db.conn:
+            db.conn.execute("delete from conversations where id = 'a'")
+        return stale
+    conversations.filter_stale_conversation_ids = filter_then_delete
+
+    report = service.close_inactive_conversations()
+
+    assert db.table("conversations").select("id").execute().data == []
+    assert report.ended == 0
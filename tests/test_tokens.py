@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils import tokens
+
+
+@pytest.fixture(autouse=True)
+def fresh_encodings():
+    tokens._encoding.cache_clear()
+    yield
+    tokens._encoding.cache_clear()
+
+
+def test_unloadable_encoding_falls_back_to_the_estimate(monkeypatch):
+    loads = []
+
+    def offline(name):
+        loads.append(name)
+        raise ConnectionError("no network to fetch cl100k_base")
+
+    def unknown_model(model):
+        raise KeyError(model)
+    monkeypatch.setattr(tokens, "tiktoken", SimpleNamespace(encoding_for_model=unknown_model, get_encoding=offline))
+
+    assert tokens.count_tokens("x" * 40) == 10
+    assert tokens.count_message_tokens([{"content": "x" * 40}]) == tokens.MESSAGE_OVERHEAD + 10
+    # the failure is remembered rather than retried on every reply
+    assert loads == ["cl100k_base"]
+
+
+def test_loaded_encoding_is_used(monkeypatch):
+    encoding = SimpleNamespace(encode=lambda text: text.split())
+    monkeypatch.setattr(tokens, "tiktoken", SimpleNamespace(encoding_for_model=lambda model: encoding))
+
+    assert tokens.count_tokens("one two three") == 3
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("supabase")
+pytest.importorskip("requests")
+
+from services.elevenlabs_service import ElevenLabsService
+from utils.audio_cache import AudioCache
+from utils.ttl_cache import TTLCache
+
+DB_S = 0.005          # per Supabase lookup
+UPSTREAM_TTFB_S = 0.05
+CHUNK_GAP_S = 0.02
+CHUNKS = 8
+CHUNK = b"\xff\xfb" * 2048
+
+
+class FakeMessages:
+    async def fetch_text_async(self, message_id):
+        await asyncio.sleep(DB_S)
+        return {"id": message_id, "conversation_id": "conv-1", "ai_status": "done",
+                "assistant_text": "Hello there. How are you feeling today?"}
+
+
+class FakeConversations:
+    async def fetch_voice_info_async(self, conversation_id):
+        await asyncio.sleep(DB_S)
+        return {"voice_enabled": True, "therapist_id": "ther-1"}
+
+
+class FakeTherapists:
+    async def fetch_voice_id_async(self, therapist_id):
+        await asyncio.sleep(DB_S)
+        return "voice-1"
+
+
+class FakeElevenLabs:
+    """
+    Mock transport for the TTS endpoint: the first byte after UPSTREAM_TTFB_S,
+    then CHUNKS chunks CHUNK_GAP_S apart.
+    """
+    def __init__(self):
+        self.requests = 0
+
+    async def handle(self, request):
+        self.requests += 1
+        await asyncio.sleep(UPSTREAM_TTFB_S)
+        return httpx.Response(200, content=self.audio())
+
+    async def audio(self):
+        for i in range(CHUNKS):
+            if i:
+                await asyncio.sleep(CHUNK_GAP_S)
+            yield CHUNK
+
+
+def _service(upstream: FakeElevenLabs, audio_cache=None) -> ElevenLabsService:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle), base_url="https://tts.test")
+    return ElevenLabsService(
+        message_repo=FakeMessages(),
+        conversation_repo=FakeConversations(),
+        therapist_repo=FakeTherapists(),
+        supabase_sync=None,
+        elevenlabs_session=None,
+        default_voice_id="default-voice",
+        audio_cache=audio_cache,
+        elevenlabs_async_client=client,
+        plan_cache=TTLCache(maxsize=128, ttl_s=60),
+    )
+
+
+async def _fetch(service: ElevenLabsService, message_id: str) -> tuple[float, float, int]:
+    """
+    (seconds to the first audio chunk, seconds to the last, bytes) for one snippet request.
+    """
+    started = time.perf_counter()
+    response = await service.fetch_and_stream_async(message_id, 0)
+    first, size = None, 0
+    if hasattr(response, "body_iterator"):
+        async for chunk in response.body_iterator:
+            if first is None:
+                first = time.perf_counter() - started
+            size += len(chunk)
+    else:
+        first, size = time.perf_counter() - started, len(response.body)
+    return first, time.perf_counter() - started, size
+
+
+def test_first_chunk_is_forwarded_before_the_upstream_finishes():
+    upstream = FakeElevenLabs()
+    first, total, size = asyncio.run(_fetch(_service(upstream), "m1"))
+
+    print(f"\nfirst chunk {first * 1000:.1f}ms, full snippet {total * 1000:.1f}ms")
+    assert size == CHUNKS * len(CHUNK)
+    # three lookups and the upstream's first byte, not the whole stream
+    assert first < 3 * DB_S + UPSTREAM_TTFB_S + 2 * CHUNK_GAP_S
+    assert total >= UPSTREAM_TTFB_S + (CHUNKS - 1) * CHUNK_GAP_S
+
+
+def test_concurrent_requests_overlap_instead_of_queueing():
+    upstream = FakeElevenLabs()
+    service = _service(upstream)
+    n = 50
+
+    async def run():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(_fetch(service, f"m{i}") for i in range(n)))
+        return results, time.perf_counter() - started
+    results, wall = asyncio.run(run())
+
+    single = 3 * DB_S + UPSTREAM_TTFB_S + (CHUNKS - 1) * CHUNK_GAP_S
+    firsts = sorted(first for first, _, _ in results)
+    print(
+        f"\n{n} concurrent snippets in {wall * 1000:.1f}ms (one alone ≈ {single * 1000:.0f}ms), "
+        f"first chunk p50 {firsts[n // 2] * 1000:.1f}ms, max {firsts[-1] * 1000:.1f}ms"
+    )
+    assert upstream.requests == n
+    assert all(size == CHUNKS * len(CHUNK) for _, _, size in results)
+    # a blocking lookup or upstream call would serialise these into ~n × single
+    assert wall < 3 * single
+
+
+def test_repeat_request_is_served_from_the_audio_cache():
+    upstream = FakeElevenLabs()
+    service = _service(upstream, audio_cache=AudioCache())
+
+    async def run():
+        cold = await _fetch(service, "m1")
+        warm = await _fetch(service, "m1")
+        return cold, warm
+    (cold_first, _, cold_size), (warm_first, _, warm_size) = asyncio.run(run())
+
+    print(f"\ncold first chunk {cold_first * 1000:.1f}ms, cached {warm_first * 1000:.1f}ms")
+    assert upstream.requests == 1
+    assert warm_size == cold_size
+    assert warm_first < UPSTREAM_TTFB_S
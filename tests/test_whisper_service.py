@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import io
+import threading
+import tracemalloc
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("supabase")
+pytest.importorskip("realtime")
+requests = pytest.importorskip("requests")
+
+from services.whisper_service import DOWNLOAD_CHUNK_BYTES, WhisperService
+
+
+class FakeMessages:
+    def __init__(self, stuck=()):
+        self.claims = []
+        self.updates = []
+        self.stuck = list(stuck)
+        self.claimed = set()
+
+    def claim_for_transcription(self, message_id, stale_before_iso=None):
+        self.claims.append((message_id, stale_before_iso))
+        if message_id in self.claimed:
+            return False
+        self.claimed.add(message_id)
+        return True
+
+    def fetch_stuck_transcriptions(self, stale_before_iso, limit=100):
+        return self.stuck
+
+    def update(self, message_id, fields):
+        self.updates.append((message_id, fields))
+
+
+def _service(messages, **kwargs) -> WhisperService:
+    service = WhisperService(
+        supabase_sync=None,
+        openai_client=None,
+        storage_session=None,
+        message_repo=messages,
+        transcription_retry_delay_s=0.01,
+        **kwargs,
+    )
+    service._transcribe = lambda message_id, audio_path: f"transcript of {audio_path}"
+    return service
+
+
+def _voice_message(message_id: str) -> dict:
+    return {"id": message_id, "sender_role": "user", "conversation_id": "conv-1",
+            "audio_path": f"{message_id}.wav", "ai_status": "pending", "transcription_status": "pending"}
+
+
+def test_stored_transcript_is_handed_on_for_a_reply():
+    messages = FakeMessages()
+    service = _service(messages)
+    replies = []
+
+    async def run():
+        done = asyncio.Event()
+        service.on_transcribed = lambda msg: (replies.append(msg), done.set())
+        service.dispatch_transcription(_voice_message("m1"))
+        await asyncio.wait_for(done.wait(), 2)
+        await service.pool.stop()
+    asyncio.run(run())
+
+    assert messages.updates == [("m1", {"transcription": "transcript of m1.wav", "transcription_status": "done"})]
+    assert replies[0]["id"] == "m1"
+    assert replies[0]["transcription"] == "transcript of m1.wav"
+    assert replies[0]["transcription_status"] == "done"
+
+
+def test_failed_transcription_gets_no_reply():
+    messages = FakeMessages()
+    service = _service(messages, transcription_max_attempts=1)
+    replies = []
+
+    def boom(message_id, audio_path):
+        raise RuntimeError("whisper down")
+    service._transcribe = boom
+
+    async def run():
+        service.on_transcribed = replies.append
+        service.dispatch_transcription(_voice_message("m1"))
+        await asyncio.sleep(0.1)
+        await service.pool.stop()
+    asyncio.run(run())
+
+    assert replies == []
+    assert messages.updates == [("m1", {"transcription_status": "error"})]
+
+
+def test_claims_take_over_rows_stuck_past_the_timeout():
+    messages = FakeMessages()
+    service = _service(messages, transcription_claim_timeout_s=300)
+
+    service.handle_transcription_record(_voice_message("m1"))
+
+    (message_id, stale_before), = messages.claims
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(stale_before)
+    assert message_id == "m1"
+    assert 299 <= age.total_seconds() <= 301
+
+
+def test_reclaim_queues_stuck_rows():
+    stuck = [_voice_message("m1"), _voice_message("m2"), dict(_voice_message("m3"), audio_path=None)]
+    messages = FakeMessages(stuck)
+    service = _service(messages)
+    replies = []
+
+    async def run():
+        service.on_transcribed = replies.append
+        queued = await service.reclaim_stuck_transcriptions()
+        for _ in range(200):
+            if len(replies) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await service.pool.stop()
+        return queued
+    queued = asyncio.run(run())
+
+    assert queued == 2
+    assert sorted(m["id"] for m in replies) == ["m1", "m2"]
+    assert service.stats()["reclaimed"] == 2
+
+
+class AudioHandler(BaseHTTPRequestHandler):
+    """
+    Serves a synthetic file of `/<size>` bytes, generated one chunk at a time so the
+    server adds nothing to the client's memory peak. Keeps connections alive.
+    """
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+
+    def do_GET(self):
+        size = int(urlparse(self.path).path.strip("/"))
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        sent = 0
+        while sent < size:
+            n = min(DOWNLOAD_CHUNK_BYTES, size - sent)
+            self.wfile.write(bytes([sent // DOWNLOAD_CHUNK_BYTES % 251]) * n)
+            sent += n
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def storage_server():
+    AudioHandler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), AudioHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _downloader(base_url: str, size: int, spool_bytes: int) -> WhisperService:
+    service = WhisperService(
+        supabase_sync=None,
+        openai_client=None,
+        storage_session=requests.Session(),
+        message_repo=FakeMessages(),
+        spool_max_memory_bytes=spool_bytes,
+    )
+    service.signed_url = lambda path, bucket="raw-audio", fresh=False: f"{base_url}/{size}"
+    return service
+
+
+def test_small_audio_stays_in_memory_without_a_file_descriptor(storage_server):
+    service = _downloader(storage_server, size=300 * 1024, spool_bytes=1024 * 1024)
+
+    audio, sha = service.download_audio("a/voice.m4a")
+    with audio:
+        data = audio.read()
+        # httpx sizes uploads via fileno() when it exists; a memory buffer must not have one
+        with pytest.raises(io.UnsupportedOperation):
+            audio.fileno()
+
+    assert len(data) == 300 * 1024
+    assert sha == hashlib.sha256(data).hexdigest()
+    assert service.stats()["spilled_to_disk"] == 0
+
+
+def test_large_audio_spills_to_disk_and_keeps_every_byte(storage_server):
+    service = _downloader(storage_server, size=3 * 1024 * 1024 + 17, spool_bytes=1024 * 1024)
+
+    audio, sha = service.download_audio("a/voice.wav")
+    with audio:
+        audio.fileno()
+        data = audio.read()
+
+    assert len(data) == 3 * 1024 * 1024 + 17
+    assert sha == hashlib.sha256(data).hexdigest()
+    assert service.stats()["spilled_to_disk"] == 1
+
+
+def test_download_memory_stays_under_the_spool_ceiling(storage_server):
+    spool_bytes = 1024 * 1024
+    service = _downloader(storage_server, size=32 * 1024 * 1024, spool_bytes=spool_bytes)
+
+    tracemalloc.start()
+    try:
+        audio, _ = service.download_audio("a/long.wav")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    with audio:
+        assert audio.seek(0, io.SEEK_END) == 32 * 1024 * 1024
+
+    # the in-memory buffer, plus a few download chunks in flight
+    assert peak < spool_bytes + 8 * DOWNLOAD_CHUNK_BYTES
+
+
+def test_finished_downloads_release_their_connection(storage_server):
+    service = _downloader(storage_server, size=2 * 1024 * 1024, spool_bytes=1024 * 1024)
+
+    for _ in range(3):
+        audio, _ = service.download_audio("a/voice.wav")
+        audio.close()
+
+    # every download went back to the pool and the next one reused its connection
+    assert AudioHandler.connections == 1
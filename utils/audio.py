@@ -0,0 +1,200 @@
+import io
+import tempfile
+import time
+import wave
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+try:
+    import numpy as np
+except ImportError:  # optional: without NumPy audio is uploaded as recorded
+    np = None
+
+
+WHISPER_SAMPLE_RATE = 16000
+
+
+@dataclass
+class PreprocessedAudio:
+    file: BinaryIO
+    bytes_in: int
+    bytes_out: int
+    seconds_in: float
+    seconds_out: float
+    elapsed_s: float
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    @property
+    def seconds_saved(self) -> float:
+        return self.seconds_in - self.seconds_out
+
+
+def is_wav(f: BinaryIO) -> bool:
+    head = f.read(12)
+    f.seek(0)
+    return len(head) == 12 and head[:4] == b"RIFF" and head[8:12] == b"WAVE"
+
+
+def _to_float(frames: bytes, sampwidth: int, channels: int):
+    # (samples, channels) float32 in [-1, 1]
+    if sampwidth == 1:
+        x = (np.frombuffer(frames, np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sampwidth == 2:
+        x = np.frombuffer(frames, "<i2").astype(np.float32) / 32768.0
+    elif sampwidth == 3:
+        b = np.frombuffer(frames, np.uint8).reshape(-1, 3)
+        v = b[:, 0].astype(np.int32) | (b[:, 1].astype(np.int32) << 8) | (b[:, 2].astype(np.int8).astype(np.int32) << 16)
+        x = v.astype(np.float32) / 8388608.0
+    elif sampwidth == 4:
+        x = np.frombuffer(frames, "<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported sample width {sampwidth}")
+    return x.reshape(-1, channels)
+
+
+def _read_mono(w: wave.Wave_read, start: int, count: int):
+    # frames [start, start + count) of an open WAV, downmixed to mono float32
+    w.setpos(start)
+    x = _to_float(w.readframes(count), w.getsampwidth(), w.getnchannels())
+    return x.mean(axis=1) if x.shape[1] > 1 else x[:, 0]
+
+
+def _voiced_span(
+    w: wave.Wave_read,
+    threshold_db: float,
+    frame_ms: int,
+    pad_ms: int,
+    block_frames: int,
+) -> Optional[tuple[int, int]]:
+    """
+    Energy VAD: [start, end) sample range from the first to the last frame whose RMS
+    is above `threshold_db` dBFS, widened by `pad_ms` on both sides. Reads `w` in
+    blocks of about `block_frames` samples.
+    """
+    rate, total = w.getframerate(), w.getnframes()
+    frame = max(int(rate * frame_ms / 1000), 1)
+    n_frames = total // frame
+    if n_frames == 0:
+        return None
+    per_block = max(block_frames // frame, 1)
+    first = last = None
+    for b in range(0, n_frames, per_block):
+        n = min(per_block, n_frames - b)
+        frames = _read_mono(w, b * frame, n * frame).reshape(n, frame)
+        rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+        voiced = np.flatnonzero(20.0 * np.log10(rms) > threshold_db)
+        if voiced.size:
+            if first is None:
+                first = b + int(voiced[0])
+            last = b + int(voiced[-1])
+    if first is None:
+        return None
+    pad = int(rate * pad_ms / 1000)
+    return max(first * frame - pad, 0), min((last + 1) * frame + pad, total)
+
+
+def _resampled_blocks(w: wave.Wave_read, start: int, end: int, target: int, block_frames: int):
+    """
+    Yields samples [start, end) of `w` as mono, downsampled to `target` (never up), one
+    block of about `block_frames` output samples at a time. A boxcar of the decimation
+    width stands in for a low-pass; each block reads that width of context on both
+    sides, so the result matches filtering the whole span at once.
+    """
+    rate = w.getframerate()
+    length = end - start
+    if rate <= target:
+        for b in range(0, length, block_frames):
+            yield _read_mono(w, start + b, min(block_frames, length - b))
+        return
+
+    width = int(round(rate / target))
+    n_out = int(length * target / rate)
+    step = rate / target
+    for j in range(0, n_out, block_frames):
+        positions = np.arange(j, min(j + block_frames, n_out), dtype=np.float64) * step
+        lo = max(int(positions[0]) - width, 0)
+        hi = min(int(positions[-1]) + 2 + width, length)
+        x = _read_mono(w, start + lo, hi - lo)
+        if width > 1:
+            x = np.convolve(x, np.ones(width, dtype=np.float32) / width, mode="same")
+            # zero padding only belongs at the edges of the span, not of the block
+            x = x[(width if lo > 0 else 0):len(x) - (width if hi < length else 0)]
+            lo += width if lo > 0 else 0
+        yield np.interp(positions - lo, np.arange(len(x)), x).astype(np.float32)
+
+
+def preprocess_audio(
+    f: BinaryIO,
+    target_rate: int = WHISPER_SAMPLE_RATE,
+    silence_threshold_db: float = -45.0,
+    frame_ms: int = 30,
+    pad_ms: int = 200,
+    block_s: float = 1.0,
+    max_memory_bytes: int = 8 * 1024 * 1024,
+) -> Optional[PreprocessedAudio]:
+    """
+    Shrink a PCM WAV recording before upload: trim leading/trailing silence,
+    downmix to mono and downsample to `target_rate`, re-encoded as 16-bit PCM.
+
+    The input is read in blocks of `block_s` seconds (once to find the voiced span,
+    once to convert it), so memory does not grow with the recording; the output is
+    written to memory, or to a temp file when it would exceed `max_memory_bytes`.
+
+    Returns None (leaving `f` rewound) when the input is not PCM WAV, NumPy is not
+    installed, the recording is all silence, or the result would not be smaller.
+    """
+    if np is None or not is_wav(f):
+        return None
+
+    started = time.perf_counter()
+    out = None
+    try:
+        with wave.open(f, "rb") as w:
+            rate, total = w.getframerate(), w.getnframes()
+            bytes_in = f.seek(0, io.SEEK_END)
+            block_frames = max(int(rate * block_s), 1)
+            span = _voiced_span(w, silence_threshold_db, frame_ms, pad_ms, block_frames)
+            if span is None:
+                f.seek(0)
+                return None
+
+            out_rate = min(rate, target_rate)
+            n_out = span[1] - span[0] if rate <= target_rate else int((span[1] - span[0]) * target_rate / rate)
+            # 44-byte header plus 16-bit mono samples
+            if 44 + 2 * n_out >= bytes_in:
+                f.seek(0)
+                return None
+
+            out = io.BytesIO() if 44 + 2 * n_out <= max_memory_bytes else tempfile.TemporaryFile()
+            with wave.open(out, "wb") as o:
+                o.setnchannels(1)
+                o.setsampwidth(2)
+                o.setframerate(out_rate)
+                o.setnframes(n_out)
+                for block in _resampled_blocks(w, span[0], span[1], target_rate, int(out_rate * block_s)):
+                    o.writeframes((np.clip(block, -1.0, 1.0) * 32767.0).astype("<i2").tobytes())
+    except (wave.Error, EOFError, ValueError) as e:
+        print(f"⚠️ Audio preprocessing skipped: {e}")
+        if out is not None:
+            out.close()
+        f.seek(0)
+        return None
+    except BaseException:
+        if out is not None:
+            out.close()
+        raise
+    f.seek(0)
+
+    bytes_out = out.tell()
+    out.seek(0)
+    return PreprocessedAudio(
+        out,
+        bytes_in,
+        bytes_out,
+        total / rate,
+        n_out / out_rate,
+        time.perf_counter() - started,
+    )
@@ -0,0 +1,204 @@
+import asyncio
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional
+
+
+@dataclass
+class AudioCache:
+    """
+    Two-tier, content-addressed cache for synthesized audio.
+
+    - memory: LRU bounded by total bytes, for hot snippets
+    - disk:   one file per key under `disk_dir`, LRU-evicted once over `disk_max_bytes`
+              (disabled when `disk_dir` is empty)
+
+    Keys are hex digests, so they double as file names and ETags.
+    """
+    memory_max_bytes: int = 64 * 1024 * 1024
+    disk_dir: str = ""
+    disk_max_bytes: int = 1024 * 1024 * 1024
+
+    memory_hits: int = field(default=0, init=False)
+    disk_hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    stores: int = field(default=0, init=False)
+    aborted: int = field(default=0, init=False)
+    memory_evictions: int = field(default=0, init=False)
+    disk_evictions: int = field(default=0, init=False)
+
+    _memory: OrderedDict = field(default_factory=OrderedDict, init=False)
+    _memory_bytes: int = field(default=0, init=False)
+    _disk: OrderedDict = field(default_factory=OrderedDict, init=False)   # key -> size
+    _disk_bytes: int = field(default=0, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self) -> None:
+        # oldest access first, so eviction order survives restarts
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith(".audio"):
+                st = entry.stat()
+                entries.append((st.st_atime, entry.name[:-len(".audio")], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.audio")
+
+    def __contains__(self, key: str) -> bool:
+        # presence check only; does not touch LRU order or hit/miss counters
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            with self._lock:
+                if data is None:
+                    self._forget_disk(key)
+                else:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.disk_hits += 1
+                    self._remember(key, data)
+                    return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        if not data:
+            return
+        with self._lock:
+            self.stores += 1
+            self._remember(key, data)
+        if self.disk_dir:
+            self._write_disk(key, data)
+
+    def tee(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Yield `chunks` through to the caller while collecting them; the audio is stored
+        only once the upstream stream finished cleanly (not on error or client disconnect).
+        """
+        buf = bytearray()
+        completed = False
+        try:
+            for chunk in chunks:
+                if chunk:
+                    buf += chunk
+                    yield chunk
+            completed = True
+        finally:
+            if completed:
+                self.put(key, bytes(buf))
+            else:
+                with self._lock:
+                    self.aborted += 1
+
+    async def atee(self, key: str, chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        """
+        Async twin of tee(); the store (and its disk write) runs off the event loop.
+        """
+        buf = bytearray()
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    buf += chunk
+                    yield chunk
+        except BaseException:
+            with self._lock:
+                self.aborted += 1
+            # closing us (client went away) must also close the upstream stream
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            raise
+        await asyncio.to_thread(self.put, key, bytes(buf))
+
+    def _remember(self, key: str, data: bytes) -> None:
+        # caller holds the lock
+        if len(data) > self.memory_max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.memory_evictions += 1
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            print(f"⚠️ TTS cache disk write failed for {key}: {e}")
+            return
+
+        doomed = []
+        with self._lock:
+            self._forget_disk(key)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.disk_max_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.disk_evictions += 1
+                doomed.append(old_key)
+        for old_key in doomed:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def _forget_disk(self, key: str) -> None:
+        # caller holds the lock
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_max_bytes": self.memory_max_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes if self.disk_dir else 0,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+            "stores": self.stores,
+            "aborted_streams": self.aborted,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+        }
@@ -0,0 +1,117 @@
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+
+# text that ends a sentence, allowing trailing quotes/brackets and whitespace
+SENTENCE_END_RE = re.compile(r"[.!?][\"'”’)\]]*\s*$")
+
+
+@dataclass
+class _DeltaBuffer:
+    """
+    Buffering/flush policy shared by DeltaWriter and AsyncDeltaWriter.
+
+    A write of the full text so far is due whenever one of these holds:
+      - `interval_ms` has passed since the previous write
+      - at least `max_chars` characters are buffered and unwritten
+      - the buffered text ends on a sentence boundary
+      - close() is called
+    `writes_saved` counts how many writes were avoided versus writing once per chunk.
+    """
+    interval_ms: int = 250
+    max_chars: int = 120
+
+    text: str = field(default="", init=False)
+    chunks: int = field(default=0, init=False)
+    writes: int = field(default=0, init=False)
+    _written_len: int = field(default=0, init=False)
+    _last_write: float = field(default_factory=time.monotonic, init=False)
+
+    @property
+    def writes_saved(self) -> int:
+        return max(self.chunks - self.writes, 0)
+
+    def _push(self, delta: str) -> bool:
+        """
+        Buffer one streamed chunk and report whether a write is now due.
+        """
+        self.chunks += 1
+        if not delta:
+            return False
+        self.text += delta
+        return self._due()
+
+    def _take(self) -> Optional[str]:
+        """
+        Returns the text to write (and books the write), or None if nothing is pending.
+        """
+        if len(self.text) == self._written_len:
+            return None
+        self.writes += 1
+        self._written_len = len(self.text)
+        self._last_write = time.monotonic()
+        return self.text
+
+    def _due(self) -> bool:
+        pending = len(self.text) - self._written_len
+        if pending <= 0:
+            return False
+        if pending >= self.max_chars:
+            return True
+        if (time.monotonic() - self._last_write) * 1000 >= self.interval_ms:
+            return True
+        return bool(SENTENCE_END_RE.search(self.text))
+
+
+@dataclass
+class DeltaWriter(_DeltaBuffer):
+    """
+    Coalesces streamed text deltas into occasional `write(text_so_far)` calls.
+    """
+    write: Callable[[str], None] = None
+
+    def append(self, delta: str) -> bool:
+        """
+        Buffer one streamed chunk. Returns True if it triggered a write.
+        """
+        if self._push(delta):
+            self.flush()
+            return True
+        return False
+
+    def flush(self) -> None:
+        text = self._take()
+        if text is not None:
+            self.write(text)
+
+    def close(self) -> str:
+        """
+        Write anything still buffered and return the final text.
+        """
+        self.flush()
+        return self.text
+
+
+@dataclass
+class AsyncDeltaWriter(_DeltaBuffer):
+    """
+    DeltaWriter for coroutine writers (e.g. the async Supabase client).
+    """
+    write: Callable[[str], Awaitable[None]] = None
+
+    async def append(self, delta: str) -> bool:
+        if self._push(delta):
+            await self.flush()
+            return True
+        return False
+
+    async def flush(self) -> None:
+        text = self._take()
+        if text is not None:
+            await self.write(text)
+
+    async def close(self) -> str:
+        await self.flush()
+        return self.text
@@ -0,0 +1,47 @@
+import re
+from typing import Optional
+
+
+# characters ElevenLabs would read out or choke on
+TTS_SANITIZE_RE = re.compile(r"[*/{}\[\]<>&#@_\\|+=%]")
+# a sentence ends at . ! or ? followed by whitespace
+SENTENCE_BOUNDARY_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def sanitize_for_tts(text: str) -> str:
+    return TTS_SANITIZE_RE.sub("", text)
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Sanitize `text` and split it into TTS snippets, exactly as /tts-stream indexes them.
+    """
+    return SENTENCE_BOUNDARY_RE.split(sanitize_for_tts(text))
+
+
+class SentenceStream:
+    """
+    Finds sentence boundaries in streamed text as it arrives, using the same rule as
+    split_sentences. feed() returns the text up to the last finished sentence whenever
+    a new one completes, so it can be published while the rest is still generating.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.complete_len = 0
+
+    def feed(self, delta: str) -> Optional[str]:
+        if not delta:
+            return None
+        self.text += delta
+        last = None
+        for m in SENTENCE_BOUNDARY_RE.finditer(self.text, self.complete_len):
+            last = m
+        if last is None or last.start() <= self.complete_len:
+            return None
+        self.complete_len = last.start()
+        return self.text[:self.complete_len]
+
+    @property
+    def completed(self) -> str:
+        return self.text[:self.complete_len]
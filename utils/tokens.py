@@ -0,0 +1,43 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a ~4 chars/token estimate
+    tiktoken = None
+
+
+# per-message framing tokens in the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    """
+    The tokenizer for `model`, or None if it cannot be loaded (tiktoken fetches its
+    files on first use, which fails offline); the result is cached either way.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken encoding for {model} unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4-turbo") -> int:
+    """
+    Token count of `text` for `model`, using the local tiktoken tokenizer when it is
+    installed and loads.
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model) if tiktoken is not None else None
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: list[dict], model: str = "gpt-4-turbo") -> int:
+    return sum(MESSAGE_OVERHEAD + count_tokens(m.get("content") or "", model) for m in messages)
@@ -0,0 +1,366 @@
+import asyncio
+import bisect
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream whose circuit breaker is open.
+    """
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised instead of calling an upstream once the caller's deadline has passed.
+    """
+
+
+# absolute time.monotonic() by which the current request must be done
+_deadline: ContextVar[Optional[float]] = ContextVar("upstream_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """
+    Bound every upstream call made inside this block (including nested blocks and
+    retries) to finish within `seconds`. An outer, tighter deadline still wins.
+    """
+    expires_at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(expires_at if outer is None else min(outer, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_remaining() -> Optional[float]:
+    expires_at = _deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    closed → open after `failure_threshold` consecutive failures; open → half_open
+    after `reset_timeout_s`; half_open lets `half_open_max` probes through and
+    closes on a success or re-opens on a failure.
+    """
+    failure_threshold: int = 5
+    reset_timeout_s: float = 30.0
+    half_open_max: int = 1
+
+    state: str = field(default="closed", init=False)
+    consecutive_failures: int = field(default=0, init=False)
+    opened_at: Optional[float] = field(default=None, init=False)
+    times_opened: int = field(default=0, init=False)
+    rejected: int = field(default=0, init=False)
+    _probes: int = field(default=0, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def before_call(self, name: str) -> None:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout_s:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{name} circuit open")
+                self.state, self._probes = "half_open", 0
+            if self.state == "half_open":
+                if self._probes >= self.half_open_max:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{name} circuit half-open, probe in flight")
+                self._probes += 1
+
+    def release(self) -> None:
+        # an attempt ended without telling us anything about the upstream
+        with self._lock:
+            if self.state == "half_open":
+                self._probes = max(self._probes - 1, 0)
+
+    def record(self, failed: bool) -> None:
+        with self._lock:
+            if self.state == "half_open":
+                self._probes = max(self._probes - 1, 0)
+            if not failed:
+                self.state, self.consecutive_failures = "closed", 0
+                return
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "open_for_s": round(time.monotonic() - self.opened_at, 3) if self.state == "open" else None,
+        }
+
+
+@dataclass
+class RetryBudget:
+    """
+    Retries may add at most `ratio` extra load on top of first attempts (plus a small
+    floor of `min_per_s`), measured over the last `window_s` seconds, so a degraded
+    upstream is not hit with a retry storm.
+    """
+    ratio: float = 0.2
+    min_per_s: float = 1.0
+    window_s: float = 10.0
+
+    exhausted: int = field(default=0, init=False)
+    _requests: list = field(default_factory=list, init=False)
+    _retries: list = field(default_factory=list, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window_s
+        for series in (self._requests, self._retries):
+            del series[:bisect.bisect_left(series, cutoff)]
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = self.min_per_s * self.window_s + self.ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {
+                "window_s": self.window_s,
+                "requests_in_window": len(self._requests),
+                "retries_in_window": len(self._retries),
+                "exhausted": self.exhausted,
+            }
+
+
+LATENCY_BUCKETS_S = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+@dataclass
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram (seconds); quantiles are bucket upper bounds.
+    """
+    buckets: tuple = LATENCY_BUCKETS_S
+
+    count: int = field(default=0, init=False)
+    errors: int = field(default=0, init=False)
+    total_s: float = field(default=0.0, init=False)
+    _counts: list = field(default=None, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        self._counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total_s += seconds
+            self.errors += error
+
+    def quantile(self, q: float):
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self._counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else "+Inf"
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, n in zip(list(self.buckets) + ["+Inf"], self._counts):
+                running += n
+                cumulative[str(bound)] = running
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "avg_s": round(self.total_s / self.count, 4) if self.count else None,
+                "p50_s": self.quantile(0.5),
+                "p95_s": self.quantile(0.95),
+                "p99_s": self.quantile(0.99),
+                "buckets_le": cumulative,
+            }
+
+
+def _classify(result: Any, error: Optional[BaseException]) -> tuple[bool, bool]:
+    # (counts as a failure, worth retrying)
+    return (True, True) if error is not None else (False, False)
+
+
+@dataclass
+class Upstream:
+    """
+    Policy for one upstream service: pool size, default timeout, retries with
+    jittered exponential backoff (bounded by a retry budget and the caller's
+    deadline), a circuit breaker, and a latency histogram.
+
+    call()/acall() run one logical request; `attempt` performs a single try and
+    `classify(result, error)` says whether it failed and whether to retry it.
+    `discard(result)` releases a result that is being retried (e.g. closes a response).
+    """
+    name: str
+    max_connections: int = 20
+    timeout_s: float = 30.0
+    max_retries: int = 2
+    backoff_base_s: float = 0.1
+    backoff_max_s: float = 2.0
+    failure_threshold: int = 5
+    reset_timeout_s: float = 30.0
+    retry_budget_ratio: float = 0.2
+
+    calls: int = field(default=0, init=False)
+    retries: int = field(default=0, init=False)
+    deadline_exceeded: int = field(default=0, init=False)
+    breaker: CircuitBreaker = field(init=False)
+    budget: RetryBudget = field(init=False)
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram, init=False)
+
+    def __post_init__(self):
+        self.breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout_s)
+        self.budget = RetryBudget(self.retry_budget_ratio)
+
+    def timeout(self, default: Optional[float] = None) -> float:
+        """
+        The timeout to use for the next attempt: the upstream default, cut down to
+        whatever is left of the caller's deadline.
+        """
+        timeout = self.timeout_s if default is None else default
+        remaining = deadline_remaining()
+        return timeout if remaining is None else max(min(timeout, remaining), 0.0)
+
+    def _before_attempt(self) -> Optional[float]:
+        remaining = deadline_remaining()
+        if remaining is not None and remaining <= 0:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded(f"{self.name} deadline exceeded")
+        self.breaker.before_call(self.name)
+        return remaining
+
+    def _after_attempt(self, started: float, failed: bool) -> None:
+        self.latency.observe(time.monotonic() - started, failed)
+        self.breaker.record(failed)
+
+    def _retry_delay(self, tries: int, retryable: bool, remaining: Optional[float]) -> Optional[float]:
+        # None means give up and surface this attempt's outcome
+        if not retryable or tries >= self.max_retries:
+            return None
+        delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** tries))
+        if remaining is not None and delay >= remaining:
+            return None
+        if not self.budget.try_retry():
+            return None
+        self.retries += 1
+        return delay
+
+    def call(
+        self,
+        attempt: Callable[[], Any],
+        classify: Callable[[Any, Optional[BaseException]], tuple[bool, bool]] = _classify,
+        discard: Callable[[Any], None] = lambda result: None,
+    ) -> Any:
+        self.calls += 1
+        self.budget.record_request()
+        tries = 0
+        while True:
+            remaining = self._before_attempt()
+            started = time.monotonic()
+            result, error = None, None
+            try:
+                result = attempt()
+            except Exception as e:
+                error = e
+            failed, retryable = classify(result, error)
+            self._after_attempt(started, failed)
+
+            delay = self._retry_delay(tries, retryable, remaining)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return result
+            if error is None:
+                discard(result)
+            tries += 1
+            time.sleep(delay)
+
+    async def acall(
+        self,
+        attempt: Callable[[], Awaitable[Any]],
+        classify: Callable[[Any, Optional[BaseException]], tuple[bool, bool]] = _classify,
+        discard: Callable[[Any], Awaitable[None]] = None,
+    ) -> Any:
+        self.calls += 1
+        self.budget.record_request()
+        tries = 0
+        while True:
+            remaining = self._before_attempt()
+            started = time.monotonic()
+            result, error = None, None
+            try:
+                result = await attempt()
+            except asyncio.CancelledError:
+                # the caller gave up; not the upstream's fault
+                self.breaker.release()
+                raise
+            except Exception as e:
+                error = e
+            failed, retryable = classify(result, error)
+            self._after_attempt(started, failed)
+
+            delay = self._retry_delay(tries, retryable, remaining)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return result
+            if error is None and discard is not None:
+                await discard(result)
+            tries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "timeout_s": self.timeout_s,
+            "calls": self.calls,
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+            "breaker": self.breaker.stats(),
+            "retry_budget": self.budget.stats(),
+            "latency": self.latency.stats(),
+        }
+
+
+@dataclass
+class UpstreamRegistry:
+    upstreams: list[Upstream]
+
+    def get(self, name: str) -> Upstream:
+        return next(u for u in self.upstreams if u.name == name)
+
+    def stats(self) -> dict:
+        return {u.name: u.stats() for u in self.upstreams}
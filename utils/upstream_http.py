@@ -0,0 +1,144 @@
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Any, Optional
+from utils.upstream import Upstream, deadline_remaining
+
+
+RETRYABLE_STATUS = (408, 409, 429)
+
+
+def _classify_status(status: int) -> tuple[bool, bool]:
+    # 5xx means the upstream is struggling; 408/409/429 are worth another try but not its fault
+    if status >= 500:
+        return True, True
+    return False, status in RETRYABLE_STATUS
+
+
+def classify_httpx(resp: Optional[httpx.Response], error: Optional[BaseException]) -> tuple[bool, bool]:
+    if error is not None:
+        return True, isinstance(error, httpx.TransportError)
+    return _classify_status(resp.status_code)
+
+
+def classify_requests(resp: Optional[requests.Response], error: Optional[BaseException]) -> tuple[bool, bool]:
+    if error is not None:
+        return True, isinstance(error, (requests.ConnectionError, requests.Timeout))
+    return _classify_status(resp.status_code)
+
+
+def _limits(upstream: Upstream) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=upstream.max_connections,
+        max_keepalive_connections=upstream.max_connections,
+        keepalive_expiry=60,
+    )
+
+
+def _with_deadline(timeouts: dict) -> dict:
+    remaining = deadline_remaining()
+    if remaining is None:
+        return timeouts
+    remaining = max(remaining, 0.0)
+    return {
+        k: remaining if v is None else min(v, remaining)
+        for k, v in timeouts.items()
+    }
+
+
+class UpstreamTransport(httpx.BaseTransport):
+    """
+    httpx transport for a sync client (e.g. the OpenAI SDK's): a connection pool sized
+    by the upstream, with its retries, breaker, deadline and latency histogram applied
+    to every request. The SDK's own retries should be turned off (max_retries=0).
+    """
+
+    def __init__(self, upstream: Upstream, **transport_kwargs: Any):
+        self.upstream = upstream
+        self._transport = httpx.HTTPTransport(limits=_limits(upstream), **transport_kwargs)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        timeouts = dict(request.extensions.get("timeout", {}))
+
+        def attempt():
+            request.extensions["timeout"] = _with_deadline(timeouts)
+            return self._transport.handle_request(request)
+
+        return self.upstream.call(attempt, classify=classify_httpx, discard=lambda resp: resp.close())
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncUpstreamTransport(httpx.AsyncBaseTransport):
+    """
+    Async twin of UpstreamTransport, for AsyncOpenAI and the ElevenLabs client.
+    """
+
+    def __init__(self, upstream: Upstream, **transport_kwargs: Any):
+        self.upstream = upstream
+        self._transport = httpx.AsyncHTTPTransport(limits=_limits(upstream), **transport_kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        timeouts = dict(request.extensions.get("timeout", {}))
+
+        async def attempt():
+            request.extensions["timeout"] = _with_deadline(timeouts)
+            return await self._transport.handle_async_request(request)
+
+        async def discard(resp: httpx.Response) -> None:
+            await resp.aclose()
+
+        return await self.upstream.acall(attempt, classify=classify_httpx, discard=discard)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class UpstreamAdapter(HTTPAdapter):
+    """
+    requests adapter with a pool sized by the upstream and its policy applied
+    per request. Mount it on a Session for the upstream's base URL.
+    """
+
+    def __init__(self, upstream: Upstream, **kwargs: Any):
+        self.upstream = upstream
+        super().__init__(
+            pool_connections=upstream.max_connections,
+            pool_maxsize=upstream.max_connections,
+            max_retries=0,
+            **kwargs,
+        )
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        def attempt():
+            return super(UpstreamAdapter, self).send(
+                request, stream=stream, timeout=self._timeout(timeout), **kwargs
+            )
+
+        return self.upstream.call(attempt, classify=classify_requests, discard=lambda resp: resp.close())
+
+    def _timeout(self, timeout):
+        if timeout is None:
+            return self.upstream.timeout()
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            remaining = deadline_remaining()
+            if remaining is None:
+                return timeout
+            remaining = max(remaining, 0.0)
+            return (
+                remaining if connect is None else min(connect, remaining),
+                remaining if read is None else min(read, remaining),
+            )
+        return self.upstream.timeout(timeout)
+
+
+def upstream_session(upstream: Upstream, headers: Optional[dict] = None) -> requests.Session:
+    session = requests.Session()
+    adapter = UpstreamAdapter(upstream)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session